@@ -0,0 +1 @@
+""" Throughput benchmarks of the tap against synthetic Branch exports served locally, run with `python -m benchmarks` """
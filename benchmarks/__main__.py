@@ -0,0 +1,61 @@
+""" Command line of the benchmarks, e.g. `python -m benchmarks --records 200000 --output report.json` """
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+from benchmarks.export_generator import DATETIME_FORMATS, TIMESTAMP_DISTRIBUTIONS, ExportProfile
+from benchmarks.runner import DEFAULT_STREAM, run_benchmark
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks",
+                                     description="Time syncs of the tap against a synthetic export served locally")
+    parser.add_argument("--records", type=int, default=100_000, help="Records of the export")
+    parser.add_argument("--files", type=int, default=1, help="Part files of the export")
+    parser.add_argument("--sparsity", type=float, default=0.5, help="Share of the fields missing from each record")
+    parser.add_argument("--timestamps", choices=TIMESTAMP_DISTRIBUTIONS, default="uniform",
+                        help="Distribution of the record timestamps over the window")
+    parser.add_argument("--datetime-format", choices=DATETIME_FORMATS, default="millis",
+                        help="Encoding of the date-time values")
+    parser.add_argument("--variants", type=int, default=256, help="Distinct record bodies")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated values")
+    parser.add_argument("--stream", default=DEFAULT_STREAM, help="Stream to sync")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed syncs, the fastest one is reported as best")
+    parser.add_argument("--config", default="{}",
+                        help="Tap config of the runs as a JSON object, e.g. '{\"transform_workers\": 4}'")
+    parser.add_argument("--output", type=Path, help="File to write the JSON report to")
+    parser.add_argument("--min-records-per-sec", type=float,
+                        help="Exit with an error when the best run is slower than this")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    profile = ExportProfile(records=args.records, files=args.files, sparsity=args.sparsity,
+                            timestamps=args.timestamps, datetime_format=args.datetime_format,
+                            variants=args.variants, seed=args.seed)
+    report = run_benchmark(profile, config=json.loads(args.config), repeat=args.repeat, stream_name=args.stream)
+
+    for index, run in enumerate(report.runs, start=1):
+        sys.stderr.write("run {}: {} records in {:.3f}s, {:.0f} records/sec, {:.2f} MB/sec, peak RSS {:.1f} MB\n".format(
+            index, run.records, run.seconds, run.records_per_sec, run.export_mb_per_sec, run.peak_rss_mb))
+        for stage, seconds in run.stages.items():
+            sys.stderr.write("    {:<20} {:.3f}s\n".format(stage, seconds))
+
+    report_json = json.dumps(report.to_dict(), indent=2)
+    if args.output is not None:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(report_json + "\n")
+    sys.stdout.write(report_json + "\n")
+
+    if args.min_records_per_sec is not None and report.best.records_per_sec < args.min_records_per_sec:
+        sys.stderr.write("Best run of {:.0f} records/sec is below the minimum of {:.0f} records/sec\n".format(
+            report.best.records_per_sec, args.min_records_per_sec))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
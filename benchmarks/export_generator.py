@@ -0,0 +1,184 @@
+""" Synthetic Branch export files built from the branch events schema """
+
+import gzip
+import json
+import random
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import pendulum
+
+from tap_branch.branch_constants import BRANCH_EVENTS_SCHEMA
+
+TIMESTAMP_DISTRIBUTIONS = ("uniform", "sorted", "bursty")
+DATETIME_FORMATS = ("millis", "iso")
+
+# Records encoded between two writes to the compressed file
+WRITE_BATCH_RECORDS = 10_000
+
+EXPORT_COMPRESS_LEVEL = 6
+
+# Spread of the timestamps around the center of a burst, as a fraction of the window
+BURST_SPREAD = 0.02
+
+
+@dataclass
+class ExportProfile:
+    """
+    Shape of a synthetic export.
+    ~~~
+    - `records`: Records across all the export files
+    - `files`: Part files the records are split across, like an export created with `allow_multiple_files`
+    - `sparsity`: Share of the fields, other than `id` and `timestamp`, missing from each record
+    - `timestamps`: `uniform` at random over the window, `sorted` in increasing order,
+      or `bursty` around a few random instants
+    - `datetime_format`: `millis` for Unix milliseconds like Branch, or `iso` for ISO 8601 strings
+    - `variants`: Distinct bodies the records are built from, more variants give a lower compression ratio
+    """
+    records: int = 100_000
+    files: int = 1
+    sparsity: float = 0.5
+    timestamps: str = "uniform"
+    datetime_format: str = "millis"
+    variants: int = 256
+    bursts: int = 8
+    seed: int = 0
+
+    def __post_init__(self) -> None:
+        if self.timestamps not in TIMESTAMP_DISTRIBUTIONS:
+            raise ValueError("Unsupported timestamps {}, expected one of {}".format(
+                self.timestamps, ", ".join(TIMESTAMP_DISTRIBUTIONS)))
+        if self.datetime_format not in DATETIME_FORMATS:
+            raise ValueError("Unsupported datetime_format {}, expected one of {}".format(
+                self.datetime_format, ", ".join(DATETIME_FORMATS)))
+        if not 0 <= self.sparsity <= 1:
+            raise ValueError("sparsity must be between 0 and 1")
+
+
+@dataclass
+class GeneratedExport:
+    """ Export files written for a profile, with their sizes """
+    paths: List[Path] = field(default_factory=list)
+    records: int = 0
+    raw_bytes: int = 0
+    compressed_bytes: int = 0
+
+
+def _build_value_generator(field_name: str, field_schema: Dict, rng: random.Random,
+                           profile: ExportProfile) -> Callable[[], Any]:
+    """ Function to build a generator of plausible values of a field from its schema, nested fields included """
+
+    types = field_schema.get("type") or []
+    if isinstance(types, str):
+        types = [types]
+
+    if "string" in types and field_schema.get("format") == "date-time":
+        if profile.datetime_format == "millis":
+            return lambda: rng.randint(1_600_000_000_000, 1_800_000_000_000)
+        return lambda: pendulum.from_timestamp(rng.randint(1_600_000_000, 1_800_000_000)).to_iso8601_string()
+    if "object" in types:
+        properties = field_schema.get("properties")
+        if not properties:
+            return lambda: {"key_{}".format(rng.randint(1, 5)): "value_{}".format(rng.randint(1, 100))}
+        generators = {name: _build_value_generator(name, schema, rng, profile)
+                      for name, schema in properties.items()}
+        return lambda: {name: generate() for name, generate in generators.items() if rng.random() >= profile.sparsity}
+    if "array" in types:
+        generate_item = _build_value_generator(field_name, field_schema.get("items") or {"type": "string"},
+                                               rng, profile)
+        return lambda: [generate_item() for _ in range(rng.randint(1, 3))]
+    if "boolean" in types:
+        return lambda: rng.random() < 0.5
+    if "integer" in types:
+        return lambda: rng.randint(0, 1_000_000)
+    if "number" in types:
+        return lambda: round(rng.uniform(-180, 180), 6)
+
+    # Strings have a few distinct values per field, like the attribution fields of real exports
+    vocabulary = ["{}_{:x}".format(field_name, rng.getrandbits(32)) for _ in range(16)]
+    return lambda: rng.choice(vocabulary)
+
+
+def build_record_bodies(profile: ExportProfile, schema: Dict, rng: random.Random) -> List[str]:
+    """ Function to build the encoded bodies of the records, every field but `id` and `timestamp`
+
+    Returns:
+        List[str]: JSON members of a record, without the braces, starting with a comma when not empty
+    """
+
+    generators = {
+        field_name: _build_value_generator(field_name, field_schema, rng, profile)
+        for field_name, field_schema in schema["properties"].items()
+        if field_name not in ("id", "timestamp")
+    }
+
+    bodies = []
+    for _ in range(max(1, profile.variants)):
+        members = ["{}: {}".format(json.dumps(field_name), json.dumps(generate()))
+                   for field_name, generate in generators.items() if rng.random() >= profile.sparsity]
+        bodies.append("".join(", " + member for member in members))
+    return bodies
+
+
+def build_timestamps(profile: ExportProfile, window_start: pendulum.DateTime, window_end: pendulum.DateTime,
+                     rng: random.Random) -> List[float]:
+    """ Function to build the Unix timestamps of the records within the window, in record order """
+
+    start, end = window_start.timestamp(), window_end.timestamp()
+    span = end - start
+    if profile.timestamps == "sorted":
+        return [start + span * index / profile.records for index in range(profile.records)]
+
+    if profile.timestamps == "bursty":
+        centers = [rng.uniform(start, end) for _ in range(max(1, profile.bursts))]
+        spread = span * BURST_SPREAD
+        return [min(max(rng.gauss(rng.choice(centers), spread), start), end - 0.001) for _ in range(profile.records)]
+
+    return [rng.uniform(start, end - 0.001) for _ in range(profile.records)]
+
+
+def _format_timestamp(timestamp: float, datetime_format: str) -> str:
+    if datetime_format == "millis":
+        return str(int(timestamp * 1000))
+    return json.dumps(pendulum.from_timestamp(timestamp).format("YYYY-MM-DDTHH:mm:ss.SSS[Z]"))
+
+
+def generate_export(directory: Path, profile: ExportProfile, window_start: pendulum.DateTime,
+                    window_end: pendulum.DateTime, schema_path: Path = BRANCH_EVENTS_SCHEMA) -> GeneratedExport:
+    """ Function to write the gzipped JSON lines export files of the profile, with records within the window
+
+    Returns:
+        GeneratedExport: Paths and sizes of the export files
+    """
+
+    with open(schema_path) as schema_file:
+        schema = json.load(schema_file)
+
+    rng = random.Random(profile.seed)
+    bodies = build_record_bodies(profile, schema, rng)
+    timestamps = build_timestamps(profile, window_start, window_end, rng)
+
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    export = GeneratedExport(records=profile.records)
+    files = max(1, profile.files)
+    records_per_file = -(-profile.records // files)
+    for part in range(files):
+        path = directory / "export-{}.json.gz".format(part)
+        first_record = part * records_per_file
+        last_record = min(profile.records, first_record + records_per_file)
+        with gzip.open(path, "wb", compresslevel=EXPORT_COMPRESS_LEVEL) as export_file:
+            for batch_start in range(first_record, last_record, WRITE_BATCH_RECORDS):
+                lines = [
+                    '{{"id": "{}", "timestamp": {}{}}}\n'.format(
+                        index, _format_timestamp(timestamps[index], profile.datetime_format), rng.choice(bodies))
+                    for index in range(batch_start, min(last_record, batch_start + WRITE_BATCH_RECORDS))
+                ]
+                data = "".join(lines).encode("utf-8")
+                export.raw_bytes += len(data)
+                export_file.write(data)
+        export.paths.append(path)
+        export.compressed_bytes += path.stat().st_size
+
+    return export
@@ -0,0 +1,277 @@
+""" Timed syncs of a branch events stream against the stub Branch export API """
+
+import contextlib
+import io
+import multiprocessing
+import resource
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Mapping, Optional
+
+import pendulum
+import singer
+from singer import metadata
+from singer.transform import UNIX_MILLISECONDS_INTEGER_DATETIME_PARSING
+
+from benchmarks.export_generator import ExportProfile, GeneratedExport, generate_export
+from benchmarks.stub_server import StubBranchServer
+from tap_branch.client import Client
+from tap_branch.discover import discover
+from tap_branch.message_writer import configure_message_writer, get_message_writer
+from tap_branch.streams import STREAMS
+
+DEFAULT_STREAM = "eo_click"
+
+# Length of the exported date window, ending when the export files are generated
+EXPORT_WINDOW_HOURS = 24
+
+MEGABYTE = 1024 * 1024
+
+# Every run is timed in a fresh process, the peak RSS of a process only grows
+RUN_MP_CONTEXT = "spawn"
+
+
+class StageTimings:
+    """
+    Wall-clock seconds spent in each stage of a sync.
+    ~~~
+    Nested measures of the same stage, e.g. the sub-windows of a truncated export, are only counted once.
+    """
+
+    def __init__(self) -> None:
+        self.seconds: Dict[str, float] = {}
+        self._depths: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+
+    @contextlib.contextmanager
+    def measure(self, stage: str) -> Iterator[None]:
+        with self._lock:
+            depth = self._depths.get(stage, 0)
+            self._depths[stage] = depth + 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._depths[stage] -= 1
+            if depth == 0:
+                self.add(stage, elapsed)
+
+
+class TimedRecordTransformer:
+    """ Record transformer of a stream, timing every record it transforms """
+
+    def __init__(self, record_transformer, timings: StageTimings) -> None:
+        self.record_transformer = record_transformer
+        self.timings = timings
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.record_transformer, name)
+
+    def transform(self, record: Dict) -> Dict:
+        started = time.perf_counter()
+        try:
+            return self.record_transformer.transform(record)
+        finally:
+            self.timings.add("transform", time.perf_counter() - started)
+
+
+class InstrumentedClient(Client):
+    """ Client timing the calls to the export API """
+
+    def __init__(self, config: Mapping[str, Any], timings: StageTimings, base_url: str) -> None:
+        super().__init__(config)
+        self.timings = timings
+        self.base_url = base_url
+        self.export_jobs = 0
+
+    def check_data_readiness(self, *args, **kwargs):
+        with self.timings.measure("data_ready"):
+            return super().check_data_readiness(*args, **kwargs)
+
+    def create_export_job(self, *args, **kwargs):
+        self.export_jobs += 1
+        with self.timings.measure("export_job_create"):
+            return super().create_export_job(*args, **kwargs)
+
+    def check_export_job_status(self, *args, **kwargs):
+        with self.timings.measure("export_job_poll"):
+            return super().check_export_job_status(*args, **kwargs)
+
+
+def build_instrumented_stream(stream_name: str, timings: StageTimings):
+    """ Function to build the stream class timing the processing of the exports and the transformation """
+
+    class InstrumentedStream(STREAMS[stream_name]):
+
+        def process_export(self, *args, **kwargs):
+            with timings.measure("process_export"):
+                return super().process_export(*args, **kwargs)
+
+        def get_record_transformer(self, transformer):
+            return TimedRecordTransformer(super().get_record_transformer(transformer), timings)
+
+    return InstrumentedStream
+
+
+class CountingSink(io.TextIOBase):
+    """ Standard output of the tap during a run, counting the characters written """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.characters = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: str) -> int:
+        self.characters += len(data)
+        return len(data)
+
+
+@dataclass
+class BenchmarkResult:
+    """ Measures of a timed sync """
+    records: int
+    seconds: float
+    records_per_sec: float
+    export_mb: float
+    export_mb_per_sec: float
+    compressed_mb: float
+    output_mb: float
+    peak_rss_mb: float
+    children_peak_rss_mb: float
+    stages: Dict[str, float] = field(default_factory=dict)
+
+
+@dataclass
+class BenchmarkReport:
+    """ Results of every run of a benchmark, with the profile and the tap config they used """
+    profile: Dict
+    config: Dict
+    runs: List[BenchmarkResult] = field(default_factory=list)
+
+    @property
+    def best(self) -> BenchmarkResult:
+        return max(self.runs, key=lambda run: run.records_per_sec)
+
+    def to_dict(self) -> Dict:
+        return {"profile": self.profile, "config": self.config,
+                "runs": [asdict(run) for run in self.runs], "best": asdict(self.best)}
+
+
+def get_peak_rss_mb(who: int = resource.RUSAGE_SELF) -> float:
+    """ Function to get the peak resident set size of the process, or of its terminated children """
+
+    peak_rss = resource.getrusage(who).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak_rss / MEGABYTE if sys.platform == "darwin" else peak_rss / 1024
+
+
+def build_catalog_entry(stream_name: str):
+    """ Function to get the discovered catalog entry of the stream, with the stream and all its fields selected """
+
+    catalog_entry = discover().get_stream(stream_name)
+    if catalog_entry is None:
+        raise ValueError("Unknown stream {}".format(stream_name))
+
+    mdata = metadata.to_map(catalog_entry.metadata)
+    mdata = metadata.write(mdata, (), "selected", True)
+    catalog_entry.metadata = metadata.to_list(mdata)
+    return catalog_entry
+
+
+def run_sync(export: GeneratedExport, server_url: str, config: Dict, stream_name: str) -> BenchmarkResult:
+    """ Function to time a full sync of the stream, from the data readiness check to the last STATE message
+
+    The peak RSS is the one of the whole process, see `run_sync_in_subprocess`.
+    """
+
+    timings = StageTimings()
+    client = InstrumentedClient(config, timings, server_url)
+    stream = build_instrumented_stream(stream_name, timings)(client, build_catalog_entry(stream_name))
+    sink = CountingSink()
+
+    with contextlib.redirect_stdout(sink):
+        configure_message_writer(config)
+        started = time.perf_counter()
+        with singer.Transformer(integer_datetime_fmt=UNIX_MILLISECONDS_INTEGER_DATETIME_PARSING) as transformer:
+            records = stream.sync({}, transformer)
+        get_message_writer().flush()
+        seconds = time.perf_counter() - started
+    client.download_transport.close()
+    client.transform_workers.shutdown()
+
+    # The export is decoded once per export job
+    export_jobs = max(1, client.export_jobs)
+    export_mb = export.raw_bytes * export_jobs / MEGABYTE
+    stages = dict(sorted(timings.seconds.items()))
+    if "process_export" in stages:
+        # Download, decompression, decoding and output, what the transformation leaves of the processing
+        stages["extract_and_write"] = stages["process_export"] - stages.get("transform", 0.0)
+
+    return BenchmarkResult(
+        records=records,
+        seconds=round(seconds, 3),
+        records_per_sec=round(records / seconds, 1) if seconds else 0.0,
+        export_mb=round(export_mb, 3),
+        export_mb_per_sec=round(export_mb / seconds, 3) if seconds else 0.0,
+        compressed_mb=round(export.compressed_bytes * export_jobs / MEGABYTE, 3),
+        output_mb=round(sink.characters / MEGABYTE, 3),
+        peak_rss_mb=round(get_peak_rss_mb(), 1),
+        children_peak_rss_mb=round(get_peak_rss_mb(resource.RUSAGE_CHILDREN), 1),
+        stages={stage: round(stage_seconds, 3) for stage, stage_seconds in stages.items()},
+    )
+
+
+def run_sync_in_subprocess(export: GeneratedExport, server_url: str, config: Dict,
+                           stream_name: str) -> BenchmarkResult:
+    """ Function to time a full sync of the stream in a fresh process, so its peak RSS is the one of this run only """
+
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context(RUN_MP_CONTEXT)) as executor:
+        return executor.submit(run_sync, export, server_url, config, stream_name).result()
+
+
+def run_benchmark(profile: ExportProfile, config: Optional[Mapping[str, Any]] = None, repeat: int = 1,
+                  stream_name: str = DEFAULT_STREAM, directory: Optional[Path] = None) -> BenchmarkReport:
+    """ Function to generate the export files of the profile, and time `repeat` syncs of the stream against them
+
+    Args:
+        profile (ExportProfile): Shape of the synthetic export
+        config (Mapping[str, Any], optional): Tap config of the runs, on top of the credentials and start date
+        repeat (int, optional): Number of timed syncs. Defaults to 1.
+        stream_name (str, optional): Stream to sync. Defaults to DEFAULT_STREAM.
+        directory (Path, optional): Directory of the export files. Defaults to a temporary directory.
+
+    Returns:
+        BenchmarkReport: Results of every run
+    """
+
+    window_end = pendulum.now("UTC").start_of("hour")
+    window_start = window_end.subtract(hours=EXPORT_WINDOW_HOURS)
+    run_config = {
+        "branch_app_id": "benchmark",
+        "branch_access_token": "benchmark",
+        "start_date": window_start.to_iso8601_string(),
+        **(config or {}),
+    }
+    report = BenchmarkReport(profile=asdict(profile),
+                             config={key: value for key, value in run_config.items() if key != "branch_access_token"})
+
+    with tempfile.TemporaryDirectory() if directory is None else contextlib.nullcontext(directory) as export_dir:
+        export = generate_export(Path(export_dir), profile, window_start, window_end)
+        for _ in range(max(1, repeat)):
+            with StubBranchServer(export.paths) as server:
+                report.runs.append(run_sync_in_subprocess(export, server.url, run_config, stream_name))
+
+    return report
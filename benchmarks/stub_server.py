@@ -0,0 +1,148 @@
+""" Local stub of the Branch export API, serving the synthetic export files """
+
+import json
+import re
+import shutil
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+
+EXPORT_FILE_PATTERN = re.compile(r"^/exports/(?P<part>\d+)$")
+POLL_EXPORT_JOB_PATTERN = re.compile(r"^/v2/logs/(?P<handle>[^/]+)/?$")
+CREATE_EXPORT_JOB_PATTERN = re.compile(r"^/v2/logs/?$")
+DATA_READY_PATTERN = re.compile(r"^/v2/data/ready/?$")
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+class StubBranchServer:
+    """
+    Serves the Branch export API from local files, for measuring the tap without network access.
+    ~~~
+    - `POST v2/data/ready`: the data is always ready
+    - `POST v2/logs`: creates an export job, complete right away
+    - `GET v2/logs/{handle}`: answers `complete` with the URLs of every export file
+    - `GET exports/{part}`: serves an export file
+
+    Every export job serves the same files, whatever its date window.
+    """
+
+    def __init__(self, export_paths: List[Path], host: str = "127.0.0.1", port: int = 0) -> None:
+        self.export_paths = [Path(path) for path in export_paths]
+        self.export_jobs: Dict[str, Dict] = {}
+        self.requests: Dict[str, int] = {}
+        self.bytes_served = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._build_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return "http://{}:{}".format(host, port)
+
+    def __enter__(self) -> "StubBranchServer":
+        self.start()
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _count_request(self, endpoint: str) -> None:
+        with self._lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+    def _create_export_job(self, payload: Dict) -> Dict:
+        handle = uuid.uuid4().hex
+        with self._lock:
+            self.export_jobs[handle] = payload
+        return {"handle": handle}
+
+    def _poll_export_job(self, handle: str) -> Optional[Dict]:
+        if handle not in self.export_jobs:
+            return None
+        return {
+            "status": "complete",
+            "code": 200,
+            "response_urls": ["{}/exports/{}".format(self.url, part) for part in range(len(self.export_paths))],
+        }
+
+    def _build_handler(self):
+        stub = self
+
+        class StubBranchRequestHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+                pass
+
+            def _read_json(self) -> Dict:
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                return json.loads(body) if body else {}
+
+            def _send_json(self, status: int, payload: Dict) -> None:
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                path = self.path.split("?", 1)[0]
+                payload = self._read_json()
+                if DATA_READY_PATTERN.match(path):
+                    stub._count_request("data_ready")
+                    self._send_json(200, {"data_ready": True})
+                elif CREATE_EXPORT_JOB_PATTERN.match(path):
+                    stub._count_request("logs_create")
+                    self._send_json(200, stub._create_export_job(payload))
+                else:
+                    self._send_json(404, {"error": {"message": "Not found"}})
+
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+                match = POLL_EXPORT_JOB_PATTERN.match(path)
+                if match:
+                    stub._count_request("logs_poll")
+                    response = stub._poll_export_job(match.group("handle"))
+                    if response is None:
+                        self._send_json(404, {"error": {"message": "Unknown export job"}})
+                    else:
+                        self._send_json(200, response)
+                    return
+
+                match = EXPORT_FILE_PATTERN.match(path)
+                if match and int(match.group("part")) < len(stub.export_paths):
+                    stub._count_request("export_file")
+                    self._send_file(stub.export_paths[int(match.group("part"))])
+                    return
+
+                self._send_json(404, {"error": {"message": "Not found"}})
+
+            def _send_file(self, path: Path) -> None:
+                size = path.stat().st_size
+                self.send_response(200)
+                self.send_header("Content-Type", "application/gzip")
+                self.send_header("Content-Length", str(size))
+                self.end_headers()
+                with open(path, "rb") as export_file:
+                    shutil.copyfileobj(export_file, self.wfile, COPY_BUFFER_SIZE)
+                with stub._lock:
+                    stub.bytes_served += size
+
+        return StubBranchRequestHandler
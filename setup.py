@@ -13,13 +13,18 @@ setup(
         "requests==2.32.5",
         "backoff==2.2.1",
         "pendulum==3.1.0",
+        "ciso8601==2.3.3",
+        "simplejson==3.20.2",
         "parameterized"
       ],
+      extras_require={
+        "orjson": ["orjson==3.10.18"]
+      },
       entry_points="""
           [console_scripts]
           tap-branch=tap_branch:main
       """,
-      packages=find_packages(),
+      packages=find_packages(exclude=["benchmarks", "benchmarks.*"]),
       package_data={
           "tap_branch": [
               "schemas/*.json",
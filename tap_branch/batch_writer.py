@@ -0,0 +1,98 @@
+""" BATCH output mode, writing the records to local compressed files announced by Singer BATCH messages """
+
+import gzip
+import os
+import tempfile
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional
+
+import singer
+
+from tap_branch.branch_constants import DEFAULT_BATCH_FILE_RECORDS
+from tap_branch.branch_utils import is_config_enabled
+from tap_branch.json_codec import DEFAULT_CODEC, JsonCodec
+from tap_branch.message_writer import write_batch
+
+LOGGER = singer.get_logger()
+
+BATCH_ENCODING = {"format": "jsonl", "compression": "gzip"}
+BATCH_FILE_SUFFIX = ".jsonl.gz"
+BATCH_COMPRESS_LEVEL = 6
+
+DEFAULT_BATCH_OUTPUT_DIR = os.path.join(tempfile.gettempdir(), "tap-branch-batches")
+
+
+class BatchWriter:
+    """
+    Writes the records of a stream to local JSONL.gz files instead of RECORD messages.
+    ~~~
+    Every file holds at most `max_records` records, one JSON document per line. A file is written
+    under a temporary name and moved in place when it is complete, then announced by a BATCH
+    message. `flush` completes the current file, so that a STATE message written afterwards
+    always follows the BATCH messages of the records it covers.
+    """
+
+    def __init__(self, directory: str, stream_name: str, max_records: int = DEFAULT_BATCH_FILE_RECORDS,
+                 codec: JsonCodec = DEFAULT_CODEC) -> None:
+        self.directory = Path(directory)
+        self.stream_name = stream_name
+        self.max_records = max(1, max_records)
+        self.codec = codec
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._file = None
+        self._temp_path: Optional[Path] = None
+        self._records = 0
+
+    @classmethod
+    def from_config(cls, config: Mapping[str, Any], stream_name: str,
+                    codec: JsonCodec = DEFAULT_CODEC) -> Optional["BatchWriter"]:
+        """ Function to build the writer from the tap config, None when `batch_output` is not enabled """
+
+        if not is_config_enabled(config, "batch_output"):
+            return None
+        return cls(config.get("batch_output_dir") or DEFAULT_BATCH_OUTPUT_DIR, stream_name,
+                   max_records=int(config.get("batch_file_records") or DEFAULT_BATCH_FILE_RECORDS), codec=codec)
+
+    def write_record(self, record: Dict) -> None:
+        self.write_encoded_record(self.codec.dumps(record))
+
+    def write_encoded_record(self, line: str) -> None:
+        """ Function to write a record already encoded as a JSON document, without the trailing newline """
+
+        if self._file is None:
+            self._temp_path = self.directory / ".tmp-{}{}".format(uuid.uuid4().hex, BATCH_FILE_SUFFIX)
+            self._file = gzip.open(self._temp_path, "wt", encoding="utf-8", compresslevel=BATCH_COMPRESS_LEVEL)
+
+        self._file.write(line)
+        self._file.write("\n")
+        self._records += 1
+        if self._records >= self.max_records:
+            self.flush()
+
+    def flush(self) -> Optional[Path]:
+        """ Function to complete the current file and announce it with a BATCH message
+
+        Returns:
+            Optional[Path]: Path of the completed file, None if no record was written since the last flush
+        """
+
+        if self._file is None:
+            return None
+
+        self._file.close()
+        path = self.directory / "{}-{}{}".format(self.stream_name, uuid.uuid4().hex, BATCH_FILE_SUFFIX)
+        os.replace(self._temp_path, path)
+        LOGGER.info("Wrote %s records of %s to %s", self._records, self.stream_name, path)
+        self._file, self._temp_path, self._records = None, None, 0
+
+        write_batch(self.stream_name, [path.as_uri()], BATCH_ENCODING)
+        return path
+
+    def abort(self) -> None:
+        """ Function to delete the file being written, when the export fails before it is complete """
+
+        if self._file is not None:
+            self._file.close()
+            self._temp_path.unlink(missing_ok=True)
+            self._file, self._temp_path, self._records = None, None, 0
@@ -1,9 +1,11 @@
 """ Branch API interaction related module """
 
 import json
+import os
+import threading
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, List, Literal, Optional, Set
+from typing import Dict, List, Literal, Optional, Set, Tuple
 
 # NOTE: These fields (from branch_events schema) are not supported while generating export reports
 # Hence having them listed here which will be excluded from payload
@@ -46,6 +48,59 @@ GLOBAL_EXPORT_FIELD_DENYLIST = {
 }
 
 
+class ExportFieldRegistry:
+    """
+    Process-wide cache of the export fields of the schema files.
+    ~~~
+    Each schema file is parsed once, and parsed again only when its modification time or size changes.
+    The fields are kept sorted and without the `GLOBAL_EXPORT_FIELD_DENYLIST` fields, so that the
+    payloads are deterministic.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._fields: Dict[Path, Tuple[Tuple[int, int], Tuple[str, ...]]] = {}
+
+    @staticmethod
+    def _load_fields(schema_path: Path) -> Tuple[str, ...]:
+        with open(schema_path, "r") as f:
+            schema = json.load(f)
+
+        return tuple(sorted(set(schema["properties"].keys()) - GLOBAL_EXPORT_FIELD_DENYLIST))
+
+    def get_fields(self, schema_path: Path) -> Tuple[str, ...]:
+        """ Function to get the exportable fields of the schema file
+
+        Args:
+            schema_path (Path): Schema file path
+
+        Returns:
+            Tuple[str, ...]: Sorted fields of the schema, without the globally denied fields
+        """
+
+        schema_path = Path(schema_path)
+        stat = os.stat(schema_path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._fields.get(schema_path)
+            if cached is None or cached[0] != version:
+                cached = (version, self._load_fields(schema_path))
+                self._fields[schema_path] = cached
+            return cached[1]
+
+    def invalidate(self, schema_path: Optional[Path] = None) -> None:
+        """ Function to drop the cached fields of a schema file, or of every schema file when not set """
+
+        with self._lock:
+            if schema_path is None:
+                self._fields.clear()
+            else:
+                self._fields.pop(Path(schema_path), None)
+
+
+EXPORT_FIELD_REGISTRY = ExportFieldRegistry()
+
+
 @dataclass(frozen=True)
 class EndpointConfig:
     required_headers: Set[str]
@@ -101,17 +156,24 @@ class BranchExportJobPayload:
     filter: List[str] = field(default_factory=list)
     timezone: str = "UTC"
 
-    def _load_fields(self) -> List[str]:
-        """ Function to load the schema file and extract keys
+    # Fields selected in the catalog, all the schema fields are exported when not set
+    selected_fields: Optional[List[str]] = None
+
+    def get_fields(self, rejected_fields: List[str] = None) -> List[str]:
+        """ Function to get the sorted fields of the export job, from the field registry
+
+        Args:
+            rejected_fields (List[str], optional): List of fields that are not supported for export. Defaults to None.
 
         Returns:
             List[str]: Keys to be used in branch export job payload
         """
 
-        with open(self.schema_path, "r") as f:
-            schema = json.load(f)
+        rejected = set(rejected_fields or [])
+        selected = set(self.selected_fields) if self.selected_fields is not None else None
 
-        return list(schema["properties"].keys())
+        return [field_name for field_name in EXPORT_FIELD_REGISTRY.get_fields(self.schema_path)
+                if field_name not in rejected and (selected is None or field_name in selected)]
 
     def to_payload(self, rejected_fields: List[str] = None) -> dict:
         """ Function to generate payload from the instantiated class
@@ -123,13 +185,11 @@ class BranchExportJobPayload:
             dict: Payload for export job
         """
 
-        rejected = set(rejected_fields or []) | GLOBAL_EXPORT_FIELD_DENYLIST
-
         return {
             "start_date": self.start_date,
             "end_date": self.end_date,
             "report_type": self.report_type,
-            "fields": list(set(self._load_fields()) - rejected),
+            "fields": self.get_fields(rejected_fields=rejected_fields),
             "limit": self.limit,
             "timezone": self.timezone,
             "filter": self.filter,
@@ -7,13 +7,73 @@ from typing import List
 
 MAX_BRANCH_DATE_WINDOW = 60
 
-# We will wait for 1 hour for an export job to be completed and it will be polled every 2 mins
+# We will wait for 1 hour for an export job to be completed and it will be polled at most every 2 mins
 JOB_TIMEOUT = 60 * 60
 POLL_INTERVAL = 60 * 2
 
+# Export jobs are first polled after a few seconds, and the wait grows geometrically up to POLL_INTERVAL
+DEFAULT_POLL_INITIAL_INTERVAL = 5
+DEFAULT_POLL_BACKOFF_FACTOR = 2
+
+# Number of export jobs running at the same time across report types; 1 syncs the streams one after another
+DEFAULT_MAX_CONCURRENT_EXPORT_JOBS = 1
+
+# Number of report types whose data readiness is checked at the same time before the sync
+DEFAULT_DATA_READY_WORKERS = 8
+
+# Number of later date windows of a stream whose export jobs are created while the current window is processed
+DEFAULT_EXPORT_LOOKAHEAD = 0
+
+# Requests per minute sent to each family of Branch API endpoints, before Branch answers with a rate limit
+DEFAULT_RATE_LIMITS_PER_MINUTE = {
+    "data_ready": 60,
+    "logs_create": 20,
+    "logs_poll": 60,
+}
+
 MAX_RETRY_WAIT_SECONDS = 60 * 15  # Wait for a retry period of 15 minutes.
 MAX_RECORDS_TO_FETCH = 1_000_000
 
+# Records per export aimed at by the adaptive window sizing, and the smallest window it plans
+DEFAULT_EXPORT_TARGET_RECORDS = MAX_RECORDS_TO_FETCH // 2
+MIN_ADAPTIVE_WINDOW_SECONDS = 60 * 60
+
+# A window whose export reached MAX_RECORDS_TO_FETCH is exported again as a whole, in this many
+# sub-windows, until the sub-windows get shorter than MIN_SPLIT_WINDOW_SECONDS
+EXPORT_SPLIT_FACTOR = 2
+MIN_SPLIT_WINDOW_SECONDS = 60
+
+# Characters of RECORD messages buffered before they are written to stdout, and seconds between two writes
+DEFAULT_OUTPUT_BUFFER_BYTES = 1024 * 1024
+DEFAULT_OUTPUT_FLUSH_INTERVAL = 1
+
+# Records per local file of the BATCH output mode
+DEFAULT_BATCH_FILE_RECORDS = 1_000_000
+
+# Leading records of an export checked against the schema before the passthrough mode is kept for the export
+DEFAULT_PASSTHROUGH_SAMPLE_RECORDS = 1000
+
+# Worker processes transforming the records of an export, 1 transforms them in the tap process
+DEFAULT_TRANSFORM_WORKERS = 1
+
+# Number of export part files downloaded in parallel when Branch splits an export across multiple files
+DEFAULT_EXPORT_DOWNLOAD_WORKERS = 4
+
+# Keep-alive connections pooled per host, and retries of the connection errors, of the HTTP sessions
+DEFAULT_HTTP_POOL_CONNECTIONS = 10
+DEFAULT_HTTP_POOL_MAXSIZE = 10
+DEFAULT_HTTP_MAX_RETRIES = 3
+
+# Number of times a broken export download is resumed before the error is raised
+MAX_DOWNLOAD_RESUMES = 5
+
+# Records read, or seconds elapsed, between two checkpoints of the progress through the export of a window
+DEFAULT_EXPORT_CHECKPOINT_RECORDS = 100_000
+DEFAULT_EXPORT_CHECKPOINT_INTERVAL = 60 * 5
+
+# Maximum size of the local spool of completed exports, the least recently used exports are evicted beyond it
+DEFAULT_EXPORT_SPOOL_MAX_BYTES = 10 * 1024 ** 3
+
 BASE_DIR = Path(__file__).resolve().parent
 
 SCHEMAS_DIR = BASE_DIR / "schemas"
@@ -1,4 +1,5 @@
 import re
+from typing import Any, Dict, List, Mapping
 
 import requests
 import singer
@@ -17,11 +18,43 @@ def extract_field_from_message(message: str) -> list[str]:
     return [field]
 
 
+def is_config_enabled(config: Mapping[str, Any], key: str, default: bool = False) -> bool:
+    """ Function to read a boolean flag from the config, which may be given as a string """
+
+    value = config.get(key)
+    if value is None or value == "":
+        return default
+    if isinstance(value, str):
+        return value.strip().lower() in ("true", "1", "yes")
+    return bool(value)
+
+
 def extract_retry_seconds(message):
     match = re.search(r"retry after (\d+)", message.lower())
     return int(match.group(1)) if match else None
 
 
+def get_export_file_urls(job_response: Dict) -> List[str]:
+    """ Function to collect every export file URL from a completed export job response
+
+    Exports created with `allow_multiple_files` can be split across several part files.
+    Branch returns them either as a list under `response_urls` or directly in `response_url`.
+
+    Args:
+        job_response (Dict): Response of the completed export job
+
+    Returns:
+        List[str]: Export file URLs in the order returned by Branch
+    """
+
+    urls = job_response.get("response_urls") or job_response.get("response_url") or []
+    if isinstance(urls, str):
+        urls = [urls]
+
+    # Drop duplicates while keeping the order returned by Branch
+    return list(dict.fromkeys(url for url in urls if url))
+
+
 def handle_branch_validation_error(response: requests.Response):
     """ Function to check and extract unsupported fields in branch export request
 
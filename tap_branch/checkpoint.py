@@ -0,0 +1,98 @@
+""" Checkpoints of the progress through the export of a date window """
+
+import time
+from typing import Any, Dict, Mapping, Optional
+
+import pendulum
+from singer import bookmarks
+
+from tap_branch.branch_constants import (DEFAULT_EXPORT_CHECKPOINT_INTERVAL,
+                                         DEFAULT_EXPORT_CHECKPOINT_RECORDS)
+
+# Bookmark key of the checkpoint of the window being exported
+EXPORT_CHECKPOINT_KEY = "export_checkpoint"
+
+# Records read between two checks of the elapsed time
+TIME_CHECK_RECORDS = 1000
+
+
+def get_export_checkpoint(state: Dict, tap_stream_id: str, export_id: str,
+                          window_start: pendulum.DateTime) -> Optional[Dict]:
+    """ Function to get the checkpoint of the export, None if the state holds no checkpoint of that export """
+
+    checkpoint = state.get("bookmarks", {}).get(tap_stream_id, {}).get(EXPORT_CHECKPOINT_KEY)
+    if (not checkpoint or checkpoint.get("export_id") != export_id
+            or checkpoint.get("window_start") != window_start.to_iso8601_string()):
+        return None
+    return checkpoint
+
+
+def write_export_checkpoint(state: Dict, tap_stream_id: str, export_id: str, window_start: pendulum.DateTime,
+                            records_read: int, max_bookmark: pendulum.DateTime) -> Dict:
+    """ Function to save the records read so far from the export and the bookmark they reached
+
+    The replication key bookmark is left at the window start, since the records of an export are not sorted.
+    """
+
+    return bookmarks.write_bookmark(state, tap_stream_id, EXPORT_CHECKPOINT_KEY, {
+        "export_id": export_id,
+        "window_start": window_start.to_iso8601_string(),
+        "records_read": records_read,
+        "max_bookmark": max_bookmark.to_iso8601_string(),
+    })
+
+
+def clear_export_checkpoint(state: Dict, tap_stream_id: str) -> Dict:
+    return bookmarks.clear_bookmark(state, tap_stream_id, EXPORT_CHECKPOINT_KEY)
+
+
+class CheckpointSchedule:
+    """
+    Decides when to checkpoint while the records of an export are emitted.
+    ~~~
+    A checkpoint is due every `every_records` records, or every `every_seconds` seconds,
+    whichever comes first. A value of 0 disables that trigger.
+    """
+
+    def __init__(self, every_records: int = DEFAULT_EXPORT_CHECKPOINT_RECORDS,
+                 every_seconds: float = DEFAULT_EXPORT_CHECKPOINT_INTERVAL) -> None:
+        self.every_records = every_records
+        self.every_seconds = every_seconds
+        self._last_records = 0
+        self._last_time = time.monotonic()
+        self._time_checked_records = 0
+
+    @classmethod
+    def from_config(cls, config: Mapping[str, Any]) -> "CheckpointSchedule":
+        """ Function to build the schedule from the tap config """
+
+        every_records = config.get("export_checkpoint_records")
+        every_seconds = config.get("export_checkpoint_interval")
+        return cls(
+            every_records=int(every_records) if every_records not in (None, "") else DEFAULT_EXPORT_CHECKPOINT_RECORDS,
+            every_seconds=float(every_seconds) if every_seconds not in (None, "") else DEFAULT_EXPORT_CHECKPOINT_INTERVAL,
+        )
+
+    def start(self, records_read: int = 0) -> None:
+        """ Function to start the schedule from the records already read, when resuming from a checkpoint """
+
+        self._last_records = records_read
+        self._last_time = time.monotonic()
+        self._time_checked_records = records_read
+
+    def is_due(self, records_read: int) -> bool:
+        """ Function to check whether a checkpoint is due after `records_read` records, and to mark it done if so """
+
+        records = records_read - self._last_records
+        if self.every_records and records >= self.every_records:
+            is_due = True
+        elif self.every_seconds and records_read - self._time_checked_records >= TIME_CHECK_RECORDS:
+            # Records are read one at a time, or a chunk at a time with the transform workers
+            self._time_checked_records = records_read
+            is_due = time.monotonic() - self._last_time >= self.every_seconds
+        else:
+            is_due = False
+
+        if is_due:
+            self.start(records_read)
+        return is_due
@@ -1,3 +1,4 @@
+import threading
 import time
 from pathlib import Path
 from typing import Any, Dict, Mapping, Optional, Tuple
@@ -14,14 +15,22 @@ from tap_branch.branch_api_contract import (BranchDataReadyPayload,
                                             BranchExportJobPayload,
                                             EndpointConfig)
 from tap_branch.branch_constants import (JOB_TIMEOUT, MAX_RECORDS_TO_FETCH,
-                                         MAX_RETRY_WAIT_SECONDS, POLL_INTERVAL)
+                                         MAX_RETRY_WAIT_SECONDS)
 from tap_branch.branch_utils import (extract_retry_seconds,
                                      handle_branch_validation_error,
                                      raise_for_branch_rate_limit)
 from tap_branch.exceptions import (ERROR_CODE_EXCEPTION_MAPPING, BranchError,
                                    BranchExportFailed, BranchExportTimeout,
+                                   BranchFatalRateLimitError,
                                    BranchRateLimitError, BranchServer5xxError,
                                    BranchUnsupportedFieldsError)
+from tap_branch.field_compatibility import ExportFieldCompatibility
+from tap_branch.pending_jobs import PendingExportJobs
+from tap_branch.polling import AdaptivePollSchedule
+from tap_branch.rate_limiter import RateLimiter, get_endpoint_family
+from tap_branch.transform_pool import TransformWorkers
+from tap_branch.transport import (configure_download_transport,
+                                  mount_http_adapters)
 
 LOGGER = get_logger()
 REQUEST_TIMEOUT = 300
@@ -91,10 +100,21 @@ class Client:
 
     def __init__(self, config: Mapping[str, Any]) -> None:
         self.config = config
-        self._session = session()
+        # The API calls are retried with backoff by the client, their adapters only pool the connections
+        self._session = mount_http_adapters(session(), max_retries=0)
+        self.download_transport = configure_download_transport(config)
         self.base_url = "https://api2.branch.io"
         config_request_timeout = config.get("request_timeout")
         self.request_timeout = float(config_request_timeout) if config_request_timeout else REQUEST_TIMEOUT
+        self.poll_schedule = AdaptivePollSchedule.from_config(config)
+        self.field_compatibility = ExportFieldCompatibility()
+        self.pending_export_jobs = PendingExportJobs()
+        self.rate_limiter = RateLimiter.from_config(config)
+        # Worker processes transforming the records, started once and shared by every export of the sync
+        self.transform_workers = TransformWorkers.from_config(config)
+        # Data readiness answers per (report type, date), shared by the pre-flight check and every stream
+        self._data_readiness: Dict[Tuple[str, str], bool] = {}
+        self._data_readiness_lock = threading.Lock()
 
     def __enter__(self):
         self.check_api_credentials()
@@ -102,6 +122,8 @@ class Client:
 
     def __exit__(self, exception_type, exception_value, traceback):
         self._session.close()
+        self.download_transport.close()
+        self.transform_workers.shutdown()
 
     def check_api_credentials(self) -> None:
         pass
@@ -206,6 +228,9 @@ class Client:
     ) -> Optional[Mapping[Any, Any]]:
         """Performs HTTP Operations."""
         method = method.upper()
+        endpoint_family = get_endpoint_family(method, endpoint)
+        # Every attempt, including the retries, waits for the request budget of the endpoint family
+        self.rate_limiter.acquire(endpoint_family)
         with metrics.http_request_timer(endpoint):
             if method in ("GET", "POST"):
                 if method == "GET":
@@ -214,16 +239,25 @@ class Client:
                 if response.status_code == 400:
                     # Specific condition to handle validation error for export Job
                     handle_branch_validation_error(response)
-                raise_for_error(response)
+                try:
+                    raise_for_error(response)
+                except (BranchRateLimitError, BranchFatalRateLimitError) as err:
+                    self.rate_limiter.record_rate_limit(endpoint_family, extract_retry_seconds(str(err)))
+                    raise
             else:
                 raise ValueError(f"Unsupported method: {method}")
 
+        self.rate_limiter.record_success(endpoint_family)
+
         return response.json()
 
     def check_data_readiness(self, export_start: str,
                              report_type: str, api_config: BranchExportConfig):
         """ Function to check readiness of data for the specific export start
 
+        The answer is cached per report type and date for the rest of the run, Branch reports
+        the readiness of whole days.
+
         Args:
             export_start (str): Datetime when the export job is about to start
             report_type (str): Report type
@@ -231,6 +265,12 @@ class Client:
 
         """
 
+        readiness_key = (report_type, pendulum.parse(export_start).to_date_string())
+        with self._data_readiness_lock:
+            is_data_ready = self._data_readiness.get(readiness_key)
+        if is_data_ready is not None:
+            return is_data_ready
+
         data_ready_payload = BranchDataReadyPayload(
                                 date=export_start,
                                 warehouse_meta_type="EVENT",
@@ -249,6 +289,8 @@ class Client:
                             )
 
         is_data_ready = data_ready_response["data_ready"]
+        with self._data_readiness_lock:
+            self._data_readiness[readiness_key] = is_data_ready
 
         return is_data_ready
 
@@ -274,30 +316,43 @@ class Client:
 
         return status, response
 
-    def check_export_job_status(self, request_handle, api_config: BranchExportConfig):
+    def check_export_job_status(self, request_handle, api_config: BranchExportConfig, report_type: str = None):
         """ Function to check the export job
 
+        The job is polled following the adaptive poll schedule, which starts with short
+        waits and uses the durations of earlier jobs of the same report_type.
+
         Args:
             request_handle (str): Request handle for the Export Job
             api_config (BranchExportConfig): Endpoint specific config
+            report_type (str, optional): Report type of the export job. Defaults to None.
 
         Raises:
             BranchExportFailed: In case if the export job fails or exceeds the set timeout
         """
 
-        timeout_time = pendulum.now("UTC").add(seconds=JOB_TIMEOUT)
-        while pendulum.now("UTC") < timeout_time:
+        started_at = pendulum.now("UTC")
+        timeout_time = started_at.add(seconds=JOB_TIMEOUT)
+        attempt = 0
+        while True:
+            polled_at = pendulum.now("UTC")
+            if polled_at >= timeout_time:
+                break
+
             status, export_job_response = self.poll_export_job(api_config=api_config)
             LOGGER.info("Current export status of handle %s is %s", request_handle, status)
+            elapsed = (polled_at - started_at).total_seconds()
 
             if status == "complete":
                 # If the status is finished, then the data is ready to be consumed
+                self.poll_schedule.record_duration(report_type, elapsed, request_handle=request_handle)
                 return True, export_job_response
 
             elif status in ["cancelled", "fail"]:
                 raise BranchExportFailed("Export job failed with status: {}".format(status))
 
-            time.sleep(POLL_INTERVAL)
+            time.sleep(self.poll_schedule.next_interval(report_type, elapsed, attempt, export_job_response))
+            attempt += 1
 
         raise BranchExportTimeout("Export Job timed out after {} minutes".format(JOB_TIMEOUT / 60))
 
@@ -318,36 +373,35 @@ class Client:
                                 end_date=end_date,
                                 report_type=report_type,
                                 schema_path=Path(api_config.additional_data["schema_path"]),
+                                selected_fields=api_config.additional_data.get("selected_fields"),
                                 limit=MAX_RECORDS_TO_FETCH,
                                 filter=[],
                                 response_format="json",
                                 response_format_compression="gz",
                                 allow_multiple_files=True
                             )
-        payload_data = export_job_payload.to_payload()
 
         # NOTE: We don't have any mapping of report_type specific fields. Hence we pass all fields to the payload
-        # The API returns Bad request and we catch the same, exclude the fields and re-raise request
-        try:
-            export_job_response = self.make_request(
-                                    method=api_config.method,
-                                    endpoint=None,
-                                    path=api_config.path,
-                                    params=api_config.query_params_data,
-                                    headers=api_config.headers_data,
-                                    body=payload_data
-                                )
-        except BranchUnsupportedFieldsError as e:
-            rejected_fields = e.fields
-            new_payload_data = export_job_payload.to_payload(rejected_fields=rejected_fields)
-            export_job_response = self.make_request(
-                                    method=api_config.method,
-                                    endpoint=None,
-                                    path=api_config.path,
-                                    params=api_config.query_params_data,
-                                    headers=api_config.headers_data,
-                                    body=new_payload_data
-                                )
+        # The API returns Bad request and we catch the same, exclude the fields and re-raise request.
+        # The rejected fields are remembered, so later export jobs of the report_type exclude them up front
+        rejected_fields = self.field_compatibility.get_unsupported_fields(report_type)
+        while True:
+            payload_data = export_job_payload.to_payload(rejected_fields=rejected_fields)
+            try:
+                export_job_response = self.make_request(
+                                        method=api_config.method,
+                                        endpoint=None,
+                                        path=api_config.path,
+                                        params=api_config.query_params_data,
+                                        headers=api_config.headers_data,
+                                        body=payload_data
+                                    )
+                break
+            except BranchUnsupportedFieldsError as e:
+                # Give up when Branch rejects fields that are already excluded, it would loop forever
+                if not self.field_compatibility.add_unsupported_fields(report_type, e.fields):
+                    raise
+                rejected_fields = self.field_compatibility.get_unsupported_fields(report_type)
 
         request_handle = export_job_response["handle"]
         LOGGER.info("Received request_handle %s for export report_type %s", request_handle, report_type)
@@ -0,0 +1,265 @@
+""" Staged pipeline decoding gzipped JSON lines export files on background threads """
+
+import json
+import queue
+import threading
+import zlib
+from typing import (Any, BinaryIO, Callable, Dict, Iterable, Iterator, List,
+                    Optional, Set, Union)
+
+import singer
+
+LOGGER = singer.get_logger()
+
+READ_CHUNK_SIZE = 1024 * 1024
+LINE_BATCH_SIZE = 1000
+QUEUE_SIZE = 8
+
+# Seconds a stage waits on a queue before checking whether the pipeline was stopped
+QUEUE_POLL_TIMEOUT = 0.5
+
+_END_OF_STAGE = object()
+
+
+class _StageError:
+    """ Wrapper handing the exception of a stage over to the next stage """
+
+    def __init__(self, error: BaseException) -> None:
+        self.error = error
+
+
+def read_chunks(fileobj: BinaryIO, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[bytes]:
+    """ Function to read the compressed export body in chunks """
+
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def decompress_lines(chunks: Iterable[bytes], batch_size: int = LINE_BATCH_SIZE) -> Iterator[List[bytes]]:
+    """ Function to decompress gzip chunks and split them into batches of lines
+
+    Handles gzip bodies made of several concatenated members, same as `gzip.GzipFile`.
+    """
+
+    decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+    member_started = False
+    pending = b""
+    batch = []
+    for chunk in chunks:
+        while chunk:
+            member_started = True
+            data = decompressor.decompress(chunk)
+            chunk = b""
+            if decompressor.eof:
+                # Start a new decompressor for the next gzip member, if any
+                chunk = decompressor.unused_data
+                decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+                member_started = False
+
+            lines = (pending + data).split(b"\n")
+            pending = lines.pop()
+            batch.extend(lines)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+
+    if member_started:
+        raise EOFError("Compressed file ended before the end-of-stream marker was reached")
+
+    if pending:
+        batch.append(pending)
+    if batch:
+        yield batch
+
+
+def get_line_hash(line: Union[bytes, str]) -> int:
+    """ Function to hash a raw export line, the same way whether it was split as bytes or read as text """
+
+    if isinstance(line, str):
+        line = line.rstrip("\n").encode("utf-8")
+    return hash(line)
+
+
+class LineSkipper:
+    """
+    Skips lines of an export before they are decoded, across the files of the export.
+    ~~~
+    - The first `lines` lines are dropped, to resume an export after a checkpoint
+    - The lines whose hash is in `emitted_lines` are replaced with None, to export a truncated
+      window again without emitting the lines of the truncated export twice. They are still
+      counted as read, so they keep their place in the checkpoints and the record limit.
+
+    The lines are only split, not decoded, so skipping them costs the decompression alone.
+    """
+
+    def __init__(self, lines: int = 0, emitted_lines: Optional[Set[int]] = None) -> None:
+        self.remaining = lines
+        self.emitted_lines = emitted_lines
+
+    def is_emitted(self, line: Union[bytes, str]) -> bool:
+        return self.emitted_lines is not None and get_line_hash(line) in self.emitted_lines
+
+    def skip(self, batches: Iterable[List[bytes]]) -> Iterator[List[Optional[bytes]]]:
+        """ Function to drop the lines left to skip from the batches of raw lines """
+
+        emitted_lines = self.emitted_lines
+        for batch in batches:
+            if self.remaining:
+                skipped = min(self.remaining, len(batch))
+                batch = batch[skipped:]
+                self.remaining -= skipped
+                if not batch:
+                    continue
+            if emitted_lines:
+                batch = [None if hash(line) in emitted_lines else line for line in batch]
+            yield batch
+
+
+def decode_lines(batches: Iterable[List[Optional[bytes]]], data_url: str = None,
+                 loads: Callable[[bytes], Any] = json.loads) -> Iterator[List[Optional[Dict]]]:
+    """ Function to decode batches of JSON lines, skipping malformed lines
+
+    A line replaced with None by a `LineSkipper` is kept as a None record.
+    """
+
+    line_num = 0
+    for batch in batches:
+        records = []
+        for line in batch:
+            line_num += 1
+            if line is None:
+                records.append(None)
+                continue
+            try:
+                records.append(loads(line))
+            except ValueError as e:
+                LOGGER.warning("Skipping malformed JSON at line %s of %s: %s", line_num, data_url, e)
+        yield records
+
+
+class StagedPipeline:
+    """
+    Runs the stages of a generator chain on their own threads.
+    ~~~
+    Each stage consumes the output of the previous stage through a bounded queue,
+    so the network reads and the decompression overlap with the work of the consumer.
+    The order of the items is preserved, and an exception raised in a stage is re-raised
+    to the consumer.
+    """
+
+    def __init__(self, queue_size: int = QUEUE_SIZE) -> None:
+        self.queue_size = queue_size
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def _put(self, output: queue.Queue, item: Any) -> bool:
+        while not self._stop.is_set():
+            try:
+                output.put(item, timeout=QUEUE_POLL_TIMEOUT)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _iter_queue(self, source: queue.Queue) -> Iterator[Any]:
+        while not self._stop.is_set():
+            try:
+                item = source.get(timeout=QUEUE_POLL_TIMEOUT)
+            except queue.Empty:
+                continue
+            if item is _END_OF_STAGE:
+                return
+            if isinstance(item, _StageError):
+                raise item.error
+            yield item
+
+    def _run_stage(self, items: Iterable[Any], output: queue.Queue) -> None:
+        try:
+            for item in items:
+                if not self._put(output, item):
+                    return
+            self._put(output, _END_OF_STAGE)
+        except BaseException as err:  # Hand the error over to the next stage
+            self._put(output, _StageError(err))
+
+    def _start_thread(self, items: Iterable[Any], output: queue.Queue) -> None:
+        thread = threading.Thread(target=self._run_stage, args=(items, output), daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def start(self, source: Iterable[Any], *stages: Callable[[Iterable[Any]], Iterable[Any]]) -> Iterator[Any]:
+        """ Function to start the stages on background threads
+
+        Args:
+            source (Iterable[Any]): Items produced by the first stage
+            stages (Callable): Generator functions transforming the items of the previous stage
+
+        Returns:
+            Iterator[Any]: Items produced by the last stage, in order
+        """
+
+        output = queue.Queue(maxsize=self.queue_size)
+        self._start_thread(source, output)
+        for stage in stages:
+            upstream = output
+            output = queue.Queue(maxsize=self.queue_size)
+            self._start_thread(stage(self._iter_queue(upstream)), output)
+
+        return self._iter_queue(output)
+
+    def stop(self) -> None:
+        """ Function to stop every stage and wait for the threads to finish """
+
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+
+
+def iter_export_line_batches(fileobj: BinaryIO, batch_size: int = LINE_BATCH_SIZE,
+                             line_skipper: Optional[LineSkipper] = None) -> Iterator[List[Optional[bytes]]]:
+    """ Function to split a gzipped JSON lines export file into batches of raw lines
+
+    Network reads and decompression with line splitting each run on their own thread,
+    while the caller decodes the lines, e.g. in worker processes.
+    """
+
+    pipeline = StagedPipeline()
+    try:
+        line_batches = pipeline.start(read_chunks(fileobj), lambda chunks: decompress_lines(chunks, batch_size))
+        yield from line_skipper.skip(line_batches) if line_skipper is not None else line_batches
+    finally:
+        pipeline.stop()
+
+
+def iter_export_records(fileobj: BinaryIO, data_url: str = None, loads: Callable[[bytes], Any] = json.loads,
+                        line_skipper: Optional[LineSkipper] = None) -> Iterator[Dict]:
+    """ Function to decode the records of a gzipped JSON lines export file
+
+    Network reads, decompression with line splitting and JSON decoding each run on their
+    own thread, while the caller transforms and writes the records.
+
+    Args:
+        fileobj (BinaryIO): Compressed export body
+        data_url (str, optional): URL of the export file, used for logging. Defaults to None.
+        loads (Callable, optional): JSON decoder of the lines. Defaults to json.loads.
+        line_skipper (LineSkipper, optional): Lines to skip before decoding. Defaults to None.
+
+    Yields:
+        Optional[Dict]: Export records in file order, None for the lines already emitted
+    """
+
+    def decode(batches: Iterable[List[bytes]]) -> Iterator[List[Dict]]:
+        if line_skipper is not None:
+            batches = line_skipper.skip(batches)
+        return decode_lines(batches, data_url=data_url, loads=loads)
+
+    pipeline = StagedPipeline()
+    try:
+        record_batches = pipeline.start(read_chunks(fileobj), decompress_lines, decode)
+        for records in record_batches:
+            yield from records
+    finally:
+        pipeline.stop()
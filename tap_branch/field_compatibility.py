@@ -0,0 +1,63 @@
+""" Export fields learned as unsupported per report type, persisted in the state """
+
+import threading
+from typing import Dict, Iterable, List, Set
+
+import singer
+
+LOGGER = singer.get_logger()
+
+# State key holding the unsupported export fields of each report type
+UNSUPPORTED_EXPORT_FIELDS_KEY = "unsupported_export_fields"
+
+
+class ExportFieldCompatibility:
+    """
+    Tracks the fields Branch rejected for the export jobs of each report type.
+    ~~~
+    The fields are excluded up front from the next export job payloads of the report type,
+    and are written to the state so that later runs skip the rejected request as well.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._unsupported_fields: Dict[str, Set[str]] = {}
+
+    def load_state(self, state: Dict) -> None:
+        """ Function to merge the unsupported fields saved in the state """
+
+        with self._lock:
+            for report_type, fields in (state.get(UNSUPPORTED_EXPORT_FIELDS_KEY) or {}).items():
+                self._unsupported_fields.setdefault(report_type, set()).update(fields)
+
+    def write_state(self, state: Dict) -> Dict:
+        """ Function to save the unsupported fields of every report type in the state """
+
+        with self._lock:
+            if self._unsupported_fields:
+                state[UNSUPPORTED_EXPORT_FIELDS_KEY] = {
+                    report_type: sorted(fields) for report_type, fields in sorted(self._unsupported_fields.items())
+                }
+        return state
+
+    def get_unsupported_fields(self, report_type: str) -> List[str]:
+        """ Function to get the sorted unsupported fields of the report type """
+
+        with self._lock:
+            return sorted(self._unsupported_fields.get(report_type, ()))
+
+    def add_unsupported_fields(self, report_type: str, fields: Iterable[str]) -> Set[str]:
+        """ Function to record the fields rejected for the report type
+
+        Returns:
+            Set[str]: Fields that were not known as unsupported yet
+        """
+
+        with self._lock:
+            unsupported_fields = self._unsupported_fields.setdefault(report_type, set())
+            new_fields = set(fields) - unsupported_fields
+            unsupported_fields.update(new_fields)
+
+        if new_fields:
+            LOGGER.info("Learned unsupported export fields %s for the report_type %s", sorted(new_fields), report_type)
+        return new_fields
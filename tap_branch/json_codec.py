@@ -0,0 +1,88 @@
+""" JSON codec used on the record hot path, backed by orjson when it is installed """
+
+import json
+from typing import Any, Dict, Mapping, Union
+
+import simplejson
+import singer
+
+try:
+    import orjson
+except ImportError:  # orjson is an optional dependency
+    orjson = None
+
+LOGGER = singer.get_logger()
+
+CODEC_AUTO = "auto"
+CODEC_ORJSON = "orjson"
+CODEC_STDLIB = "stdlib"
+
+
+# Same encoder settings as `singer.format_message`, so that the encoded messages are byte-identical
+_singer_encoder = json.JSONEncoder(ensure_ascii=True, allow_nan=False)
+
+
+class JsonCodec:
+    """
+    Decodes export lines and encodes Singer RECORD messages.
+    ~~~
+    Backends:
+     - `auto`: decodes with orjson when installed and encodes byte-identical to `singer.write_record`
+     - `orjson`: also encodes with orjson, which writes the same JSON values in compact UTF-8 form
+     - `stdlib`: only uses the `json` module of the standard library
+    """
+
+    def __init__(self, codec: str = CODEC_AUTO) -> None:
+        if codec not in (CODEC_AUTO, CODEC_ORJSON, CODEC_STDLIB):
+            raise ValueError("Unsupported json_codec {}, expected one of auto, orjson, stdlib".format(codec))
+
+        if codec == CODEC_ORJSON and orjson is None:
+            LOGGER.warning("orjson is not installed, falling back to the standard library JSON codec")
+            codec = CODEC_AUTO
+
+        self.codec = codec
+        self.decodes_with_orjson = orjson is not None and codec != CODEC_STDLIB
+        self.encodes_with_orjson = orjson is not None and codec == CODEC_ORJSON
+
+    @classmethod
+    def from_config(cls, config: Mapping[str, Any]) -> "JsonCodec":
+        """ Function to build the codec from the tap config """
+
+        return cls(config.get("json_codec") or CODEC_AUTO)
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        """ Function to decode a JSON document
+
+        Raises:
+            ValueError: If the document is not valid JSON
+        """
+
+        if self.decodes_with_orjson:
+            return orjson.loads(data)
+        return json.loads(data)
+
+    def format_record_message(self, stream_name: str, record: Dict) -> str:
+        """ Function to encode a Singer RECORD message, without the trailing newline """
+
+        message = {"type": "RECORD", "stream": stream_name, "record": record}
+        try:
+            if self.encodes_with_orjson:
+                return orjson.dumps(message).decode("utf-8")
+            return _singer_encoder.encode(message)
+        except TypeError:
+            # Values outside of the JSON types, e.g. Decimal, are encoded by singer itself
+            return singer.format_message(singer.RecordMessage(stream=stream_name, record=record))
+
+    def dumps(self, value: Any) -> str:
+        """ Function to encode a JSON document with the same settings as the RECORD messages """
+
+        try:
+            if self.encodes_with_orjson:
+                return orjson.dumps(value).decode("utf-8")
+            return _singer_encoder.encode(value)
+        except TypeError:
+            # Same fallback as `singer.format_message` for values outside of the JSON types
+            return simplejson.dumps(value, use_decimal=True)
+
+
+DEFAULT_CODEC = JsonCodec()
@@ -0,0 +1,116 @@
+""" Buffered writer of the Singer messages written to stdout """
+
+import json
+import sys
+import time
+from typing import Any, Dict, List, Mapping
+
+import singer
+
+from tap_branch.branch_constants import (DEFAULT_OUTPUT_BUFFER_BYTES,
+                                         DEFAULT_OUTPUT_FLUSH_INTERVAL)
+from tap_branch.json_codec import DEFAULT_CODEC, JsonCodec
+
+
+class BufferedMessageWriter:
+    """
+    Accumulates the encoded RECORD messages and writes them to stdout in large chunks.
+    ~~~
+    The buffer is flushed once it holds `max_bytes` characters, once `flush_interval` seconds
+    have passed since the last flush, and before any other message. STATE messages are
+    therefore always written after the records that precede them. A `max_bytes` of 0
+    writes and flushes every record on its own, like `singer.write_record`.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_OUTPUT_BUFFER_BYTES,
+                 flush_interval: float = DEFAULT_OUTPUT_FLUSH_INTERVAL) -> None:
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self._lines: List[str] = []
+        self._size = 0
+        self._flushed_at = time.monotonic()
+
+    @classmethod
+    def from_config(cls, config: Mapping[str, Any]) -> "BufferedMessageWriter":
+        """ Function to build the writer from the tap config """
+
+        max_bytes = config.get("output_buffer_bytes")
+        flush_interval = config.get("output_flush_interval")
+        return cls(
+            max_bytes=int(max_bytes) if max_bytes not in (None, "") else DEFAULT_OUTPUT_BUFFER_BYTES,
+            flush_interval=float(flush_interval) if flush_interval not in (None, "") else DEFAULT_OUTPUT_FLUSH_INTERVAL,
+        )
+
+    def write_record(self, stream_name: str, record: Dict, codec: JsonCodec = DEFAULT_CODEC) -> None:
+        self.write_message(codec.format_record_message(stream_name, record))
+
+    def write_message(self, message: str) -> None:
+        """ Function to buffer an encoded message, without the trailing newline """
+
+        line = message + "\n"
+        self._lines.append(line)
+        self._size += len(line)
+        if self._size >= self.max_bytes or time.monotonic() - self._flushed_at >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        """ Function to write the buffered records to stdout """
+
+        if self._lines:
+            sys.stdout.write("".join(self._lines))
+            self._lines = []
+            self._size = 0
+        sys.stdout.flush()
+        self._flushed_at = time.monotonic()
+
+
+_message_writer = BufferedMessageWriter()
+
+
+def get_message_writer() -> BufferedMessageWriter:
+    return _message_writer
+
+
+def configure_message_writer(config: Mapping[str, Any]) -> BufferedMessageWriter:
+    """ Function to size the output buffer from the tap config """
+
+    global _message_writer
+
+    _message_writer.flush()
+    _message_writer = BufferedMessageWriter.from_config(config)
+    return _message_writer
+
+
+def write_record(stream_name: str, record: Dict, codec: JsonCodec = DEFAULT_CODEC) -> None:
+    """ Function to buffer a Singer RECORD message """
+
+    _message_writer.write_record(stream_name, record, codec)
+
+
+def write_record_message(message: str) -> None:
+    """ Function to buffer a Singer RECORD message already encoded, e.g. by a transform worker """
+
+    _message_writer.write_message(message)
+
+
+def write_state(state: Dict) -> None:
+    """ Function to write a Singer STATE message after the buffered records """
+
+    _message_writer.flush()
+    singer.write_state(state)
+
+
+def write_schema(stream_name: str, schema: Dict, key_properties: List[str]) -> None:
+    """ Function to write a Singer SCHEMA message after the buffered records """
+
+    _message_writer.flush()
+    singer.write_schema(stream_name, schema, key_properties)
+
+
+def write_batch(stream_name: str, manifest: List[str], encoding: Dict[str, str]) -> None:
+    """ Function to write a Singer BATCH message, referencing the files holding the records, after the buffered records """
+
+    _message_writer.flush()
+    message = {"type": "BATCH", "stream": stream_name, "encoding": encoding, "manifest": manifest}
+    sys.stdout.write(json.dumps(message) + "\n")
+    sys.stdout.flush()
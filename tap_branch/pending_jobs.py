@@ -0,0 +1,154 @@
+""" Export jobs created but not processed yet, persisted in the state to re-attach to them after a restart """
+
+import hashlib
+import json
+import threading
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterable, List, Optional
+
+import pendulum
+import singer
+
+from tap_branch.branch_constants import JOB_TIMEOUT
+from tap_branch.message_writer import write_state
+
+LOGGER = singer.get_logger()
+
+# State key holding the pending export jobs of each report type
+PENDING_EXPORT_JOBS_KEY = "pending_export_jobs"
+
+
+def get_fields_fingerprint(fields: Iterable[str]) -> str:
+    """ Function to get a short fingerprint of the exported fields, whatever their order """
+
+    return hashlib.sha256(json.dumps(sorted(fields)).encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass
+class PendingExportJob:
+    """ Export job created for a date window, as saved in the state """
+    request_handle: str
+    window_start: str
+    window_end: str
+    created_at: str
+    fields_fingerprint: str
+    # Last checkpoint of the processing of the job's export, the job expires `job_timeout` after it
+    updated_at: Optional[str] = None
+
+
+class PendingExportJobs:
+    """
+    Tracks the export jobs of each report type between their creation and the processing of their records.
+    ~~~
+    A job is written to the state as soon as it is created. When the tap is killed while the job
+    is being polled, the next run polls the same job again instead of creating a duplicate one,
+    as long as the job exports the same fields and was created, or last checkpointed while its
+    export was read, less than `job_timeout` ago.
+    """
+
+    def __init__(self, job_timeout: int = JOB_TIMEOUT) -> None:
+        self.job_timeout = job_timeout
+        self._lock = threading.Lock()
+        self._state: Optional[Dict] = None
+        self._pending_jobs: Dict[str, List[PendingExportJob]] = {}
+
+    def load_state(self, state: Dict) -> None:
+        """ Function to load the pending jobs saved in the state, jobs created in this run are written back to it """
+
+        now = pendulum.now("UTC")
+        with self._lock:
+            self._state = state
+            for report_type, jobs in (state.get(PENDING_EXPORT_JOBS_KEY) or {}).items():
+                known_handles = {job.request_handle for job in self._pending_jobs.get(report_type, ())}
+                for job in jobs:
+                    pending_job = PendingExportJob(**job)
+                    if pending_job.request_handle in known_handles:
+                        continue
+                    updated_at = pendulum.parse(pending_job.updated_at or pending_job.created_at)
+                    if (now - updated_at).total_seconds() > self.job_timeout:
+                        LOGGER.info("Dropping the expired export job %s of the report_type %s",
+                                    pending_job.request_handle, report_type)
+                        continue
+                    self._pending_jobs.setdefault(report_type, []).append(pending_job)
+            self._update_state()
+
+    def _update_state(self) -> None:
+        if self._state is None:
+            return
+
+        pending_jobs = {report_type: [asdict(job) for job in jobs]
+                        for report_type, jobs in sorted(self._pending_jobs.items()) if jobs}
+        if pending_jobs:
+            self._state[PENDING_EXPORT_JOBS_KEY] = pending_jobs
+        else:
+            self._state.pop(PENDING_EXPORT_JOBS_KEY, None)
+
+    def find(self, report_type: str, window_start: pendulum.DateTime,
+             fields: Iterable[str]) -> Optional[PendingExportJob]:
+        """ Function to get the still valid pending job of the report type starting at the window start
+
+        Returns:
+            Optional[PendingExportJob]: Pending job exporting the same fields, None if there is none
+        """
+
+        window_start = window_start.to_iso8601_string()
+        fields_fingerprint = get_fields_fingerprint(fields)
+        with self._lock:
+            for job in self._pending_jobs.get(report_type, ()):
+                if job.window_start == window_start and job.fields_fingerprint == fields_fingerprint:
+                    return job
+        return None
+
+    def add(self, report_type: str, request_handle: str, window_start: pendulum.DateTime,
+            window_end: pendulum.DateTime, fields: Iterable[str]) -> None:
+        """ Function to record a newly created export job and write it to the state right away """
+
+        job = PendingExportJob(request_handle=request_handle,
+                               window_start=window_start.to_iso8601_string(),
+                               window_end=window_end.to_iso8601_string(),
+                               created_at=pendulum.now("UTC").to_iso8601_string(),
+                               fields_fingerprint=get_fields_fingerprint(fields))
+        with self._lock:
+            jobs = self._pending_jobs.setdefault(report_type, [])
+            # A job replaces the one of the same window, which was not valid anymore
+            jobs[:] = [pending_job for pending_job in jobs if pending_job.window_start != job.window_start]
+            jobs.append(job)
+            self._update_state()
+            state = self._state
+
+        if state is not None:
+            write_state(state)
+
+    def touch(self, report_type: str, window_start: pendulum.DateTime) -> None:
+        """ Function to keep the job of the window valid while its export is read
+
+        The state is written with the checkpoint of the export.
+        """
+
+        window_start = window_start.to_iso8601_string()
+        updated_at = pendulum.now("UTC").to_iso8601_string()
+        with self._lock:
+            for job in self._pending_jobs.get(report_type, ()):
+                if job.window_start == window_start:
+                    job.updated_at = updated_at
+            self._update_state()
+
+    def discard(self, report_type: str, window_start: pendulum.DateTime, persist: bool = False) -> None:
+        """ Function to forget the job of the window once its records are processed, or once it failed
+
+        Args:
+            report_type (str): Report type of the job
+            window_start (pendulum.DateTime): Start of the date window of the job
+            persist (bool, optional): Write the state right away, for a failed job no bookmark follows.
+                Defaults to False, the state is written with the next bookmark of the report type.
+        """
+
+        window_start = window_start.to_iso8601_string()
+        with self._lock:
+            jobs = self._pending_jobs.get(report_type, [])
+            jobs[:] = [job for job in jobs if job.window_start != window_start]
+            self._update_state()
+            state = self._state
+
+        if persist and state is not None:
+            write_state(state)
@@ -0,0 +1,121 @@
+""" Adaptive polling schedule for Branch export jobs """
+
+import threading
+from typing import Any, Dict, Mapping, Optional
+
+import singer
+
+from tap_branch.branch_constants import (DEFAULT_POLL_BACKOFF_FACTOR,
+                                         DEFAULT_POLL_INITIAL_INTERVAL,
+                                         POLL_INTERVAL)
+
+LOGGER = singer.get_logger()
+
+# Weight of the latest observation in the per report_type moving average of job durations
+DURATION_SMOOTHING = 0.5
+
+# Statuses reported by Branch before the export job has started running
+QUEUED_STATUSES = {"pending", "queued", "waiting"}
+
+
+def get_progress_hint(job_response: Optional[Dict]) -> Optional[float]:
+    """ Function to extract the completion ratio of an export job from the poll response
+
+    Args:
+        job_response (Optional[Dict]): Response of the export job poll
+
+    Returns:
+        Optional[float]: Completion ratio between 0 and 1, None if the response has no usable hint
+    """
+
+    for key in ("progress", "percent_complete", "percentage"):
+        value = (job_response or {}).get(key)
+        try:
+            progress = float(value)
+        except (TypeError, ValueError):
+            continue
+
+        # Branch may report the progress either as a ratio or as a percentage
+        if progress > 1:
+            progress = progress / 100
+        if 0 < progress < 1:
+            return progress
+
+    return None
+
+
+class AdaptivePollSchedule:
+    """
+    Computes the wait between two polls of an export job.
+    ~~~
+    Provides:
+     - Geometric back-off from `initial_interval` up to `max_interval`
+     - Use of the status and progress hints of the poll response
+     - Per report_type history of job durations to start close to the expected completion time
+    """
+
+    def __init__(self, initial_interval: float = DEFAULT_POLL_INITIAL_INTERVAL,
+                 max_interval: float = POLL_INTERVAL,
+                 backoff_factor: float = DEFAULT_POLL_BACKOFF_FACTOR) -> None:
+        self.initial_interval = max(0.0, initial_interval)
+        self.max_interval = max(self.initial_interval, max_interval)
+        self.backoff_factor = max(1.0, backoff_factor)
+
+        self._lock = threading.Lock()
+        self._expected_durations: Dict[str, float] = {}
+
+    @classmethod
+    def from_config(cls, config: Mapping[str, Any]) -> "AdaptivePollSchedule":
+        """ Function to build the poll schedule from the tap config """
+
+        return cls(
+            initial_interval=float(config.get("poll_initial_interval") or DEFAULT_POLL_INITIAL_INTERVAL),
+            max_interval=float(config.get("poll_max_interval") or POLL_INTERVAL),
+            backoff_factor=float(config.get("poll_backoff_factor") or DEFAULT_POLL_BACKOFF_FACTOR)
+        )
+
+    def expected_duration(self, report_type: Optional[str]) -> Optional[float]:
+        """ Function to get the expected duration of an export job of the report_type """
+
+        with self._lock:
+            return self._expected_durations.get(report_type)
+
+    def record_duration(self, report_type: Optional[str], duration: float, request_handle: str = None) -> None:
+        """ Function to record the observed time-to-complete of an export job """
+
+        LOGGER.info("Export job %s for report_type %s completed in %.1f seconds", request_handle, report_type, duration)
+        with self._lock:
+            previous = self._expected_durations.get(report_type)
+            if previous is None:
+                self._expected_durations[report_type] = duration
+            else:
+                self._expected_durations[report_type] = DURATION_SMOOTHING * duration + (1 - DURATION_SMOOTHING) * previous
+
+    def next_interval(self, report_type: Optional[str], elapsed: float, attempt: int,
+                      job_response: Optional[Dict] = None) -> float:
+        """ Function to compute the wait before the next poll of an export job
+
+        Args:
+            report_type (Optional[str]): Report type of the export job
+            elapsed (float): Seconds since the export job was created
+            attempt (int): Number of polls already done for the export job
+            job_response (Optional[Dict]): Response of the latest poll
+
+        Returns:
+            float: Seconds to wait before polling again
+        """
+
+        interval = self.initial_interval * (self.backoff_factor ** attempt)
+
+        status = str((job_response or {}).get("status", "")).lower()
+        progress = get_progress_hint(job_response)
+        expected_duration = self.expected_duration(report_type)
+
+        if progress is not None and elapsed > 0:
+            # Estimate the remaining time from the progress made so far
+            interval = elapsed * (1 - progress) / progress
+        elif expected_duration is not None and elapsed < expected_duration and status not in QUEUED_STATUSES:
+            # Jump straight to the time similar jobs needed to complete
+            interval = expected_duration - elapsed
+
+        return min(max(interval, self.initial_interval), self.max_interval)
@@ -0,0 +1,165 @@
+""" Client-side rate limiting of the Branch API calls """
+
+import re
+import threading
+import time
+from typing import Any, Dict, Mapping, Optional
+
+import singer
+
+from tap_branch.branch_constants import DEFAULT_RATE_LIMITS_PER_MINUTE
+from tap_branch.branch_utils import is_config_enabled
+
+LOGGER = singer.get_logger()
+
+# Endpoint families sharing a request budget
+DATA_READY_FAMILY = "data_ready"
+LOGS_CREATE_FAMILY = "logs_create"
+LOGS_POLL_FAMILY = "logs_poll"
+
+# Config keys of the request budget per minute of each endpoint family
+RATE_LIMIT_CONFIG_KEYS = {
+    DATA_READY_FAMILY: "rate_limit_data_ready_per_minute",
+    LOGS_CREATE_FAMILY: "rate_limit_logs_create_per_minute",
+    LOGS_POLL_FAMILY: "rate_limit_logs_poll_per_minute",
+}
+
+DATA_READY_PATH_PATTERN = re.compile(r"/v2/data/ready/?$")
+LOGS_CREATE_PATH_PATTERN = re.compile(r"/v2/logs/?$")
+LOGS_POLL_PATH_PATTERN = re.compile(r"/v2/logs/[^/]+/?$")
+
+# Maximum number of requests of a family sent back to back before the budget rate applies
+MAX_BURST = 5
+
+# The rate is halved on every rate limit response, and recovers by this share of the budget on every success
+RATE_LIMIT_BACKOFF_FACTOR = 0.5
+RATE_RECOVERY_STEP = 0.05
+
+
+def get_endpoint_family(method: str, endpoint: str) -> Optional[str]:
+    """ Function to get the endpoint family of a Branch API call, None for calls without a budget """
+
+    path = endpoint.split("?", 1)[0]
+    if DATA_READY_PATH_PATTERN.search(path):
+        return DATA_READY_FAMILY
+    if method.upper() == "POST" and LOGS_CREATE_PATH_PATTERN.search(path):
+        return LOGS_CREATE_FAMILY
+    if method.upper() == "GET" and LOGS_POLL_PATH_PATTERN.search(path):
+        return LOGS_POLL_FAMILY
+    return None
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket of an endpoint family.
+    ~~~
+    Callers reserve a token and sleep outside of the lock until it is available, so concurrent
+    callers are spaced out at the current rate. The rate is lowered when Branch answers with a
+    rate limit, and recovers towards the budget with every successful request.
+    """
+
+    def __init__(self, requests_per_minute: float, burst: int = MAX_BURST) -> None:
+        self.max_rate = requests_per_minute / 60
+        self.rate = self.max_rate
+        self.capacity = max(1, min(burst, int(requests_per_minute)))
+        self._tokens = float(self.capacity)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        # `_updated_at` is in the future while the bucket is paused after a rate limit response
+        if now > self._updated_at:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+
+    def acquire(self) -> float:
+        """ Function to wait until a request can be sent
+
+        Returns:
+            float: Seconds waited
+        """
+
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            wait = max(0.0, self._updated_at - now) + max(0.0, -self._tokens) / self.rate
+
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def record_success(self) -> None:
+        """ Function to let the rate recover towards the budget """
+
+        with self._lock:
+            if self.rate < self.max_rate:
+                self._refill(time.monotonic())
+                self.rate = min(self.max_rate, self.rate + self.max_rate * RATE_RECOVERY_STEP)
+
+    def record_rate_limit(self, retry_seconds: Optional[int] = None) -> None:
+        """ Function to slow down after a rate limit response
+
+        Args:
+            retry_seconds (int, optional): Seconds after which Branch accepts requests again. Defaults to None.
+        """
+
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.rate = max(self.max_rate * RATE_RECOVERY_STEP, self.rate * RATE_LIMIT_BACKOFF_FACTOR)
+            self._tokens = min(self._tokens, 0.0)
+            if retry_seconds:
+                self._updated_at = max(self._updated_at, now + retry_seconds)
+
+
+class RateLimiter:
+    """
+    Proactive rate limiter shared by every Branch API call of the client.
+    ~~~
+    Each endpoint family (data readiness, export job creation, export job polling) has its own
+    request budget per minute. Families without a budget, or with a budget of 0, are not limited.
+    Requests are only limited when the `rate_limit_requests` config key is enabled.
+    """
+
+    def __init__(self, budgets: Mapping[str, float]) -> None:
+        self.buckets: Dict[str, TokenBucket] = {
+            family: TokenBucket(requests_per_minute)
+            for family, requests_per_minute in budgets.items() if requests_per_minute
+        }
+
+    @classmethod
+    def from_config(cls, config: Mapping[str, Any]) -> "RateLimiter":
+        """ Function to build the rate limiter from the request budgets of the tap config, without any budget unless enabled """
+
+        if not is_config_enabled(config, "rate_limit_requests"):
+            return cls({})
+
+        budgets = {}
+        for family, config_key in RATE_LIMIT_CONFIG_KEYS.items():
+            value = config.get(config_key)
+            budgets[family] = float(value) if value not in (None, "") else DEFAULT_RATE_LIMITS_PER_MINUTE[family]
+        return cls(budgets)
+
+    def acquire(self, family: Optional[str]) -> float:
+        """ Function to wait until a request of the endpoint family can be sent """
+
+        bucket = self.buckets.get(family)
+        if bucket is None:
+            return 0.0
+
+        wait = bucket.acquire()
+        if wait > 1:
+            LOGGER.info("Waited %.1f seconds for the %s request budget", wait, family)
+        return wait
+
+    def record_success(self, family: Optional[str]) -> None:
+        bucket = self.buckets.get(family)
+        if bucket is not None:
+            bucket.record_success()
+
+    def record_rate_limit(self, family: Optional[str], retry_seconds: Optional[int] = None) -> None:
+        bucket = self.buckets.get(family)
+        if bucket is not None:
+            LOGGER.info("Lowering the %s request rate after a rate limit response", family)
+            bucket.record_rate_limit(retry_seconds)
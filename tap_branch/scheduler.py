@@ -0,0 +1,274 @@
+""" Scheduler to run the export jobs of several report types concurrently """
+
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Deque, Dict, Iterator, List, Optional, Tuple
+
+import pendulum
+import singer
+from singer import metrics
+from singer.transform import Transformer
+
+from tap_branch.branch_constants import JOB_TIMEOUT
+from tap_branch.client import Client
+from tap_branch.exceptions import BranchExportFailed, BranchExportTimeout
+from tap_branch.message_writer import write_state
+from tap_branch.polling import AdaptivePollSchedule
+
+if TYPE_CHECKING:
+    from tap_branch.streams.branch_events import BranchEventsBaseStream
+
+LOGGER = singer.get_logger()
+
+
+@dataclass
+class ExportJob:
+    """ Export job submitted to Branch for a date window of a stream """
+    stream: "BranchEventsBaseStream"
+    window_start: pendulum.DateTime
+    window_end: pendulum.DateTime
+    # Not set for the exports replayed from the local spool
+    request_handle: Optional[str]
+    submitted_at: pendulum.DateTime
+    # Monotonic time of the next poll and number of polls done so far
+    next_poll_at: float = 0.0
+    poll_attempts: int = 0
+    job_response: Optional[Dict] = None
+    error: Optional[Exception] = None
+
+    @property
+    def is_complete(self) -> bool:
+        return self.job_response is not None
+
+
+@dataclass
+class StreamExport:
+    """ Progress of the date-windowing workflow of a single stream """
+    stream: "BranchEventsBaseStream"
+    windows: Iterator[Tuple[pendulum.DateTime, pendulum.DateTime]]
+    counter: metrics.Counter
+    # Submitted jobs of the stream in window order
+    jobs: Deque[ExportJob] = field(default_factory=deque)
+    is_exhausted: bool = False
+
+    def next_window(self) -> Optional[Tuple[pendulum.DateTime, pendulum.DateTime]]:
+        window = next(self.windows, None)
+        if window is None:
+            self.is_exhausted = True
+        return window
+
+
+class ExportJobScheduler:
+    """
+    Runs the export jobs of several streams at the same time.
+    ~~~
+    Performs:
+     - Creation of export jobs for all the streams up front, bounded by `max_concurrent_jobs`
+     - Pipelining of up to `lookahead` later windows of a stream while the current window is processed
+     - Polling of every in-flight job together on a background thread
+     - Emission of each finished export as soon as it completes, in window order within a stream
+    """
+
+    def __init__(self, client: Client, max_concurrent_jobs: int, lookahead: int = 0,
+                 poll_schedule: Optional[AdaptivePollSchedule] = None, job_timeout: int = JOB_TIMEOUT) -> None:
+        self.client = client
+        self.max_concurrent_jobs = max(1, max_concurrent_jobs)
+        self.lookahead = max(0, lookahead)
+        self.poll_schedule = poll_schedule or client.poll_schedule
+        self.job_timeout = job_timeout
+
+        self._lock = threading.Lock()
+        self._in_flight: List[ExportJob] = []
+        self._completed = queue.Queue()
+        self._stop = threading.Event()
+        # Set when a job is submitted or the scheduler is stopped, to wake the poller up
+        self._wakeup = threading.Event()
+
+    def _submit(self, stream_export: StreamExport) -> bool:
+        """ Function to create the export job for the next window of the stream
+
+        Returns:
+            bool: True if a job was submitted, False if the stream has no windows left
+        """
+
+        window = stream_export.next_window()
+        if window is None:
+            return False
+
+        window_start, window_end = window
+        spooled_export = stream_export.stream.get_spooled_export(window_start, window_end)
+        if spooled_export is not None:
+            # Exports found in the local spool are complete right away, without an export job
+            job = ExportJob(stream=stream_export.stream, window_start=window_start, window_end=window_end,
+                            request_handle=None, submitted_at=pendulum.now("UTC"), job_response=spooled_export)
+            stream_export.jobs.append(job)
+            self._completed.put(job)
+            return True
+
+        request_handle = stream_export.stream.submit_export_job(window_start, window_end)
+        # The job is polled right away, like `Client.check_export_job_status` does
+        job = ExportJob(stream=stream_export.stream, window_start=window_start, window_end=window_end,
+                        request_handle=request_handle, submitted_at=pendulum.now("UTC"),
+                        next_poll_at=time.monotonic())
+        stream_export.jobs.append(job)
+        with self._lock:
+            self._in_flight.append(job)
+        self._wakeup.set()
+        return True
+
+    def _fill(self, stream_exports: List[StreamExport]) -> None:
+        """ Function to submit export jobs until the concurrency limit is reached
+
+        The current window of every stream is submitted before any look-ahead window,
+        so that the pipelining of one stream does not starve the others.
+        """
+
+        for depth in range(self.lookahead + 1):
+            for stream_export in stream_exports:
+                if len(stream_export.jobs) > depth or stream_export.is_exhausted:
+                    continue
+                with self._lock:
+                    if len(self._in_flight) >= self.max_concurrent_jobs:
+                        return
+                self._submit(stream_export)
+
+    def _poll_once(self, job: ExportJob) -> bool:
+        """ Function to poll an export job once
+
+        Returns:
+            bool: True if the job has reached a final state
+        """
+
+        status, export_job_response = self.client.poll_export_job(
+            api_config=job.stream.get_poll_export_api_config(job.request_handle))
+        LOGGER.info("Current export status of handle %s is %s", job.request_handle, status)
+        elapsed = (pendulum.now("UTC") - job.submitted_at).total_seconds()
+
+        if status == "complete":
+            self.poll_schedule.record_duration(job.stream.tap_stream_id, elapsed, request_handle=job.request_handle)
+            job.job_response = export_job_response
+        elif status in ["cancelled", "fail"]:
+            job.error = BranchExportFailed("Export job failed with status: {}".format(status))
+        elif elapsed > self.job_timeout:
+            job.error = BranchExportTimeout("Export Job timed out after {} minutes".format(self.job_timeout / 60))
+        else:
+            # The back-off starts from the first poll
+            job.next_poll_at = time.monotonic() + self.poll_schedule.next_interval(
+                job.stream.tap_stream_id, elapsed, job.poll_attempts, export_job_response)
+            job.poll_attempts += 1
+            return False
+
+        return True
+
+    def _poll_loop(self) -> None:
+        """ Function to poll all in-flight export jobs until the scheduler is stopped """
+
+        while not self._stop.is_set():
+            self._wakeup.clear()
+            with self._lock:
+                jobs = [job for job in self._in_flight if job.next_poll_at <= time.monotonic()]
+
+            for job in jobs:
+                if self._stop.is_set():
+                    return
+                try:
+                    is_final = self._poll_once(job)
+                except Exception as err:  # Hand the error over to the main thread
+                    job.error = err
+                    is_final = True
+
+                if is_final:
+                    with self._lock:
+                        self._in_flight.remove(job)
+                    self._completed.put(job)
+
+            # Sleep until the next job is due, or until a job is submitted
+            with self._lock:
+                next_poll_at = min((job.next_poll_at for job in self._in_flight), default=None)
+            if next_poll_at is None:
+                wait = self.poll_schedule.max_interval
+            else:
+                wait = min(max(next_poll_at - time.monotonic(), 0), self.poll_schedule.max_interval)
+            self._wakeup.wait(wait)
+
+    def _process_completed(self, stream_exports: List[StreamExport], state: Dict, transformer: Transformer) -> Dict:
+        """ Function to emit the completed exports at the head of every stream
+
+        Exports of a stream are only emitted in window order, so its bookmark never skips a window.
+        The next windows are submitted before the records are processed so that Branch builds
+        them while the current window is being downloaded and written.
+        """
+
+        for stream_export in list(stream_exports):
+            while stream_export.jobs and stream_export.jobs[0].is_complete:
+                job = stream_export.jobs.popleft()
+
+                # Move the stream to the back of the queue so that every stream gets its turn
+                stream_exports.remove(stream_export)
+                stream_exports.append(stream_export)
+                self._fill(stream_exports)
+
+                # Like the serial sync, the stream whose records are being written is the currently syncing one
+                if singer.get_currently_syncing(state) != job.stream.tap_stream_id:
+                    singer.set_currently_syncing(state, job.stream.tap_stream_id)
+                    write_state(state)
+
+                state = job.stream.process_export(state, transformer, job.job_response,
+                                                  job.window_start, job.window_end, stream_export.counter)
+
+        return state
+
+    def sync(self, streams: List["BranchEventsBaseStream"], state: Dict, transformer: Transformer) -> Dict[str, int]:
+        """ Function to sync the streams with concurrently running export jobs
+
+        Args:
+            streams (List[BranchEventsBaseStream]): Streams to be synced
+            state (Dict): State of the tap
+            transformer (Transformer): Singer transformer
+
+        Returns:
+            Dict[str, int]: Total records synced per stream
+        """
+
+        total_records = {}
+        with ExitStack() as stack:
+            stream_exports = []
+            for stream in streams:
+                stream.prepare_export_configs()
+                export_start = stream.start_export(state)
+                total_records[stream.tap_stream_id] = 0
+                if not stream.is_data_ready(export_start):
+                    continue
+
+                counter = stack.enter_context(metrics.record_counter(stream.tap_stream_id, log_interval=JOB_TIMEOUT))
+                stream_exports.append(StreamExport(stream=stream,
+                                                   windows=stream.generate_windows(export_start),
+                                                   counter=counter))
+
+            poller = threading.Thread(target=self._poll_loop, name="branch-export-poller", daemon=True)
+            self._fill(stream_exports)
+            poller.start()
+            try:
+                while any(stream_export.jobs for stream_export in stream_exports):
+                    job = self._completed.get()
+                    if job.error:
+                        if isinstance(job.error, BranchExportFailed):
+                            # A failed job is not re-attached by the next run
+                            self.client.pending_export_jobs.discard(job.stream.tap_stream_id, job.window_start,
+                                                                    persist=True)
+                        raise job.error
+
+                    state = self._process_completed(stream_exports, state, transformer)
+            finally:
+                self._stop.set()
+                self._wakeup.set()
+                poller.join()
+
+            for stream_export in stream_exports:
+                total_records[stream_export.stream.tap_stream_id] = stream_export.counter.value
+
+        return total_records
@@ -0,0 +1,119 @@
+""" Local on-disk spool of the compressed bodies of completed exports """
+
+import hashlib
+import io
+import json
+import mmap
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, BinaryIO, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+import singer
+
+from tap_branch.branch_constants import DEFAULT_EXPORT_SPOOL_MAX_BYTES
+
+LOGGER = singer.get_logger()
+
+SPOOL_FILE_SUFFIX = ".json.gz"
+SPOOL_TEMP_PREFIX = ".tmp-"
+
+# Key of the export job response of an export replayed from the spool
+SPOOLED_EXPORT_KEY = "spooled_export"
+
+
+class ExportSpool:
+    """
+    Directory of the compressed export bodies, keyed by report type, date window and fields.
+    ~~~
+    An export is streamed to a temporary file and moved in place once complete, so a crashed
+    download never leaves a partial entry. Entries are read back through a read-only mmap.
+    The least recently used entries are evicted once the spool grows over `max_bytes`.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_EXPORT_SPOOL_MAX_BYTES) -> None:
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, config: Mapping[str, Any]) -> Optional["ExportSpool"]:
+        """ Function to build the spool from the tap config, None when no spool directory is configured """
+
+        directory = config.get("export_spool_dir")
+        if not directory:
+            return None
+        return cls(directory, int(config.get("export_spool_max_bytes") or DEFAULT_EXPORT_SPOOL_MAX_BYTES))
+
+    @staticmethod
+    def build_key(report_type: str, window_start: str, window_end: str, fields: Iterable[str]) -> str:
+        """ Function to build the key of an export from its report type, date window and exported fields """
+
+        identity = json.dumps([report_type, window_start, window_end, sorted(fields)])
+        return hashlib.sha256(identity.encode("utf-8")).hexdigest()
+
+    def get_path(self, key: str) -> Path:
+        return self.directory / (key + SPOOL_FILE_SUFFIX)
+
+    def contains(self, key: str) -> bool:
+        return self.get_path(key).is_file()
+
+    def write(self, key: str, bodies: Iterable[BinaryIO]) -> Path:
+        """ Function to store the export, made of the compressed bodies of its files concatenated in order
+
+        A gzip file made of concatenated gzip files decompresses to the concatenated contents.
+        """
+
+        fd, temp_path = tempfile.mkstemp(prefix=SPOOL_TEMP_PREFIX, dir=self.directory)
+        try:
+            with os.fdopen(fd, "wb") as spool_file:
+                for body in bodies:
+                    shutil.copyfileobj(body, spool_file)
+            os.replace(temp_path, self.get_path(key))
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+        self.evict(keep=key)
+        return self.get_path(key)
+
+    @contextmanager
+    def open(self, key: str) -> Iterator[BinaryIO]:
+        """ Function to open a stored export for reading, through a read-only mmap """
+
+        path = self.get_path(key)
+        # The modification time orders the entries for the eviction, so a read marks the entry as used
+        os.utime(path)
+        with open(path, "rb") as spool_file:
+            if os.fstat(spool_file.fileno()).st_size == 0:
+                yield io.BytesIO(b"")
+                return
+
+            with mmap.mmap(spool_file.fileno(), 0, access=mmap.ACCESS_READ) as body:
+                yield body
+
+    def _list_entries(self) -> List[Tuple[Path, os.stat_result]]:
+        entries = []
+        for path in self.directory.glob("*" + SPOOL_FILE_SUFFIX):
+            try:
+                entries.append((path, path.stat()))
+            except FileNotFoundError:  # Evicted by another run meanwhile
+                continue
+        return entries
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """ Function to delete the least recently used entries until the spool fits in `max_bytes` """
+
+        entries = sorted(self._list_entries(), key=lambda entry: entry[1].st_mtime)
+        total_bytes = sum(stat.st_size for _, stat in entries)
+        for path, stat in entries:
+            if total_bytes <= self.max_bytes:
+                return
+            if keep is not None and path == self.get_path(keep):
+                continue
+
+            LOGGER.info("Evicting spooled export %s of %s bytes", path.name, stat.st_size)
+            path.unlink(missing_ok=True)
+            total_bytes -= stat.st_size
@@ -3,10 +3,11 @@ from abc import ABC, abstractmethod
 from typing import Any, Dict, Iterator, List, Tuple
 
 from singer import (Transformer, get_bookmark, get_logger, metadata, metrics,
-                    write_bookmark, write_record, write_schema)
+                    write_bookmark)
 from singer.transform import unix_seconds_to_datetime
 
 from tap_branch.client import Client
+from tap_branch.message_writer import write_record, write_schema
 
 LOGGER = get_logger()
 
@@ -1,20 +1,45 @@
 import gzip
 import io
-import json
-from typing import Dict
+import shutil
+import tempfile
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import BinaryIO, Dict, Iterator, List, Optional, Set, Tuple
 
 import backoff
 import pendulum
-import requests
 import singer
 from requests.exceptions import ChunkedEncodingError, ConnectionError, Timeout
-from singer import bookmarks, metrics, write_record
+from singer import bookmarks, metrics
 from singer.transform import Transformer
 
 from tap_branch.branch_api_contract import BranchExportConfig, EndpointConfig
-from tap_branch.branch_constants import (BRANCH_EVENTS_SCHEMA, JOB_TIMEOUT,
-                                         MAX_BRANCH_DATE_WINDOW)
-from tap_branch.exceptions import BranchError
+from tap_branch.branch_constants import (BRANCH_EVENTS_SCHEMA,
+                                         DEFAULT_EXPORT_DOWNLOAD_WORKERS,
+                                         DEFAULT_EXPORT_LOOKAHEAD,
+                                         EXPORT_SPLIT_FACTOR, JOB_TIMEOUT,
+                                         MAX_BRANCH_DATE_WINDOW,
+                                         MAX_RECORDS_TO_FETCH,
+                                         MIN_SPLIT_WINDOW_SECONDS)
+from tap_branch.batch_writer import BatchWriter
+from tap_branch.branch_utils import get_export_file_urls, is_config_enabled
+from tap_branch.checkpoint import (CheckpointSchedule, clear_export_checkpoint,
+                                   get_export_checkpoint,
+                                   write_export_checkpoint)
+from tap_branch.exceptions import BranchError, BranchExportFailed
+from tap_branch.export_pipeline import (LineSkipper, decompress_lines,
+                                        iter_export_line_batches,
+                                        iter_export_records, read_chunks)
+from tap_branch.json_codec import DEFAULT_CODEC, JsonCodec
+from tap_branch.message_writer import (write_record, write_record_message,
+                                       write_state)
+from tap_branch.scheduler import ExportJobScheduler
+from tap_branch.spool import SPOOLED_EXPORT_KEY, ExportSpool
+from tap_branch.timestamps import BookmarkTracker
+from tap_branch.transform import CompiledTransformer, RecordPassthrough
+from tap_branch.transform_pool import TransformPool
+from tap_branch.transport import ResumableDownload, get_download_transport
+from tap_branch.window_planner import WindowPlanner
 from tap_branch.streams.abstracts import IncrementalStream
 
 LOGGER = singer.get_logger()
@@ -30,6 +55,15 @@ class BranchEventsBaseStream(IncrementalStream):
     create_export_job_path = "v2/logs/"
     poll_export_job_path = "v2/logs/{request_handle}/"
 
+    # Record transformer compiled on the first export of the stream
+    compiled_transformer: CompiledTransformer = None
+
+    # Local spool of the completed exports, when `export_spool_dir` is configured
+    export_spool: Optional[ExportSpool] = None
+
+    # Planner of the window sizes from the observed export volume, when `adaptive_window_size` is enabled
+    window_planner: Optional[WindowPlanner] = None
+
     endpoint_config = EndpointConfig(
         required_query_params={"app_id"},
         required_headers={"Access-Token"}
@@ -47,43 +81,177 @@ class BranchEventsBaseStream(IncrementalStream):
         max_tries=5,
         factor=2,
     )
-    def _fetch_export_data(data_url: str):
+    def _fetch_export_data(data_url: str, headers: Dict = None):
         """Fetch gzipped export data from URL with retry logic.
 
         This is a separate function so backoff decorator can properly retry
         network failures, since extract_data is a generator.
         """
-        response = requests.get(data_url, stream=True, timeout=JOB_TIMEOUT)
+        response = get_download_transport().get(data_url, headers=headers, stream=True, timeout=JOB_TIMEOUT)
         response.raise_for_status()
         return response
 
     @staticmethod
-    def extract_data(job_response: Dict):
+    def _open_export_body(response, data_url: str) -> ResumableDownload:
+        """Wrap the raw body of the export file, so that a broken download resumes where it stopped."""
+        return ResumableDownload(response, data_url, fetch=BranchEventsBaseStream._fetch_export_data)
+
+    @staticmethod
+    def _download_export_part(data_url: str):
+        """Download a single export part file into a temporary file.
+
+        Used for exports split across multiple files, so that the parts can be
+        fetched in parallel while records are still emitted in part order.
+        """
+        part_file = tempfile.TemporaryFile()
+        try:
+            with BranchEventsBaseStream._fetch_export_data(data_url) as r:
+                with BranchEventsBaseStream._open_export_body(r, data_url) as body:
+                    shutil.copyfileobj(body, part_file)
+            part_file.seek(0)
+        except Exception:
+            part_file.close()
+            raise
+        return part_file
+
+    @staticmethod
+    def _iter_export_records(fileobj, data_url: str, use_pipeline: bool = True,
+                             json_codec: JsonCodec = DEFAULT_CODEC, line_skipper: Optional[LineSkipper] = None):
+        """Decode gzipped JSON lines from the file object and yield records.
+
+        With `use_pipeline`, the reads, decompression and JSON decoding run on
+        background threads so they overlap with the transformation of the records.
+        The lines left to skip by `line_skipper` are dropped before they are decoded.
+        """
+        if use_pipeline:
+            yield from iter_export_records(fileobj, data_url=data_url, loads=json_codec.loads,
+                                           line_skipper=line_skipper)
+            return
+
+        with gzip.GzipFile(fileobj=fileobj) as gz:
+            reader = io.TextIOWrapper(gz, encoding="utf-8")
+            line_num = 0
+            for line in reader:
+                line_num += 1
+                if line_skipper is not None:
+                    if line_skipper.remaining:
+                        line_skipper.remaining -= 1
+                        continue
+                    if line_skipper.is_emitted(line):
+                        yield None
+                        continue
+                try:
+                    yield json_codec.loads(line)
+                except ValueError as e:
+                    LOGGER.warning("Skipping malformed JSON at line %s of %s: %s", line_num, data_url, e)
+                    continue
+
+    @staticmethod
+    def _iter_export_line_batches(fileobj, data_url: str, use_pipeline: bool = True,
+                                  line_skipper: Optional[LineSkipper] = None):
+        """Split the gzipped JSON lines of the file object into batches of raw lines, for the transform workers.
+
+        With `use_pipeline`, the reads and decompression run on a background thread.
+        """
+        if use_pipeline:
+            line_batches = iter_export_line_batches(fileobj, line_skipper=line_skipper)
+        else:
+            line_batches = decompress_lines(read_chunks(fileobj))
+            if line_skipper is not None:
+                line_batches = line_skipper.skip(line_batches)
+
+        for lines in line_batches:
+            yield data_url, lines
+
+    @staticmethod
+    def _iter_export_items(fileobj, data_url: str, use_pipeline: bool, json_codec: JsonCodec, line_batches: bool,
+                           line_skipper: Optional[LineSkipper] = None):
+        if line_batches:
+            return BranchEventsBaseStream._iter_export_line_batches(fileobj, data_url, use_pipeline, line_skipper)
+        return BranchEventsBaseStream._iter_export_records(fileobj, data_url, use_pipeline, json_codec, line_skipper)
 
-        data_url = job_response["response_url"]
+    @staticmethod
+    def _download_export_parts(data_urls: List[str], max_workers: int) -> Iterator[Tuple[str, BinaryIO]]:
+        """Download the export part files in parallel and yield them in part order.
 
+        At most `max_workers` parts are downloaded ahead of the part being decoded,
+        which bounds the temporary disk usage for very large exports.
+        """
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        pending_urls = deque(data_urls)
+        downloads = deque()
         try:
+            while pending_urls or downloads:
+                while pending_urls and len(downloads) < max_workers:
+                    data_url = pending_urls.popleft()
+                    downloads.append((data_url, executor.submit(BranchEventsBaseStream._download_export_part, data_url)))
+
+                data_url, download = downloads.popleft()
+                with download.result() as part_file:
+                    yield data_url, part_file
+        finally:
+            # An error surfaces right away, the parts still downloading close their file once they finish
+            for _, download in downloads:
+                if not download.cancel():
+                    download.add_done_callback(BranchEventsBaseStream._close_downloaded_part)
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _close_downloaded_part(download: Future) -> None:
+        if not download.cancelled() and download.exception() is None:
+            download.result().close()
+
+    @staticmethod
+    def _iter_export_bodies(data_urls: List[str], max_workers: int) -> Iterator[Tuple[str, BinaryIO]]:
+        """Yield the compressed body of every export file, in file order."""
+        if len(data_urls) == 1:
             # Use helper function with backoff for network request
-            r = BranchEventsBaseStream._fetch_export_data(data_url)
-
-            with r:
-                with gzip.GzipFile(fileobj=r.raw) as gz:
-                    reader = io.TextIOWrapper(gz, encoding="utf-8")
-                    line_num = 0
-                    for line in reader:
-                        line_num += 1
-                        try:
-                            yield json.loads(line)
-                        except json.JSONDecodeError as e:
-                            LOGGER.warning("Skipping malformed JSON at line %s: %s", line_num, e)
-                            continue
+            r = BranchEventsBaseStream._fetch_export_data(data_urls[0])
+
+            with r, BranchEventsBaseStream._open_export_body(r, data_urls[0]) as body:
+                yield data_urls[0], body
+        else:
+            LOGGER.info("Export is split across %s files, downloading with %s workers", len(data_urls), max_workers)
+            yield from BranchEventsBaseStream._download_export_parts(data_urls, max(1, max_workers))
+
+    @staticmethod
+    def extract_data(job_response: Dict, max_workers: int = DEFAULT_EXPORT_DOWNLOAD_WORKERS,
+                     use_pipeline: bool = True, json_codec: JsonCodec = DEFAULT_CODEC, line_batches: bool = False,
+                     line_skipper: Optional[LineSkipper] = None):
+        """Yield the records of the export files, or with `line_batches` the URL of each file with batches of its raw lines.
+
+        The first lines of the export left to skip by `line_skipper` are dropped before they are decoded.
+        """
+
+        data_urls = get_export_file_urls(job_response)
+        if not data_urls:
+            raise BranchError("Export job response does not contain any export file URL")
+
+        try:
+            for data_url, body in BranchEventsBaseStream._iter_export_bodies(data_urls, max_workers):
+                yield from BranchEventsBaseStream._iter_export_items(body, data_url, use_pipeline, json_codec,
+                                                                     line_batches, line_skipper)
 
         except (ConnectionResetError, ConnectionError, ChunkedEncodingError, Timeout):
             # Re-raise network errors (already handled by backoff in _fetch_export_data)
             raise
 
         except Exception as e:
-            LOGGER.error("Failed to extract data from %s: %s", data_url, e)
+            LOGGER.error("Failed to extract data from %s: %s", data_urls, e)
+            raise BranchError(f"Data extraction failed: {e}") from e
+
+    @staticmethod
+    def extract_spooled_data(spool: ExportSpool, spool_key: str, use_pipeline: bool = True,
+                             json_codec: JsonCodec = DEFAULT_CODEC, line_batches: bool = False,
+                             line_skipper: Optional[LineSkipper] = None):
+        """Yield the records of an export stored in the local spool, or with `line_batches` batches of its raw lines."""
+        spool_path = str(spool.get_path(spool_key))
+        try:
+            with spool.open(spool_key) as body:
+                yield from BranchEventsBaseStream._iter_export_items(body, spool_path, use_pipeline, json_codec,
+                                                                     line_batches, line_skipper)
+        except Exception as e:
+            LOGGER.error("Failed to extract data from %s: %s", spool_path, e)
             raise BranchError(f"Data extraction failed: {e}") from e
 
     def get_window_configurations(self, export_start: pendulum.DateTime):
@@ -96,9 +264,12 @@ class BranchEventsBaseStream(IncrementalStream):
 
         export_end = export_start.add(days=window_size)
         export_end = min(export_end, now)
+        if self.window_planner is not None:
+            export_end = self.window_planner.get_window_end(export_start, export_end)
         return export_end
 
-    def sync(self, state: Dict, transformer: Transformer, parent_obj: Dict = None):
+    def prepare_export_configs(self) -> None:
+        """ Function to build the headers and query params shared by every export API call """
 
         # Build up the required headers
         self.required_headers = self.client.build_headers(endpoint_config=self.endpoint_config,
@@ -108,84 +279,486 @@ class BranchEventsBaseStream(IncrementalStream):
         self.required_query_params = self.client.build_query_params(endpoint_config=self.endpoint_config,
                                                                     query_params_data={"app_id": self.client.config["branch_app_id"]})
 
+    def start_export(self, state: Dict) -> pendulum.DateTime:
+        """ Function to initialise the bookmarks of the date-windowing workflow
+
+        Args:
+            state (Dict): State of the tap
+
+        Returns:
+            pendulum.DateTime: Datetime from which the export has to start
+        """
+
+        self.initial_bookmark = pendulum.parse(bookmarks.get_bookmark(state=state, tap_stream_id=self.tap_stream_id,
+                                                                      key=self.replication_keys[0],
+                                                                      default=self.client.config["start_date"]))
+        self.bookmark_tracker = BookmarkTracker(self.initial_bookmark)
+
+        # Exclude the fields rejected in earlier runs from the export job payloads
+        self.client.field_compatibility.load_state(state)
+        # Re-attach to the export jobs a killed run left pending
+        self.client.pending_export_jobs.load_state(state)
+        self.export_spool = ExportSpool.from_config(self.client.config)
+        self.window_planner = WindowPlanner.from_config(self.client.config)
+        if self.window_planner is not None:
+            self.window_planner.load_state(state, self.tap_stream_id)
+        return self.initial_bookmark
+
+    def is_data_ready(self, export_start: pendulum.DateTime) -> bool:
+        """ Function to check the data readiness of the report_type for the export start """
+
+        data_ready_api_config = BranchExportConfig(
+            method="POST",
+            path=self.export_data_readiness_path,
+            headers_data=self.required_headers,
+            query_params_data=self.required_query_params
+        )
+        data_ready = self.client.check_data_readiness(export_start=export_start.to_datetime_string(),
+                                                      report_type=self.tap_stream_id,
+                                                      api_config=data_ready_api_config)
+        if data_ready is False:
+            LOGGER.info("Data is not ready for the time period %s against the report_type %s", export_start, self.tap_stream_id)
+            return False
+
+        return True
+
+    def generate_windows(self, export_start: pendulum.DateTime) -> Iterator[Tuple[pendulum.DateTime, pendulum.DateTime]]:
+        """ Function to generate the export date windows from the export start until now
+
+        A window with a pending export job keeps the end of that job, so the job can be re-attached.
+        The windows stop at the first later window whose data is not ready yet, the readiness is
+        checked once per day as Branch reports it per day.
+        """
+
+        job_start = pendulum.now("UTC")
+        # The data readiness of the export start is checked before the first window
+        checked_date = export_start.date()
+        while export_start < job_start:
+            if export_start.date() != checked_date:
+                checked_date = export_start.date()
+                if not self.is_data_ready(export_start):
+                    LOGGER.info("Skipping the windows from %s to %s of the report_type %s, data is not ready",
+                                export_start, job_start, self.tap_stream_id)
+                    return
+
+            window_end = self.get_window_configurations(export_start=export_start)
+            pending_job = self.client.pending_export_jobs.find(self.tap_stream_id, export_start, self.get_selected_fields())
+            if pending_job is not None and export_start < pendulum.parse(pending_job.window_end) <= window_end:
+                window_end = pendulum.parse(pending_job.window_end)
+            yield export_start, window_end
+            export_start = window_end
+
+    def get_selected_fields(self) -> List[str]:
+        """ Function to get the fields to export, same as the fields kept by `singer.Transformer`
+
+        Automatic fields are always exported, other fields unless they are deselected or unsupported.
+
+        Returns:
+            List[str]: Fields to request in the export job payload
+        """
+
+        selected_fields = []
+        for field_name in self.schema.get("properties", {}):
+            field_metadata = self.metadata.get(("properties", field_name), {})
+            if field_metadata.get("inclusion") != "automatic" and (
+                    field_metadata.get("selected") is False or field_metadata.get("inclusion") == "unsupported"):
+                continue
+            selected_fields.append(field_name)
+        return selected_fields
+
+    def submit_export_job(self, window_start: pendulum.DateTime, window_end: pendulum.DateTime) -> str:
+        """ Function to create the export job for the date window
+
+        The pending job of the window left by a killed run is re-attached instead of creating a new one.
+
+        Returns:
+            str: Request handle of the created export job
+        """
+
+        selected_fields = self.get_selected_fields()
+        pending_job = self.client.pending_export_jobs.find(self.tap_stream_id, window_start, selected_fields)
+        if pending_job is not None and pending_job.window_end == window_end.to_iso8601_string():
+            LOGGER.info("Re-attaching to the export job %s created at %s for the time period %s to %s against the report_type %s",
+                        pending_job.request_handle, pending_job.created_at, window_start, window_end, self.tap_stream_id)
+            return pending_job.request_handle
+
+        LOGGER.info("Initiating export job for the time period %s to %s against the report_type %s", window_start, window_end, self.tap_stream_id)
+
+        create_export_api_config = BranchExportConfig(
+                                    method="POST",
+                                    path=self.create_export_job_path,
+                                    headers_data=self.required_headers,
+                                    query_params_data=self.required_query_params,
+                                    additional_data={
+                                        "start_date": window_start.to_iso8601_string(),
+                                        "end_date": window_end.to_iso8601_string(),
+                                        "schema_path": BRANCH_EVENTS_SCHEMA,
+                                        "selected_fields": selected_fields
+                                    }
+                                )
+        request_handle = self.client.create_export_job(report_type=self.tap_stream_id, api_config=create_export_api_config)
+        # Write the handle to the state right away, so a restart polls this job instead of creating another one
+        self.client.pending_export_jobs.add(self.tap_stream_id, request_handle, window_start, window_end, selected_fields)
+        return request_handle
+
+    def get_spool_key(self, window_start: pendulum.DateTime, window_end: pendulum.DateTime) -> str:
+        """ Function to get the key of the export of the date window in the local spool """
+
+        return ExportSpool.build_key(self.tap_stream_id, window_start.to_iso8601_string(),
+                                     window_end.to_iso8601_string(), self.get_selected_fields())
+
+    def get_spooled_export(self, window_start: pendulum.DateTime, window_end: pendulum.DateTime) -> Optional[Dict]:
+        """ Function to get the export of the date window from the local spool, to replay it without an export job
+
+        Returns:
+            Optional[Dict]: Export job response pointing at the spooled export, None if it is not spooled
+        """
+
+        if self.export_spool is None:
+            return None
+
+        spool_key = self.get_spool_key(window_start, window_end)
+        if not self.export_spool.contains(spool_key):
+            return None
+
+        LOGGER.info("Replaying the spooled export for the time period %s to %s against the report_type %s",
+                    window_start, window_end, self.tap_stream_id)
+        return {SPOOLED_EXPORT_KEY: spool_key}
+
+    def spool_export(self, export_job_response: Dict, spool_key: str, max_workers: int) -> None:
+        """ Function to stream the compressed files of a completed export into the local spool """
+
+        data_urls = get_export_file_urls(export_job_response)
+        if not data_urls:
+            raise BranchError("Export job response does not contain any export file URL")
+
+        bodies = self._iter_export_bodies(data_urls, max_workers)
+        try:
+            self.export_spool.write(spool_key, (body for _, body in bodies))
+
+        except (ConnectionResetError, ConnectionError, ChunkedEncodingError, Timeout):
+            # Re-raise network errors (already handled by backoff in _fetch_export_data)
+            raise
+
+        except Exception as e:
+            LOGGER.error("Failed to spool data from %s: %s", data_urls, e)
+            raise BranchError(f"Data extraction failed: {e}") from e
+
+        finally:
+            bodies.close()
+
+    def get_poll_export_api_config(self, request_handle: str) -> BranchExportConfig:
+        """ Function to build the config to poll the export job of the request handle """
+
+        return BranchExportConfig(
+                    method="GET",
+                    path=self.poll_export_job_path.format(request_handle=request_handle),
+                    headers_data=self.required_headers,
+                    query_params_data=self.required_query_params
+                )
+
+    def get_record_transformer(self, transformer: Transformer) -> CompiledTransformer:
+        """ Function to get the transformer compiled from the schema and metadata of the stream
+
+        The compiled transformer is built once and reused for every export window.
+        """
+
+        if self.compiled_transformer is None or self.compiled_transformer.transformer is not transformer:
+            self.compiled_transformer = CompiledTransformer(transformer, self.schema, self.metadata)
+        return self.compiled_transformer
+
+    @staticmethod
+    def is_export_truncated(records_read: int) -> bool:
+        """ Function to detect an export cut at the record limit, from its record count
+
+        The records of an export are not sorted by their replication key, so the records
+        cut from a truncated export may be anywhere in its date window.
+        """
+
+        return records_read >= MAX_RECORDS_TO_FETCH
+
+    @staticmethod
+    def split_window(window_start: pendulum.DateTime, window_end: pendulum.DateTime,
+                     parts: int = EXPORT_SPLIT_FACTOR) -> List[Tuple[pendulum.DateTime, pendulum.DateTime]]:
+        """ Function to split the date window into `parts` consecutive sub-windows of the same length """
+
+        step = (window_end - window_start).total_seconds() / parts
+        bounds = [window_start] + [window_start.add(seconds=int(step * part)) for part in range(1, parts)] + [window_end]
+        return [(start, end) for start, end in zip(bounds, bounds[1:]) if start < end]
+
+    def export_sub_windows(self, state: Dict, transformer: Transformer, window_start: pendulum.DateTime,
+                           window_end: pendulum.DateTime, counter, emitted_lines: Set[int]) -> Dict:
+        """ Function to export a truncated window again through the export jobs of its sub-windows
+
+        The jobs of all the sub-windows are created before polling, so Branch builds them concurrently.
+        A truncated sub-window is split again, until the sub-windows are shorter than MIN_SPLIT_WINDOW_SECONDS.
+        The lines of the sub-window exports found in `emitted_lines`, the hashes of the lines of the
+        truncated exports, are not emitted again.
+
+        Returns:
+            Dict: Updated state
+        """
+
+        if (window_end - window_start).total_seconds() < MIN_SPLIT_WINDOW_SECONDS:
+            LOGGER.warning("Export of the time period %s to %s against the report_type %s still reaches the limit of %s records "
+                           "and cannot be split further, some records may be missing",
+                           window_start, window_end, self.tap_stream_id, MAX_RECORDS_TO_FETCH)
+            return state
+
+        sub_windows = self.split_window(window_start, window_end)
+        LOGGER.info("Export reached the limit of %s records, exporting the time period %s to %s against the report_type %s in %s sub-windows",
+                    MAX_RECORDS_TO_FETCH, window_start, window_end, self.tap_stream_id, len(sub_windows))
+
+        # Exports found in the local spool are replayed without creating an export job
+        export_jobs = []
+        for sub_window_start, sub_window_end in sub_windows:
+            spooled_export = self.get_spooled_export(sub_window_start, sub_window_end)
+            request_handle = None if spooled_export else self.submit_export_job(sub_window_start, sub_window_end)
+            export_jobs.append((sub_window_start, sub_window_end, request_handle, spooled_export))
+
+        for sub_window_start, sub_window_end, request_handle, export_job_response in export_jobs:
+            if request_handle is not None:
+                try:
+                    _, export_job_response = self.client.check_export_job_status(
+                        request_handle=request_handle,
+                        api_config=self.get_poll_export_api_config(request_handle),
+                        report_type=self.tap_stream_id)
+                except BranchExportFailed:
+                    # A failed job is not re-attached by the next run
+                    self.client.pending_export_jobs.discard(self.tap_stream_id, sub_window_start, persist=True)
+                    raise
+            state = self.process_export(state, transformer, export_job_response,
+                                        sub_window_start, sub_window_end, counter, emitted_lines=emitted_lines)
+
+        return state
+
+    def get_export_line_hashes(self, export_job_response: Dict, export_id: Optional[str], download_workers: int,
+                               use_pipeline: bool) -> Set[int]:
+        """ Function to read the lines of an export again, without decoding them, and hash them """
+
+        if self.export_spool is None:
+            line_batches = self.extract_data(job_response=export_job_response, max_workers=download_workers,
+                                             use_pipeline=use_pipeline, line_batches=True)
+        else:
+            line_batches = self.extract_spooled_data(self.export_spool, export_id, use_pipeline=use_pipeline,
+                                                     line_batches=True)
+        return {hash(line) for _, lines in line_batches for line in lines}
+
+    def write_checkpoint(self, state: Dict, export_id: str, window_start: pendulum.DateTime,
+                         window_end: pendulum.DateTime, records_read: int, batch_writer: Optional[BatchWriter]) -> None:
+        """ Function to write the state with the checkpoint of the export, after the records read so far """
+
+        if batch_writer is not None:
+            batch_writer.flush()
+        # The records read earlier from a truncated export may be past the window being exported
+        write_export_checkpoint(state, self.tap_stream_id, export_id, window_start,
+                                records_read, min(self.bookmark_tracker.max_bookmark, window_end))
+        # The export job stays valid for a restart as long as its export is being read
+        self.client.pending_export_jobs.touch(self.tap_stream_id, window_start)
+        write_state(state)
+
+    def process_export(self, state: Dict, transformer: Transformer, export_job_response: Dict,
+                       window_start: pendulum.DateTime, window_end: pendulum.DateTime, counter,
+                       emitted_lines: Optional[Set[int]] = None) -> Dict:
+        """ Function to emit the records of a completed export job and write the bookmark
+
+        Args:
+            state (Dict): State of the tap
+            transformer (Transformer): Singer transformer
+            export_job_response (Dict): Response of the completed export job
+            window_start (pendulum.DateTime): Start of the exported date window
+            window_end (pendulum.DateTime): End of the exported date window
+            counter (metrics.Counter): Record counter of the stream
+            emitted_lines (Set[int], optional): Hashes of the lines already emitted from truncated
+                exports of the window, not emitted again. Defaults to None.
+
+        Returns:
+            Dict: Updated state
+        """
+
+        replication_key = self.replication_keys[0]
+        download_workers = int(self.client.config.get("export_download_workers", DEFAULT_EXPORT_DOWNLOAD_WORKERS))
+        use_pipeline = is_config_enabled(self.client.config, "export_decode_pipeline", default=True)
+        json_codec = JsonCodec.from_config(self.client.config)
+
+        is_selected = self.is_selected()
+        bookmark_tracker = self.bookmark_tracker
+        record_transformer = self.get_record_transformer(transformer)
+        # In the BATCH output mode, the records go to local files announced by BATCH messages
+        batch_writer = BatchWriter.from_config(self.client.config, self.tap_stream_id, codec=json_codec)
+        # With several transform workers, the raw lines are decoded, transformed and encoded in worker processes
+        transform_pool = TransformPool.from_config(self.client.config, self.client.transform_workers, record_transformer,
+                                                   self.tap_stream_id, replication_key, bookmark_tracker.initial_bookmark,
+                                                   batch_output=batch_writer is not None)
+        line_batches = transform_pool is not None
+        # Records already matching the schema are written without being transformed, checked once per export
+        passthrough = RecordPassthrough.from_config(self.client.config, record_transformer)
+        if passthrough is not None:
+            record_transformer = passthrough
+
+        if self.export_spool is None:
+            # A re-attached export job serves the same files, so the checkpoints of its handle can be resumed
+            pending_job = self.client.pending_export_jobs.find(self.tap_stream_id, window_start, self.get_selected_fields())
+            export_id = pending_job.request_handle if pending_job is not None else None
+        else:
+            # Exports are downloaded into the spool first, and replayed from it by later runs
+            spool_key = export_job_response.get(SPOOLED_EXPORT_KEY)
+            if spool_key is None:
+                spool_key = self.get_spool_key(window_start, window_end)
+                self.spool_export(export_job_response, spool_key, download_workers)
+            export_id = spool_key
+
+        records_read = 0
+        checkpoint = get_export_checkpoint(state, self.tap_stream_id, export_id, window_start) if export_id else None
+        if checkpoint is not None:
+            records_read = checkpoint["records_read"]
+            bookmark_tracker.observe(min(pendulum.parse(checkpoint["max_bookmark"]), window_end).to_iso8601_string())
+            LOGGER.info("Resuming the export of the time period %s to %s against the report_type %s after %s records",
+                        window_start, window_end, self.tap_stream_id, records_read)
+        # The lines read before the checkpoint are skipped before they are decoded. Malformed lines are not
+        # counted in `records_read`, so no line after the checkpoint is skipped, a few before it may be emitted again.
+        line_skipper = LineSkipper(records_read, emitted_lines=emitted_lines)
+
+        if self.export_spool is None:
+            records = self.extract_data(job_response=export_job_response, max_workers=download_workers,
+                                        use_pipeline=use_pipeline, json_codec=json_codec, line_batches=line_batches,
+                                        line_skipper=line_skipper)
+        else:
+            records = self.extract_spooled_data(self.export_spool, export_id, use_pipeline=use_pipeline,
+                                                json_codec=json_codec, line_batches=line_batches,
+                                                line_skipper=line_skipper)
+
+        checkpoint_schedule = CheckpointSchedule.from_config(self.client.config)
+        checkpoint_schedule.start(records_read)
+
+        batch_record_counter = 0
+        try:
+            if transform_pool is None:
+                for record in records:
+                    # Lines already emitted from a truncated export are only counted
+                    if record is None:
+                        records_read += 1
+                        continue
+
+                    transformed_record = record_transformer.transform(record)
+                    # Only records at or after the initial bookmark are emitted, and they move the max bookmark
+                    if bookmark_tracker.observe(transformed_record[replication_key]):
+                        if is_selected:
+                            if batch_writer is not None:
+                                batch_writer.write_record(transformed_record)
+                            else:
+                                write_record(self.tap_stream_id, transformed_record, codec=json_codec)
+                            counter.increment()
+                            batch_record_counter += 1
+
+                    records_read += 1
+                    if export_id is not None and checkpoint_schedule.is_due(records_read):
+                        self.write_checkpoint(state, export_id, window_start, window_end, records_read, batch_writer)
+            else:
+                for chunk in transform_pool.transform(records):
+                    encoded_lines = chunk.lines
+                    if passthrough is not None:
+                        passthrough.passed_records += chunk.passed_records
+                        passthrough.transformed_records += chunk.transformed_records
+                    if chunk.max_value is not None:
+                        bookmark_tracker.observe(chunk.max_value)
+                    if is_selected:
+                        for line in encoded_lines:
+                            # Records before the initial bookmark are not encoded by the workers
+                            if line is None:
+                                continue
+                            if batch_writer is not None:
+                                batch_writer.write_encoded_record(line)
+                            else:
+                                write_record_message(line)
+                            counter.increment()
+                            batch_record_counter += 1
+
+                    records_read += len(encoded_lines)
+                    if export_id is not None and checkpoint_schedule.is_due(records_read):
+                        self.write_checkpoint(state, export_id, window_start, window_end, records_read, batch_writer)
+
+            # Every record of the window is announced before any later STATE message
+            if batch_writer is not None:
+                batch_writer.flush()
+        finally:
+            if batch_writer is not None:
+                batch_writer.abort()
+
+        # A window cut at the record limit is exported again in sub-windows before the bookmark moves past it
+        if self.is_export_truncated(records_read):
+            # Only the lines of the sub-window exports that are not in the truncated export are emitted
+            line_hashes = self.get_export_line_hashes(export_job_response, export_id, download_workers, use_pipeline)
+            state = self.export_sub_windows(state, transformer, window_start, window_end, counter,
+                                            line_hashes | emitted_lines if emitted_lines else line_hashes)
+
+        # Once done with the extraction of the current batch, update the bookmark. The records of a
+        # truncated export read by a sub-window may be past its end, so the bookmark stops at the window end.
+        clear_export_checkpoint(state, self.tap_stream_id)
+        max_bookmark = min(bookmark_tracker.max_bookmark, window_end)
+        state = bookmarks.write_bookmark(state=state, tap_stream_id=self.tap_stream_id,
+                                         key=replication_key, val=max_bookmark.to_iso8601_string())
+        if self.window_planner is not None:
+            self.window_planner.record_export(window_start, window_end, records_read)
+            state = self.window_planner.write_state(state, self.tap_stream_id)
+        self.client.field_compatibility.write_state(state)
+        self.client.pending_export_jobs.discard(self.tap_stream_id, window_start)
+        LOGGER.info("Processed %s records for the time period %s to %s against the report_type %s",
+                    batch_record_counter, window_start, window_end, self.tap_stream_id)
+        if passthrough is not None:
+            LOGGER.info("Passed %s records through without transforming them, transformed %s records",
+                        passthrough.passed_records, passthrough.transformed_records)
+        # Write the state file
+        write_state(state)
+
+        return state
+
+    def sync(self, state: Dict, transformer: Transformer, parent_obj: Dict = None):
+
+        export_lookahead = int(self.client.config.get("export_lookahead", DEFAULT_EXPORT_LOOKAHEAD))
+        if export_lookahead > 0:
+            # Pipeline the date windows: the jobs of the next windows are created and polled
+            # while the records of the current window are being written
+            scheduler = ExportJobScheduler(self.client, max_concurrent_jobs=export_lookahead + 1,
+                                           lookahead=export_lookahead)
+            return scheduler.sync([self], state, transformer)[self.tap_stream_id]
+
+        self.prepare_export_configs()
+
         # NOTE: We have added a log-interval to the counter to make sure that
         # it is not reset in case of long-running export jobs
         with metrics.record_counter(self.tap_stream_id, log_interval=JOB_TIMEOUT) as counter:
-            report_type = self.tap_stream_id
-            replication_key = self.replication_keys[0]
 
             # Initiate date-windowing workflow
-            initial_bookmark = export_start = pendulum.parse(bookmarks.get_bookmark(state=state, tap_stream_id=self.tap_stream_id,
-                                                                                    key=replication_key, default=self.client.config["start_date"]))
+            export_start = self.start_export(state)
 
             # Check for data readiness for that specific report_type
-            data_ready_api_config = BranchExportConfig(
-                method="POST",
-                path=self.export_data_readiness_path,
-                headers_data=self.required_headers,
-                query_params_data=self.required_query_params
-            )
-            data_ready = self.client.check_data_readiness(export_start=export_start.to_datetime_string(),
-                                                          report_type=report_type,
-                                                          api_config=data_ready_api_config)
-            if data_ready is False:
-                LOGGER.info("Data is not ready for the time period %s against the report_type %s", export_start, report_type)
+            if not self.is_data_ready(export_start):
                 return 0
 
-            job_start = pendulum.now("UTC")
-            max_bookmark = initial_bookmark
             # If data is ready, initiate export job.
-            while export_start < job_start:
-
-                window_end = self.get_window_configurations(export_start=export_start)
-                LOGGER.info("Initiating export job for the time period %s to %s against the report_type %s", export_start, window_end, report_type)
-
-                create_export_api_config = BranchExportConfig(
-                                            method="POST",
-                                            path=self.create_export_job_path,
-                                            headers_data=self.required_headers,
-                                            query_params_data=self.required_query_params,
-                                            additional_data={
-                                                "start_date": export_start.to_iso8601_string(),
-                                                "end_date": window_end.to_iso8601_string(),
-                                                "schema_path": BRANCH_EVENTS_SCHEMA
-                                            }
-                                        )
-                request_handle = self.client.create_export_job(report_type=report_type, api_config=create_export_api_config)
-
-                # Poll for export job status
-                poll_export_api_config = BranchExportConfig(
-                                            method="GET",
-                                            path=self.poll_export_job_path.format(request_handle=request_handle),
-                                            headers_data=self.required_headers,
-                                            query_params_data=self.required_query_params
-                                        )
-                is_export_ready, export_job_response = self.client.check_export_job_status(request_handle=request_handle,
-                                                                                           api_config=poll_export_api_config)
+            for window_start, window_end in self.generate_windows(export_start):
+                # Exports found in the local spool are replayed without creating an export job
+                export_job_response = self.get_spooled_export(window_start, window_end)
+                is_export_ready = export_job_response is not None
+
+                if not is_export_ready:
+                    request_handle = self.submit_export_job(window_start, window_end)
+
+                    # Poll for export job status
+                    try:
+                        is_export_ready, export_job_response = self.client.check_export_job_status(
+                            request_handle=request_handle,
+                            api_config=self.get_poll_export_api_config(request_handle),
+                            report_type=self.tap_stream_id)
+                    except BranchExportFailed:
+                        # A failed job is not re-attached by the next run
+                        self.client.pending_export_jobs.discard(self.tap_stream_id, window_start, persist=True)
+                        raise
 
                 # Finally get the export job response and yield records
                 if is_export_ready:
-                    batch_record_counter = 0
-                    for record in self.extract_data(job_response=export_job_response):
-                        transformed_record = transformer.transform(
-                            record, self.schema, self.metadata
-                        )
-                        record_bookmark = pendulum.parse(transformed_record[replication_key])
-                        if record_bookmark >= initial_bookmark:
-                            if self.is_selected():
-                                write_record(self.tap_stream_id, transformed_record)
-                                counter.increment()
-                                batch_record_counter += 1
-
-                            max_bookmark = max(max_bookmark, record_bookmark)
-
-                    # Once done with the extraction of the current batch, update the bookmark
-                    state = bookmarks.write_bookmark(state=state, tap_stream_id=self.tap_stream_id,
-                                                     key=replication_key, val=max_bookmark.to_iso8601_string())
-                    LOGGER.info("Processed %s records for the time period %s to %s against the report_type %s", batch_record_counter, export_start, window_end, report_type)
-                    # Write the state file
-                    singer.write_state(state)
-
-                export_start = window_end
+                    state = self.process_export(state, transformer, export_job_response,
+                                                window_start, window_end, counter)
 
             return counter.value
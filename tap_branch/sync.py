@@ -1,11 +1,18 @@
-from typing import Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
 
 import singer
 from singer.transform import UNIX_MILLISECONDS_INTEGER_DATETIME_PARSING
 
+from tap_branch.branch_constants import (DEFAULT_DATA_READY_WORKERS,
+                                         DEFAULT_EXPORT_LOOKAHEAD,
+                                         DEFAULT_MAX_CONCURRENT_EXPORT_JOBS)
 from tap_branch.client import Client
 from tap_branch.exceptions import BranchFatalRateLimitError
+from tap_branch.message_writer import configure_message_writer, write_state
+from tap_branch.scheduler import ExportJobScheduler
 from tap_branch.streams import STREAMS
+from tap_branch.streams.branch_events import BranchEventsBaseStream
 
 LOGGER = singer.get_logger()
 
@@ -18,7 +25,7 @@ def update_currently_syncing(state: Dict, stream_name: str) -> None:
         del state["currently_syncing"]
     else:
         singer.set_currently_syncing(state, stream_name)
-    singer.write_state(state)
+    write_state(state)
 
 
 def write_schema(stream, client, streams_to_sync, catalog) -> None:
@@ -35,6 +42,61 @@ def write_schema(stream, client, streams_to_sync, catalog) -> None:
             stream.child_to_sync.append(child_obj)
 
 
+def check_data_readiness(client: Client, catalog: singer.Catalog, state: Dict,
+                         streams_to_sync: List[str], max_workers: int) -> Dict[str, bool]:
+    """
+    Check the data readiness of the selected report types concurrently, before any stream is synced.
+    The answers are cached by the client, so the streams do not check again.
+    """
+    streams = [STREAMS[stream_name](client, catalog.get_stream(stream_name)) for stream_name in streams_to_sync]
+    streams = [stream for stream in streams if isinstance(stream, BranchEventsBaseStream)]
+
+    # The export starts are read from the state on this thread, only the readiness requests run concurrently
+    export_starts = []
+    for stream in streams:
+        stream.prepare_export_configs()
+        export_starts.append(stream.start_export(state))
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        readiness = dict(zip([stream.tap_stream_id for stream in streams],
+                             executor.map(BranchEventsBaseStream.is_data_ready, streams, export_starts)))
+
+    LOGGER.info("Data readiness of the selected report types: {}".format(readiness))
+    return readiness
+
+
+def sync_concurrently(client: Client, config: Dict, catalog: singer.Catalog, state: Dict,
+                      transformer: singer.Transformer, streams_to_sync: list, max_concurrent_jobs: int) -> None:
+    """
+    Sync selected streams with their export jobs running concurrently
+    """
+    streams = []
+    for stream_name in streams_to_sync:
+        stream = STREAMS[stream_name](client, catalog.get_stream(stream_name))
+        write_schema(stream, client, streams_to_sync, catalog)
+        streams.append(stream)
+
+    LOGGER.info("START Syncing concurrently with up to {} export jobs: {}".format(max_concurrent_jobs, streams_to_sync))
+    export_lookahead = int(config.get("export_lookahead", DEFAULT_EXPORT_LOOKAHEAD))
+    scheduler = ExportJobScheduler(client, max_concurrent_jobs, lookahead=export_lookahead)
+    try:
+        total_records = scheduler.sync(streams, state, transformer)
+    except BranchFatalRateLimitError as err:
+        LOGGER.error("Fatal Rate Limit Error during concurrent sync. Message: {}. Writing state".format(str(err)))
+        write_state(state)
+
+        # Re-raise the error to stop the sync while preserving the original traceback
+        raise
+
+    update_currently_syncing(state, None)
+    for stream_name, stream_records in total_records.items():
+        LOGGER.info(
+            "FINISHED Syncing: {}, total_records: {}".format(
+                stream_name, stream_records
+            )
+        )
+
+
 def sync(client: Client, config: Dict, catalog: singer.Catalog, state) -> None:
     """
     Sync selected streams from catalog
@@ -48,7 +110,24 @@ def sync(client: Client, config: Dict, catalog: singer.Catalog, state) -> None:
     last_stream = singer.get_currently_syncing(state)
     LOGGER.info("last/currently syncing stream: {}".format(last_stream))
 
+    max_concurrent_jobs = int(config.get("max_concurrent_export_jobs", DEFAULT_MAX_CONCURRENT_EXPORT_JOBS))
+
+    # Records are written to stdout in large chunks, every STATE message flushes the records before it
+    configure_message_writer(config)
+
+    # Report types whose data is not ready are skipped, without delaying the others
+    data_ready_workers = int(config.get("data_ready_workers", DEFAULT_DATA_READY_WORKERS))
+    readiness = check_data_readiness(client, catalog, state, streams_to_sync, data_ready_workers)
+    for stream_name, is_data_ready in readiness.items():
+        if not is_data_ready:
+            LOGGER.info("Skipping {} as its data is not ready".format(stream_name))
+            streams_to_sync.remove(stream_name)
+
     with singer.Transformer(integer_datetime_fmt=UNIX_MILLISECONDS_INTEGER_DATETIME_PARSING) as transformer:
+        if max_concurrent_jobs > 1:
+            sync_concurrently(client, config, catalog, state, transformer, streams_to_sync, max_concurrent_jobs)
+            return
+
         for stream_name in streams_to_sync:
 
             stream = STREAMS[stream_name](client, catalog.get_stream(stream_name))
@@ -64,7 +143,7 @@ def sync(client: Client, config: Dict, catalog: singer.Catalog, state) -> None:
                 total_records = stream.sync(state=state, transformer=transformer)
             except BranchFatalRateLimitError as err:
                 LOGGER.error("Fatal Rate Limit Error for stream {}. Message: {}. Writing state".format(stream_name, str(err)))
-                singer.write_state(state)
+                write_state(state)
 
                 # Re-raise the error to stop the sync while preserving the original traceback
                 raise
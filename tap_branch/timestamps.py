@@ -0,0 +1,72 @@
+""" Fast-path handling of replication key timestamps on the record hot path """
+
+import re
+from typing import Optional
+
+import pendulum
+
+# Format of the date-time values written by `singer.Transformer`, always in UTC with microseconds.
+# Values of this fixed-width format sort lexicographically in chronological order.
+CANONICAL_DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+CANONICAL_DATETIME_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d{6}Z")
+
+
+def to_canonical_datetime(value: pendulum.DateTime) -> str:
+    """ Function to format a datetime in the canonical UTC format of the transformed records """
+
+    return value.in_timezone("UTC").strftime(CANONICAL_DATETIME_FORMAT)
+
+
+def get_sort_key(value: str) -> str:
+    """ Function to get a chronologically sortable key of a replication key value
+
+    Values already in the canonical format are used as is, anything else is parsed.
+    """
+
+    if isinstance(value, str) and CANONICAL_DATETIME_PATTERN.fullmatch(value):
+        return value
+    return to_canonical_datetime(pendulum.parse(value))
+
+
+class BookmarkTracker:
+    """
+    Tracks the bookmark of a stream while its records are emitted.
+    ~~~
+    Compares the replication key values as canonical strings and only parses
+    a datetime when the maximum bookmark is read.
+    """
+
+    def __init__(self, initial_bookmark: pendulum.DateTime) -> None:
+        self.initial_bookmark = initial_bookmark
+        self._initial_key = to_canonical_datetime(initial_bookmark)
+        self._max_key = self._initial_key
+        self._max_value: Optional[str] = None
+        self._max_bookmark = initial_bookmark
+
+    def observe(self, value: str) -> bool:
+        """ Function to track the replication key value of a record
+
+        Args:
+            value (str): Replication key value of the record
+
+        Returns:
+            bool: True if the record is at or after the initial bookmark
+        """
+
+        key = get_sort_key(value)
+        if key < self._initial_key:
+            return False
+
+        if key > self._max_key:
+            self._max_key = key
+            self._max_value = value
+            self._max_bookmark = None
+        return True
+
+    @property
+    def max_bookmark(self) -> pendulum.DateTime:
+        """ Maximum bookmark seen so far, parsed from the record value only when it moved """
+
+        if self._max_bookmark is None:
+            self._max_bookmark = pendulum.parse(self._max_value)
+        return self._max_bookmark
@@ -0,0 +1,421 @@
+""" Record transformer compiled once per stream from its schema and metadata """
+
+import contextlib
+import logging
+import re
+import threading
+from datetime import timezone
+from typing import Any, Callable, Dict, Iterator, Mapping, Optional, Tuple
+
+import ciso8601
+import singer
+from singer import Transformer
+from singer.transform import (NO_INTEGER_DATETIME_PARSING,
+                              UNIX_SECONDS_INTEGER_DATETIME_PARSING,
+                              VALID_DATETIME_FORMATS, breadcrumb_path,
+                              unix_milliseconds_to_datetime,
+                              unix_seconds_to_datetime)
+from singer.utils import strftime, strptime_to_utc
+
+from tap_branch.branch_constants import DEFAULT_PASSTHROUGH_SAMPLE_RECORDS
+from tap_branch.branch_utils import is_config_enabled
+from tap_branch.timestamps import CANONICAL_DATETIME_PATTERN
+
+LOGGER = singer.get_logger()
+
+# ISO 8601 values parsed the same by ciso8601 and by the dateutil parser used in singer
+ISO_DATETIME_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(\.\d{1,6})?(Z|[+-]\d{2}:\d{2})?")
+
+# Coercion of a field value, returning whether it succeeded and the coerced value
+FieldCoercion = Callable[[Any], Tuple[bool, Any]]
+
+
+def _is_null(value: Any) -> bool:
+    return value is None or value == ""
+
+
+def _to_string(value: Any) -> Tuple[bool, Any]:
+    if value is not None:
+        try:
+            return True, str(value)
+        except Exception:
+            pass
+    return _is_null(value), None
+
+
+def _to_integer(value: Any) -> Tuple[bool, Any]:
+    try:
+        return True, int(value.replace(",", "") if isinstance(value, str) else value)
+    except Exception:
+        return _is_null(value), None
+
+
+def _to_number(value: Any) -> Tuple[bool, Any]:
+    try:
+        return True, float(value.replace(",", "") if isinstance(value, str) else value)
+    except Exception:
+        return _is_null(value), None
+
+
+def _to_boolean(value: Any) -> Tuple[bool, Any]:
+    if isinstance(value, str) and value.lower() == "false":
+        return True, False
+    try:
+        return True, bool(value)
+    except Exception:
+        return _is_null(value), None
+
+
+SCALAR_COERCIONS: Dict[str, FieldCoercion] = {
+    "string": _to_string,
+    "integer": _to_integer,
+    "number": _to_number,
+    "boolean": _to_boolean,
+}
+
+
+class SuppressedWarnings(logging.Filter):
+    """
+    Filter of the singer logger dropping the messages of the threads suppressing them.
+    ~~~
+    The compiled plan coerces nested fields with singer, which logs the values it cannot
+    parse. A failing record is transformed again by the generic transformer, which logs them.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._local = threading.local()
+
+    @contextlib.contextmanager
+    def suppress(self) -> Iterator[None]:
+        self._local.suppressed = True
+        try:
+            yield
+        finally:
+            self._local.suppressed = False
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return not getattr(self._local, "suppressed", False)
+
+
+SUPPRESSED_WARNINGS = SuppressedWarnings()
+
+
+def _parse_datetime(value: Any) -> Optional[str]:
+    try:
+        return strftime(strptime_to_utc(value))
+    except Exception:
+        return None
+
+
+def _string_to_datetime(value: Any) -> Optional[str]:
+    """ Same as `singer.transform.string_to_datetime`, with a fast path for ISO 8601 strings
+
+    Values that cannot be parsed are not logged, the generic transformer logs them
+    when it transforms the failing record again.
+    """
+
+    if isinstance(value, str) and ISO_DATETIME_PATTERN.fullmatch(value):
+        try:
+            parsed = ciso8601.parse_datetime(value)
+        except ValueError:
+            return _parse_datetime(value)
+
+        if parsed.tzinfo is None:
+            return strftime(parsed.replace(tzinfo=timezone.utc))
+        return strftime(parsed.astimezone(timezone.utc))
+    return _parse_datetime(value)
+
+
+def _build_datetime_coercion(integer_datetime_fmt: str) -> FieldCoercion:
+    """ Function to build the coercion of date-time fields, same as `Transformer._transform_datetime` """
+
+    if integer_datetime_fmt not in VALID_DATETIME_FORMATS:
+        raise Exception("Invalid integer datetime parsing option")
+
+    if integer_datetime_fmt == UNIX_SECONDS_INTEGER_DATETIME_PARSING:
+        integer_to_datetime = unix_seconds_to_datetime
+    else:
+        integer_to_datetime = unix_milliseconds_to_datetime
+
+    def to_datetime(value: Any) -> Tuple[bool, Any]:
+        if _is_null(value):
+            return True, None
+
+        if integer_datetime_fmt == NO_INTEGER_DATETIME_PARSING:
+            transformed = _string_to_datetime(value)
+        else:
+            try:
+                transformed = integer_to_datetime(value)
+            except Exception:
+                transformed = _string_to_datetime(value)
+
+        return transformed is not None, transformed
+
+    return to_datetime
+
+
+class CompiledTransformer:
+    """
+    Transforms records with a per-field plan built once from the schema and metadata.
+    ~~~
+    Produces the same records, the same `filtered`/`removed` tracking and the same
+    `SchemaMismatch` errors as `singer.Transformer.transform`. Schemas or metadata the
+    plan does not cover, such as nested field metadata, use the generic transformer.
+    """
+
+    def __init__(self, transformer: Transformer, schema: Dict, metadata: Dict) -> None:
+        self.transformer = transformer
+        self.schema = schema
+        self.metadata = metadata
+        self.field_plan: Optional[Dict[str, FieldCoercion]] = None
+        self.dropped_fields: Dict[str, str] = {}
+
+        if self._can_compile():
+            self._compile()
+
+    @property
+    def is_compiled(self) -> bool:
+        return self.field_plan is not None
+
+    def _can_compile(self) -> bool:
+        # Only the generic transformer without hooks is compiled, subclasses may change the coercions
+        if type(self.transformer) is not Transformer or self.transformer.pre_hook is not None:
+            return False
+
+        if self.transformer.integer_datetime_fmt not in VALID_DATETIME_FORMATS:
+            return False
+
+        # The metadata filtering is only flattened for top-level field metadata
+        if any(len(breadcrumb) > 2 for breadcrumb in (self.metadata or {})):
+            return False
+
+        schema_types = self.schema.get("type")
+        if schema_types not in ("object", ["object"]) or "anyOf" in self.schema:
+            return False
+
+        # Objects without properties are emitted untouched by singer
+        return bool(self.schema.get("properties")) and not self.schema.get("patternProperties")
+
+    def _compile_field(self, field_name: str, field_schema: Dict) -> FieldCoercion:
+        """ Function to build the coercion of a top-level field from its schema """
+
+        types = field_schema.get("type")
+        if isinstance(types, str):
+            types = [types]
+
+        # Only nullable scalar fields are compiled, the null type is tried last same as in singer
+        scalar_types = [typ for typ in (types or []) if typ != "null"]
+        if "anyOf" not in field_schema and types and "null" in types and len(scalar_types) == 1:
+            typ = scalar_types[0]
+            field_format = field_schema.get("format")
+            if typ == "string" and field_format == "date-time":
+                return _build_datetime_coercion(self.transformer.integer_datetime_fmt)
+            if field_format is None and typ in SCALAR_COERCIONS:
+                return SCALAR_COERCIONS[typ]
+
+        # Nested and other types use the generic transformer for the field, without its warnings
+        if SUPPRESSED_WARNINGS not in LOGGER.filters:
+            LOGGER.addFilter(SUPPRESSED_WARNINGS)
+        path = [field_name]
+
+        def transform_field(value: Any) -> Tuple[bool, Any]:
+            with SUPPRESSED_WARNINGS.suppress():
+                return self.transformer.transform_recur(value, field_schema, path)
+
+        return transform_field
+
+    def _compile(self) -> None:
+        self.field_plan = {
+            field_name: self._compile_field(field_name, field_schema)
+            for field_name, field_schema in self.schema["properties"].items()
+        }
+
+        for breadcrumb, field_metadata in (self.metadata or {}).items():
+            if len(breadcrumb) != 2 or field_metadata.get("inclusion") == "automatic":
+                continue
+            if field_metadata.get("selected") is False or field_metadata.get("inclusion") == "unsupported":
+                self.dropped_fields[breadcrumb[1]] = breadcrumb_path(breadcrumb)
+
+    def transform(self, record: Dict) -> Dict:
+        """ Function to transform a record, same as `Transformer.transform(record, schema, metadata)`
+
+        Raises:
+            SchemaMismatch: If a field does not match its schema
+        """
+
+        if not self.is_compiled or not isinstance(record, dict):
+            return self.transformer.transform(record, self.schema, self.metadata)
+
+        errors_count = len(self.transformer.errors)
+        field_plan = self.field_plan
+        dropped_fields = self.dropped_fields
+        result = {}
+        for key, value in record.items():
+            if key in dropped_fields:
+                self.transformer.filtered.add(dropped_fields[key])
+                continue
+
+            coerce = field_plan.get(key)
+            if coerce is None:
+                self.transformer.removed.add(key)
+                continue
+
+            success, result[key] = coerce(value)
+            if not success:
+                # Let the generic transformer build the exact same errors and warnings
+                del self.transformer.errors[errors_count:]
+                return self.transformer.transform(record, self.schema, self.metadata)
+
+        return result
+
+
+# Exact types of the values the compiled coercions return unchanged, `bool` is not an `int` here,
+# and whether they also return None unchanged. A null boolean is coerced to False, same as in singer.
+PASSTHROUGH_TYPES: Dict[str, Tuple[Tuple[type, ...], bool]] = {
+    "string": ((str,), True),
+    "integer": ((int,), True),
+    "number": ((float,), True),
+    "boolean": ((bool,), False),
+}
+
+# Check of a field value, returning whether the transformer would write it unchanged
+FieldCheck = Callable[[Any], bool]
+
+
+def _build_type_check(types: Tuple[type, ...], allows_none: bool) -> FieldCheck:
+    return lambda value: type(value) in types or (allows_none and value is None)
+
+
+def _is_canonical_datetime(value: Any) -> bool:
+    return value is None or (type(value) is str and CANONICAL_DATETIME_PATTERN.fullmatch(value) is not None)
+
+
+class RecordPassthrough:
+    """
+    Writes the fields of the records already matching the schema as they are, without transforming them.
+    ~~~
+    - Scalar fields holding the exact type the compiled transformer would write, e.g. floats for
+      numbers, are written unchanged. A record with another scalar value is transformed.
+    - Date-time fields, e.g. the Unix milliseconds of Branch, and nested fields are coerced alone
+      by the compiled coercion of the field. Canonical UTC date-time strings are kept unchanged.
+    - A record with a field that is unknown or not selected is transformed, to track it.
+
+    When a record of the first `sample_records` of an export is transformed, the export is assumed not
+    to match the schema and the rest of its records are transformed without being checked.
+    """
+
+    def __init__(self, record_transformer: CompiledTransformer,
+                 sample_records: int = DEFAULT_PASSTHROUGH_SAMPLE_RECORDS) -> None:
+        self.record_transformer = record_transformer
+        self.sample_records = sample_records
+        self.field_plan: Optional[Dict[str, Tuple[FieldCheck, Optional[FieldCoercion]]]] = None
+        self.passed_records = 0
+        self.transformed_records = 0
+        self._sampled_records = 0
+
+        if record_transformer.is_compiled:
+            self._compile()
+        self.is_enabled = self.field_plan is not None
+
+    @classmethod
+    def from_config(cls, config: Mapping[str, Any],
+                    record_transformer: CompiledTransformer) -> Optional["RecordPassthrough"]:
+        """ Function to build the passthrough of an export from the tap config, None when `raw_passthrough` is not enabled """
+
+        if not is_config_enabled(config, "raw_passthrough"):
+            return None
+        sample_records = config.get("raw_passthrough_sample_records")
+        return cls(record_transformer, sample_records=int(sample_records) if sample_records not in (None, "")
+                   else DEFAULT_PASSTHROUGH_SAMPLE_RECORDS)
+
+    def _compile_field(self, field_name: str, field_schema: Dict) -> Tuple[FieldCheck, Optional[FieldCoercion]]:
+        """ Function to build the check of a field value and the coercion of the values failing it, if any """
+
+        types = field_schema.get("type")
+        if isinstance(types, str):
+            types = [types]
+        coerce = self.record_transformer.field_plan[field_name]
+
+        # Same fields as the ones compiled to a scalar coercion by `CompiledTransformer._compile_field`
+        scalar_types = [typ for typ in (types or []) if typ != "null"]
+        if "anyOf" not in field_schema and types and "null" in types and len(scalar_types) == 1:
+            typ = scalar_types[0]
+            field_format = field_schema.get("format")
+            if typ == "string" and field_format == "date-time":
+                return _is_canonical_datetime, coerce
+            if field_format is None and typ in PASSTHROUGH_TYPES:
+                return _build_type_check(*PASSTHROUGH_TYPES[typ]), None
+
+        # Nested and other values are coerced by the compiled coercion of the field, their nulls are written unchanged
+        allows_none = "anyOf" not in field_schema and bool(types) and "null" in types
+        return (lambda value: allows_none and value is None), coerce
+
+    def _compile(self) -> None:
+        dropped_fields = self.record_transformer.dropped_fields
+        self.field_plan = {
+            field_name: self._compile_field(field_name, field_schema)
+            for field_name, field_schema in self.record_transformer.schema["properties"].items()
+            if field_name not in dropped_fields
+        }
+
+    def resume(self, records: int, is_enabled: bool) -> None:
+        """ Function to continue checking an export after its first `records` records, e.g. in a transform worker """
+
+        self._sampled_records = records
+        self.is_enabled = is_enabled and self.field_plan is not None
+
+    def pass_through(self, record: Any) -> Optional[Dict]:
+        """ Function to get the record as written by the transformer, with only its date-time and nested fields coerced
+
+        Returns:
+            Optional[Dict]: The record as written, None when the record must be transformed
+        """
+
+        if type(record) is not dict:
+            return None
+
+        field_plan = self.field_plan
+        errors = self.record_transformer.transformer.errors
+        errors_count = len(errors)
+        result = {}
+        for key, value in record.items():
+            field = field_plan.get(key)
+            if field is None:
+                return None
+
+            check, coerce = field
+            if check(value):
+                result[key] = value
+                continue
+            if coerce is None:
+                return None
+
+            success, result[key] = coerce(value)
+            if not success:
+                # The transformer builds the errors of the record again
+                del errors[errors_count:]
+                return None
+        return result
+
+    def transform(self, record: Dict) -> Dict:
+        """ Function to get the record as written by `CompiledTransformer.transform`
+
+        Raises:
+            SchemaMismatch: If a field of a record failing the check does not match its schema
+        """
+
+        if self.is_enabled:
+            passed_record = self.pass_through(record)
+            if passed_record is not None:
+                self._sampled_records += 1
+                self.passed_records += 1
+                return passed_record
+
+            if self._sampled_records < self.sample_records:
+                LOGGER.info("Record %s of the export does not match the schema, transforming every record of the export",
+                            self._sampled_records + 1)
+                self.is_enabled = False
+
+        self.transformed_records += 1
+        return self.record_transformer.transform(record)
@@ -0,0 +1,286 @@
+""" Process pool decoding, transforming and encoding chunks of export lines on several cores """
+
+import multiprocessing
+import pickle
+import threading
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+import singer
+from singer import Transformer
+from singer.transform import SchemaMismatch
+
+from tap_branch.branch_constants import DEFAULT_TRANSFORM_WORKERS
+from tap_branch.exceptions import BranchError
+from tap_branch.json_codec import JsonCodec
+from tap_branch.timestamps import get_sort_key, to_canonical_datetime
+from tap_branch.transform import CompiledTransformer, RecordPassthrough
+
+LOGGER = singer.get_logger()
+
+# Chunks submitted to the pool ahead of the chunk being written, per worker
+CHUNKS_PER_WORKER = 2
+
+# Workers are started fresh rather than forked, the tap runs download and decompression threads
+MP_CONTEXT = "spawn"
+
+# Chunk transformers kept by each worker, one per export being transformed concurrently
+MAX_WORKER_EXPORTS = 8
+
+
+@dataclass
+class TransformedChunk:
+    """ Records of a chunk of export lines, encoded by a worker """
+    # Encoded record of every decoded line in order, None for the records before the initial bookmark
+    lines: List[Optional[str]]
+    # Greatest replication key value of the records at or after the initial bookmark, None if there is none
+    max_value: Optional[str]
+    # Records written as they are and records transformed, by the passthrough of the export
+    passed_records: int = 0
+    transformed_records: int = 0
+    # Whether one of the leading records of the export sampled by the passthrough did not match the schema
+    passthrough_failed: bool = False
+
+
+class ChunkTransformer:
+    """
+    Decodes, transforms and encodes the lines of an export, in a worker process.
+    ~~~
+    Produces the same records as the single-process loop of `process_export`. A record
+    before the initial bookmark is decoded and counted but not encoded. The records are
+    encoded as RECORD messages, or as plain JSON documents for the BATCH output mode.
+    The passthrough of `raw_passthrough` samples the leading lines of the export, whichever
+    worker transforms them, and is disabled for the chunks submitted after a sample failed.
+    """
+
+    def __init__(self, stream_name: str, schema: Dict, metadata: Dict, replication_key: str,
+                 initial_bookmark: str, integer_datetime_fmt: str, config: Mapping[str, Any],
+                 batch_output: bool = False) -> None:
+        self.stream_name = stream_name
+        self.schema = schema
+        self.metadata = metadata
+        self.replication_key = replication_key
+        self.initial_key = get_sort_key(initial_bookmark)
+        self.integer_datetime_fmt = integer_datetime_fmt
+        self.config = dict(config)
+        self.batch_output = batch_output
+        self._json_codec: Optional[JsonCodec] = None
+        self._record_transformer = None
+        self._passthrough: Optional[RecordPassthrough] = None
+
+    def __getstate__(self) -> Dict:
+        # The codec and the transformer are built again in each worker
+        state = self.__dict__.copy()
+        state["_json_codec"] = None
+        state["_record_transformer"] = None
+        state["_passthrough"] = None
+        return state
+
+    def _prepare(self) -> None:
+        self._json_codec = JsonCodec.from_config(self.config)
+        record_transformer = CompiledTransformer(Transformer(self.integer_datetime_fmt), self.schema, self.metadata)
+        self._passthrough = RecordPassthrough.from_config(self.config, record_transformer)
+        self._record_transformer = self._passthrough if self._passthrough is not None else record_transformer
+
+    def transform_chunk(self, data_url: str, lines: List[bytes], first_line: int = 0,
+                        passthrough_enabled: bool = True) -> TransformedChunk:
+        """ Function to transform the records of a chunk of export lines, skipping malformed lines
+
+        Args:
+            data_url (str): URL of the export file of the lines
+            lines (List[Optional[bytes]]): Chunk of export lines, None for the lines already emitted
+            first_line (int, optional): Lines of the export before the chunk. Defaults to 0.
+            passthrough_enabled (bool, optional): False once a sampled record of the export failed. Defaults to True.
+
+        Raises:
+            BranchError: If a record does not match the schema, SchemaMismatch cannot be sent back by the worker
+        """
+
+        if self._record_transformer is None:
+            self._prepare()
+
+        passthrough = self._passthrough
+        if passthrough is not None:
+            passthrough.resume(first_line, passthrough_enabled)
+            is_sampling = passthrough.is_enabled
+            passed_records, transformed_records = passthrough.passed_records, passthrough.transformed_records
+
+        json_codec = self._json_codec
+        record_transformer = self._record_transformer
+        replication_key = self.replication_key
+        initial_key = self.initial_key
+        encode = json_codec.dumps if self.batch_output else \
+            lambda record: json_codec.format_record_message(self.stream_name, record)
+
+        encoded_lines = []
+        max_key, max_value = initial_key, None
+        for line in lines:
+            # Lines already emitted from a truncated export are kept as None, so they are counted as read
+            if line is None:
+                encoded_lines.append(None)
+                continue
+
+            try:
+                record = json_codec.loads(line)
+            except ValueError as e:
+                LOGGER.warning("Skipping malformed JSON in %s: %s", data_url, e)
+                continue
+
+            try:
+                transformed_record = record_transformer.transform(record)
+            except SchemaMismatch as e:
+                raise BranchError(str(e)) from None
+
+            value = transformed_record[replication_key]
+            key = get_sort_key(value)
+            if key < initial_key:
+                encoded_lines.append(None)
+                continue
+
+            if key > max_key or max_value is None:
+                max_key, max_value = key, value
+            encoded_lines.append(encode(transformed_record))
+
+        chunk = TransformedChunk(lines=encoded_lines, max_value=max_value)
+        if passthrough is not None:
+            chunk.passed_records = passthrough.passed_records - passed_records
+            chunk.transformed_records = passthrough.transformed_records - transformed_records
+            chunk.passthrough_failed = is_sampling and not passthrough.is_enabled
+        return chunk
+
+
+# Chunk transformers of the exports transformed by this worker, by export key
+_chunk_transformers: "OrderedDict[str, ChunkTransformer]" = OrderedDict()
+
+
+def _transform_chunk(export_key: str, chunk_transformer: bytes, data_url: str, lines: List[bytes],
+                     first_line: int, passthrough_enabled: bool) -> TransformedChunk:
+    # The chunk transformer of an export is only unpickled and prepared by the first chunk of the export
+    transformer = _chunk_transformers.get(export_key)
+    if transformer is None:
+        transformer = pickle.loads(chunk_transformer)
+        _chunk_transformers[export_key] = transformer
+        if len(_chunk_transformers) > MAX_WORKER_EXPORTS:
+            _chunk_transformers.popitem(last=False)
+    else:
+        _chunk_transformers.move_to_end(export_key)
+    return transformer.transform_chunk(data_url, lines, first_line, passthrough_enabled)
+
+
+class TransformWorkers:
+    """
+    Worker processes shared by the exports of a sync.
+    ~~~
+    The process pool is started by the first export transformed in workers, and reused by the
+    later exports of every stream until `shutdown`. Starting spawned workers costs seconds of
+    interpreter start and imports, which would otherwise be paid by every export.
+    """
+
+    def __init__(self, workers: int = DEFAULT_TRANSFORM_WORKERS) -> None:
+        self.workers = max(1, workers)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Mapping[str, Any]) -> "TransformWorkers":
+        """ Function to build the workers from the tap config, 1 transforms in the tap process """
+
+        workers = config.get("transform_workers")
+        return cls(int(workers) if workers not in (None, "") else DEFAULT_TRANSFORM_WORKERS)
+
+    def get_executor(self) -> ProcessPoolExecutor:
+        """ Function to get the process pool, started on first use """
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context(MP_CONTEXT))
+            return self._executor
+
+    def shutdown(self) -> None:
+        """ Function to stop the worker processes, a later export starts them again """
+
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+class TransformPool:
+    """
+    Transforms the chunks of export lines of an export in the shared transform workers.
+    ~~~
+    At most `workers * CHUNKS_PER_WORKER` chunks of the export are in flight, and the transformed
+    chunks are returned in the order of the lines, so the records are written in file order.
+    """
+
+    def __init__(self, chunk_transformer: ChunkTransformer, transform_workers: TransformWorkers) -> None:
+        self.chunk_transformer = chunk_transformer
+        self.transform_workers = transform_workers
+        self.max_pending_chunks = transform_workers.workers * CHUNKS_PER_WORKER
+
+    @classmethod
+    def from_config(cls, config: Mapping[str, Any], transform_workers: TransformWorkers,
+                    record_transformer: CompiledTransformer, stream_name: str, replication_key: str,
+                    initial_bookmark, batch_output: bool = False) -> Optional["TransformPool"]:
+        """ Function to build the pool of an export, None when the records are transformed in the tap process
+
+        Only compiled transformers are run in the workers, other transformers may not be sent to another process.
+        """
+
+        if transform_workers.workers <= 1:
+            return None
+
+        if not record_transformer.is_compiled:
+            LOGGER.warning("Transforming the records of %s in the tap process, its transformer cannot run in workers",
+                           stream_name)
+            return None
+
+        chunk_transformer = ChunkTransformer(
+            stream_name, record_transformer.schema, record_transformer.metadata, replication_key,
+            to_canonical_datetime(initial_bookmark), record_transformer.transformer.integer_datetime_fmt,
+            config, batch_output=batch_output)
+        return cls(chunk_transformer, transform_workers)
+
+    def transform(self, line_batches: Iterable[Tuple[str, List[bytes]]]) -> Iterator[TransformedChunk]:
+        """ Function to transform the chunks of export lines in the workers
+
+        Args:
+            line_batches (Iterable[Tuple[str, List[bytes]]]): URL of the export file and chunk of its lines
+
+        Yields:
+            TransformedChunk: Transformed chunks, in the order of the lines
+        """
+
+        executor = self.transform_workers.get_executor()
+        export_key = uuid.uuid4().hex
+        chunk_transformer = pickle.dumps(self.chunk_transformer)
+        first_line = 0
+        passthrough_enabled = True
+        pending_chunks = deque()
+
+        def get_next_chunk() -> TransformedChunk:
+            nonlocal passthrough_enabled
+
+            chunk = pending_chunks.popleft().result()
+            # The chunks submitted after a failed sample are transformed without being checked
+            passthrough_enabled = passthrough_enabled and not chunk.passthrough_failed
+            return chunk
+
+        try:
+            for data_url, lines in line_batches:
+                pending_chunks.append(executor.submit(_transform_chunk, export_key, chunk_transformer, data_url,
+                                                      lines, first_line, passthrough_enabled))
+                first_line += len(lines)
+                if len(pending_chunks) >= self.max_pending_chunks:
+                    yield get_next_chunk()
+
+            while pending_chunks:
+                yield get_next_chunk()
+        finally:
+            # The workers are shared with the other exports, only the chunks of this export are dropped
+            for future in pending_chunks:
+                future.cancel()
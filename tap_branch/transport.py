@@ -0,0 +1,216 @@
+""" Shared HTTP transport with pooled keep-alive connections """
+
+import io
+import threading
+from typing import Any, Callable, Dict, Mapping, Optional
+
+import requests
+import singer
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ChunkedEncodingError, ConnectionError, Timeout
+from urllib3.exceptions import IncompleteRead, ProtocolError, ReadTimeoutError
+from urllib3.util.retry import Retry
+
+from tap_branch.branch_constants import (DEFAULT_EXPORT_DOWNLOAD_WORKERS,
+                                         DEFAULT_HTTP_MAX_RETRIES,
+                                         DEFAULT_HTTP_POOL_CONNECTIONS,
+                                         DEFAULT_HTTP_POOL_MAXSIZE,
+                                         MAX_DOWNLOAD_RESUMES)
+
+LOGGER = singer.get_logger()
+
+# Status codes retried by the download adapters for idempotent requests
+RETRY_STATUS_CODES = (502, 503, 504)
+RETRY_BACKOFF_FACTOR = 0.5
+
+# Errors raised while reading a response body, after which the download is resumed
+RESUMABLE_DOWNLOAD_ERRORS = (
+    ProtocolError,
+    IncompleteRead,
+    ReadTimeoutError,
+    ChunkedEncodingError,
+    ConnectionError,
+    ConnectionResetError,
+    Timeout,
+)
+
+# Bytes read at once when skipping the already consumed part of a restarted download
+SKIP_CHUNK_SIZE = 1024 * 1024
+
+
+def build_http_adapter(pool_connections: int = DEFAULT_HTTP_POOL_CONNECTIONS,
+                       pool_maxsize: int = DEFAULT_HTTP_POOL_MAXSIZE,
+                       max_retries: int = DEFAULT_HTTP_MAX_RETRIES) -> HTTPAdapter:
+    """ Function to build an adapter keeping `pool_maxsize` connections alive per host
+
+    Connection errors are retried for every method, since the request was not sent.
+    Read errors and gateway errors are only retried for idempotent methods.
+    A `max_retries` of 0 does not retry anything, same as the requests default.
+    """
+
+    if not max_retries:
+        return HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+
+    retries = Retry(
+        total=max_retries,
+        backoff_factor=RETRY_BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        raise_on_status=False,
+    )
+    return HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retries)
+
+
+def mount_http_adapters(session: requests.Session, **adapter_kwargs) -> requests.Session:
+    """ Function to mount the pooled adapters on the http and https schemes of the session """
+
+    adapter = build_http_adapter(**adapter_kwargs)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class HttpTransport:
+    """
+    Session shared by every download of the process.
+    ~~~
+    Reuses keep-alive connections to the export storage host across export files, part files
+    and streams, instead of opening a new TCP and TLS connection per file. The session is
+    created on first use, and its pool is sized for the parallel part downloads.
+    """
+
+    def __init__(self, pool_connections: int = DEFAULT_HTTP_POOL_CONNECTIONS,
+                 pool_maxsize: int = DEFAULT_HTTP_POOL_MAXSIZE,
+                 max_retries: int = DEFAULT_HTTP_MAX_RETRIES) -> None:
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.max_retries = max_retries
+        self._session: Optional[requests.Session] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Mapping[str, Any]) -> "HttpTransport":
+        """ Function to build the transport from the tap config """
+
+        download_workers = int(config.get("export_download_workers") or DEFAULT_EXPORT_DOWNLOAD_WORKERS)
+        pool_maxsize = int(config.get("http_pool_maxsize") or max(DEFAULT_HTTP_POOL_MAXSIZE, download_workers))
+        max_retries = config.get("http_max_retries")
+        return cls(pool_maxsize=pool_maxsize,
+                   max_retries=int(max_retries) if max_retries not in (None, "") else DEFAULT_HTTP_MAX_RETRIES)
+
+    @property
+    def session(self) -> requests.Session:
+        with self._lock:
+            if self._session is None:
+                self._session = mount_http_adapters(requests.Session(),
+                                                    pool_connections=self.pool_connections,
+                                                    pool_maxsize=self.pool_maxsize,
+                                                    max_retries=self.max_retries)
+            return self._session
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.session.get(url, **kwargs)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+
+_download_transport = HttpTransport()
+
+
+def get_download_transport() -> HttpTransport:
+    """ Function to get the transport shared by the export downloads """
+
+    return _download_transport
+
+
+def configure_download_transport(config: Mapping[str, Any]) -> HttpTransport:
+    """ Function to size the shared download transport from the tap config """
+
+    global _download_transport
+
+    _download_transport.close()
+    _download_transport = HttpTransport.from_config(config)
+    return _download_transport
+
+
+class ResumableDownload(io.RawIOBase):
+    """
+    Raw body of a streamed download, resumed where it broke off.
+    ~~~
+    Tracks the bytes handed to the reader. When the connection breaks while reading the body,
+    the download is requested again with a `Range` header starting at the first byte not read yet.
+    When the server ignores the range and sends the whole body, the bytes already read are skipped,
+    so the reader sees the body exactly once either way.
+    """
+
+    def __init__(self, response: requests.Response, url: str,
+                 fetch: Callable[..., requests.Response], max_resumes: int = MAX_DOWNLOAD_RESUMES) -> None:
+        """
+        Args:
+            response (requests.Response): Streamed response of the download
+            url (str): URL of the download
+            fetch (Callable): Function requesting the URL again, called with `headers`
+            max_resumes (int, optional): Maximum number of resumes of the download. Defaults to MAX_DOWNLOAD_RESUMES.
+        """
+
+        super().__init__()
+        self.url = url
+        self.fetch = fetch
+        self.max_resumes = max_resumes
+        self.bytes_consumed = 0
+        self.resumes = 0
+        self._response = response
+        self._skip = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while True:
+            try:
+                self._skip_consumed_bytes()
+                read = self._response.raw.readinto(buffer)
+            except RESUMABLE_DOWNLOAD_ERRORS as err:
+                self._resume(err)
+                continue
+
+            self.bytes_consumed += read
+            return read
+
+    def _skip_consumed_bytes(self) -> None:
+        while self._skip:
+            skipped = len(self._response.raw.read(min(self._skip, SKIP_CHUNK_SIZE)))
+            if not skipped:
+                raise IncompleteRead(self.bytes_consumed - self._skip, self._skip)
+            self._skip -= skipped
+
+    def _resume(self, error: Exception) -> None:
+        self.resumes += 1
+        if self.resumes > self.max_resumes:
+            raise error
+
+        LOGGER.warning("Download of %s broke off after %s bytes (%s), resuming, attempt %s of %s",
+                       self.url, self.bytes_consumed, error, self.resumes, self.max_resumes)
+        self._response.close()
+
+        headers: Dict[str, str] = {}
+        if self.bytes_consumed:
+            headers["Range"] = "bytes={}-".format(self.bytes_consumed)
+        self._response = self.fetch(self.url, headers=headers)
+
+        content_range = self._response.headers.get("Content-Range", "")
+        if self._response.status_code == 206 and content_range.startswith("bytes {}-".format(self.bytes_consumed)):
+            self._skip = 0
+        else:
+            # The server sent the whole body, skip the bytes the reader already has
+            LOGGER.info("Range requests are not supported for %s, restarting the download", self.url)
+            self._skip = self.bytes_consumed
+
+    def close(self) -> None:
+        if not self.closed:
+            self._response.close()
+        super().close()
@@ -0,0 +1,84 @@
+""" Sizing of the export date windows from the export volume observed per report type """
+
+from typing import Any, Dict, Mapping, Optional
+
+import pendulum
+import singer
+from singer import bookmarks
+
+from tap_branch.branch_constants import (DEFAULT_EXPORT_TARGET_RECORDS,
+                                         MAX_RECORDS_TO_FETCH,
+                                         MIN_ADAPTIVE_WINDOW_SECONDS)
+from tap_branch.branch_utils import is_config_enabled
+
+LOGGER = singer.get_logger()
+
+# Bookmark key of the observed export volume of a stream
+RECORDS_PER_DAY_KEY = "records_per_day"
+
+# Weight of the latest window in the moving average of the export volume
+VOLUME_SMOOTHING = 0.5
+
+# A truncated export only gives a lower bound of the volume, the next windows are sized for at least this much more
+TRUNCATED_VOLUME_FACTOR = 2
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+class WindowPlanner:
+    """
+    Plans the date windows of a report type from the records per day of its earlier exports.
+    ~~~
+    Windows grow or shrink so that an export holds about `target_records` records, within
+    the configured window size and at least `min_window_seconds`. The records per day are
+    a moving average over the exported windows, kept in the bookmark of the stream.
+    """
+
+    def __init__(self, target_records: int = DEFAULT_EXPORT_TARGET_RECORDS,
+                 min_window_seconds: int = MIN_ADAPTIVE_WINDOW_SECONDS) -> None:
+        self.target_records = target_records
+        self.min_window_seconds = min_window_seconds
+        self.records_per_day: Optional[float] = None
+
+    @classmethod
+    def from_config(cls, config: Mapping[str, Any]) -> Optional["WindowPlanner"]:
+        """ Function to build the planner from the tap config, None when `adaptive_window_size` is not enabled """
+
+        if not is_config_enabled(config, "adaptive_window_size"):
+            return None
+        return cls(target_records=int(config.get("export_target_records") or DEFAULT_EXPORT_TARGET_RECORDS))
+
+    def load_state(self, state: Dict, tap_stream_id: str) -> None:
+        records_per_day = state.get("bookmarks", {}).get(tap_stream_id, {}).get(RECORDS_PER_DAY_KEY)
+        self.records_per_day = float(records_per_day) if records_per_day is not None else None
+
+    def write_state(self, state: Dict, tap_stream_id: str) -> Dict:
+        if self.records_per_day is not None:
+            state = bookmarks.write_bookmark(state, tap_stream_id, RECORDS_PER_DAY_KEY, round(self.records_per_day, 3))
+        return state
+
+    def get_window_end(self, window_start: pendulum.DateTime, max_window_end: pendulum.DateTime) -> pendulum.DateTime:
+        """ Function to get the end of the window starting at `window_start`, at most `max_window_end` """
+
+        if not self.records_per_day:
+            return max_window_end
+
+        window_seconds = max(self.min_window_seconds, int(self.target_records / self.records_per_day * SECONDS_PER_DAY))
+        return min(window_start.add(seconds=window_seconds), max_window_end)
+
+    def record_export(self, window_start: pendulum.DateTime, window_end: pendulum.DateTime, record_count: int) -> None:
+        """ Function to record the number of records exported for the window """
+
+        window_days = (window_end - window_start).total_seconds() / SECONDS_PER_DAY
+        if window_days <= 0:
+            return
+
+        records_per_day = record_count / window_days
+        if record_count >= MAX_RECORDS_TO_FETCH:
+            LOGGER.warning("Export of the time period %s to %s reached the limit of %s records, shrinking the next windows",
+                           window_start, window_end, MAX_RECORDS_TO_FETCH)
+            self.records_per_day = max(self.records_per_day or 0, records_per_day * TRUNCATED_VOLUME_FACTOR)
+        elif self.records_per_day is None:
+            self.records_per_day = records_per_day
+        else:
+            self.records_per_day = VOLUME_SMOOTHING * records_per_day + (1 - VOLUME_SMOOTHING) * self.records_per_day
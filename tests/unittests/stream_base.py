@@ -0,0 +1,57 @@
+""" Shared fixtures of the unit tests of the branch events streams """
+
+import copy
+import gzip
+import json
+from unittest.mock import MagicMock
+
+from tap_branch.pending_jobs import PendingExportJobs
+from tap_branch.streams.branch_events import BranchEventsBaseStream
+from tap_branch.transform_pool import TransformWorkers
+
+SCHEMA = {"type": "object", "properties": {
+    "id": {"type": ["null", "string"]},
+    "timestamp": {"type": ["null", "string"], "format": "date-time"},
+}}
+
+
+# Concrete implementation for testing
+class ConcreteBranchEventsStream(BranchEventsBaseStream):
+    """Concrete implementation of BranchEventsBaseStream for testing."""
+    tap_stream_id = "eo_click"
+    replication_keys = ["timestamp"]
+
+
+def build_stream(config=None, schema=SCHEMA, mdata=None):
+    """ Build a selected stream with a mocked client, its config starting on 2024-01-01 """
+
+    client = MagicMock()
+    client.config = {"start_date": "2024-01-01T00:00:00Z", **(config or {})}
+    client.pending_export_jobs = PendingExportJobs()
+    client.transform_workers = TransformWorkers.from_config(client.config)
+    catalog = MagicMock()
+    catalog.schema.to_dict.return_value = copy.deepcopy(schema)
+    catalog.metadata = mdata or []
+    stream = ConcreteBranchEventsStream(client=client, catalog=catalog)
+    stream.is_selected = MagicMock(return_value=True)
+    return stream
+
+
+def build_identity_transformer():
+    """ Build a transformer returning the records unchanged """
+
+    transformer = MagicMock()
+    transformer.transform.side_effect = lambda record, schema, metadata: record
+    return transformer
+
+
+def gzip_lines(lines):
+    """ Build a gzipped body from the given text lines """
+
+    return gzip.compress("".join(lines).encode("utf-8"))
+
+
+def gzip_records(records):
+    """ Build a gzipped JSON lines body from the given records """
+
+    return gzip_lines(json.dumps(record) + "\n" for record in records)
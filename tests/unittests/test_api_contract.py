@@ -0,0 +1,106 @@
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from parameterized import parameterized
+
+from tap_branch.branch_api_contract import (GLOBAL_EXPORT_FIELD_DENYLIST,
+                                            BranchExportJobPayload,
+                                            ExportFieldRegistry)
+from tap_branch.branch_constants import BRANCH_EVENTS_SCHEMA
+
+
+def build_payload(**kwargs):
+    return BranchExportJobPayload(
+        start_date="2024-01-01T00:00:00Z",
+        end_date="2024-01-02T00:00:00Z",
+        report_type="eo_click",
+        limit=100,
+        response_format="json",
+        allow_multiple_files=True,
+        response_format_compression="gz",
+        schema_path=BRANCH_EVENTS_SCHEMA,
+        **kwargs
+    )
+
+
+class TestBranchExportJobPayload(unittest.TestCase):
+
+    def test_payload_exports_every_field_without_selection(self):
+        """ Test that every schema field except the denylist is exported when no fields are selected """
+
+        fields = build_payload().to_payload()["fields"]
+
+        self.assertIn("id", fields)
+        self.assertIn("timestamp", fields)
+        self.assertFalse(GLOBAL_EXPORT_FIELD_DENYLIST & set(fields))
+        self.assertEqual(fields, sorted(fields))
+
+    @parameterized.expand([
+        ["selected fields", ["id", "timestamp", "name"], None, {"id", "timestamp", "name"}],
+        ["denylisted field", ["id", "timestamp", "datasource"], None, {"id", "timestamp"}],
+        ["unknown field", ["id", "timestamp", "not_in_schema"], None, {"id", "timestamp"}],
+        ["rejected field", ["id", "timestamp", "name"], ["name"], {"id", "timestamp"}],
+    ])
+    def test_payload_exports_selected_fields(self, test_name, selected_fields, rejected_fields, expected_fields):
+        """ Test that only the selected schema fields are exported """
+
+        payload = build_payload(selected_fields=selected_fields).to_payload(rejected_fields=rejected_fields)
+
+        self.assertEqual(payload["fields"], sorted(expected_fields))
+
+
+class TestExportFieldRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.schema_path = Path(self.temp_dir.name) / "schema.json"
+        self.write_schema(["timestamp", "id", "datasource"])
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_schema(self, fields, mtime_ns=None):
+        with open(self.schema_path, "w") as f:
+            json.dump({"type": "object", "properties": {name: {"type": ["null", "string"]} for name in fields}}, f)
+        if mtime_ns is not None:
+            os.utime(self.schema_path, ns=(mtime_ns, mtime_ns))
+
+    def test_fields_are_sorted_without_denylist(self):
+        """ Test that the fields are sorted and the globally denied fields are removed """
+
+        self.assertEqual(ExportFieldRegistry().get_fields(self.schema_path), ("id", "timestamp"))
+
+    @patch("tap_branch.branch_api_contract.json.load", wraps=json.load)
+    def test_schema_is_parsed_once(self, mock_load):
+        """ Test that the schema file is only parsed on the first call """
+
+        registry = ExportFieldRegistry()
+        for _ in range(3):
+            registry.get_fields(self.schema_path)
+
+        mock_load.assert_called_once()
+
+    def test_changed_schema_is_reloaded(self):
+        """ Test that the fields are reloaded when the schema file changes """
+
+        registry = ExportFieldRegistry()
+        registry.get_fields(self.schema_path)
+
+        self.write_schema(["timestamp", "id", "name"], mtime_ns=10 ** 18)
+
+        self.assertEqual(registry.get_fields(self.schema_path), ("id", "name", "timestamp"))
+
+    @patch("tap_branch.branch_api_contract.json.load", wraps=json.load)
+    def test_invalidate_drops_cached_fields(self, mock_load):
+        """ Test that invalidated schema files are parsed again """
+
+        registry = ExportFieldRegistry()
+        registry.get_fields(self.schema_path)
+        registry.invalidate(self.schema_path)
+        registry.get_fields(self.schema_path)
+
+        self.assertEqual(mock_load.call_count, 2)
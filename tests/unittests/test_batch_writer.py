@@ -0,0 +1,102 @@
+import gzip
+import io
+import json
+import os
+import tempfile
+import unittest
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+from urllib.parse import urlparse
+
+import pendulum
+
+from tap_branch import message_writer
+from tap_branch.batch_writer import BatchWriter
+from tap_branch.message_writer import BufferedMessageWriter
+
+from stream_base import build_identity_transformer, build_stream
+
+
+def read_messages(stdout):
+    return [json.loads(line) for line in stdout.getvalue().splitlines()]
+
+
+def read_batch_file(uri):
+    with gzip.open(urlparse(uri).path, "rt", encoding="utf-8") as batch_file:
+        return [json.loads(line) for line in batch_file]
+
+
+class TestBatchWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+        message_writer._message_writer = BufferedMessageWriter()
+
+    def test_records_are_written_to_files_announced_by_batch_messages(self):
+        """ Test that every file of at most `max_records` records is announced once complete """
+
+        writer = BatchWriter(self.temp_dir.name, "eo_click", max_records=2)
+        with patch("sys.stdout", new_callable=io.StringIO) as mock_stdout:
+            for index in range(3):
+                writer.write_record({"id": str(index), "revenue": Decimal("1.5")})
+            self.assertEqual(len(read_messages(mock_stdout)), 1)
+            writer.flush()
+
+        messages = read_messages(mock_stdout)
+        self.assertEqual([message["type"] for message in messages], ["BATCH", "BATCH"])
+        self.assertEqual(messages[0]["encoding"], {"format": "jsonl", "compression": "gzip"})
+        self.assertEqual([read_batch_file(uri) for message in messages for uri in message["manifest"]],
+                         [[{"id": "0", "revenue": 1.5}, {"id": "1", "revenue": 1.5}], [{"id": "2", "revenue": 1.5}]])
+
+    def test_flush_without_records_writes_nothing(self):
+        writer = BatchWriter(self.temp_dir.name, "eo_click")
+        with patch("sys.stdout", new_callable=io.StringIO) as mock_stdout:
+            self.assertIsNone(writer.flush())
+
+        self.assertEqual(mock_stdout.getvalue(), "")
+
+    def test_abort_deletes_incomplete_file(self):
+        writer = BatchWriter(self.temp_dir.name, "eo_click")
+        writer.write_record({"id": "1"})
+        writer.abort()
+
+        self.assertEqual(os.listdir(self.temp_dir.name), [])
+
+    def test_from_config(self):
+        self.assertIsNone(BatchWriter.from_config({}, "eo_click"))
+        writer = BatchWriter.from_config({"batch_output": "true", "batch_output_dir": self.temp_dir.name,
+                                          "batch_file_records": "10"}, "eo_click")
+        self.assertEqual(writer.max_records, 10)
+
+
+class TestStreamBatchOutput(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+        message_writer._message_writer = BufferedMessageWriter()
+
+    def test_batch_messages_are_written_before_state(self):
+        """ Test that the records of a window are written to a batch file announced before the STATE message """
+
+        stream = build_stream({"batch_output": True, "batch_output_dir": self.temp_dir.name})
+        stream.start_export({})
+        records = [{"id": "1", "timestamp": "2024-01-01T10:00:00.000000Z"},
+                   {"id": "2", "timestamp": "2024-01-01T11:00:00.000000Z"}]
+        transformer = build_identity_transformer()
+
+        with patch("sys.stdout", new_callable=io.StringIO) as mock_stdout, \
+                patch.object(stream, "extract_data", return_value=iter(records)):
+            stream.process_export({}, transformer, {"response_url": "https://test.url/data.gz"},
+                                  pendulum.datetime(2024, 1, 1, tz="UTC"), pendulum.datetime(2024, 1, 2, tz="UTC"),
+                                  MagicMock())
+
+        messages = read_messages(mock_stdout)
+        self.assertEqual([message["type"] for message in messages], ["BATCH", "STATE"])
+        self.assertEqual(read_batch_file(messages[0]["manifest"][0]), records)
+        self.assertEqual(messages[1]["value"]["bookmarks"]["eo_click"]["timestamp"], "2024-01-01T11:00:00Z")
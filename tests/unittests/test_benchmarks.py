@@ -0,0 +1,108 @@
+import gzip
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+import pendulum
+import requests
+from parameterized import parameterized
+
+from benchmarks.export_generator import ExportProfile, generate_export
+from benchmarks.runner import run_benchmark
+from benchmarks.stub_server import StubBranchServer
+
+WINDOW_START = pendulum.datetime(2024, 1, 1, tz="UTC")
+WINDOW_END = pendulum.datetime(2024, 1, 2, tz="UTC")
+
+
+def read_export(paths):
+    records = []
+    for path in paths:
+        with gzip.open(path, "rt", encoding="utf-8") as export_file:
+            records.extend(json.loads(line) for line in export_file)
+    return records
+
+
+class TestExportGenerator(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    @parameterized.expand([
+        ["uniform", "uniform"],
+        ["sorted", "sorted"],
+        ["bursty", "bursty"],
+    ])
+    def test_records_are_within_the_window(self, test_name, timestamps):
+        """ Test that the records are split across the files, with timestamps within the window """
+
+        profile = ExportProfile(records=250, files=3, timestamps=timestamps, variants=4)
+
+        export = generate_export(Path(self.temp_dir.name), profile, WINDOW_START, WINDOW_END)
+        records = read_export(export.paths)
+
+        self.assertEqual(len(export.paths), 3)
+        self.assertEqual([record["id"] for record in records], [str(index) for index in range(250)])
+        millis = [record["timestamp"] for record in records]
+        self.assertTrue(all(WINDOW_START.timestamp() * 1000 <= value < WINDOW_END.timestamp() * 1000 for value in millis))
+        if timestamps == "sorted":
+            self.assertEqual(millis, sorted(millis))
+        self.assertGreater(export.raw_bytes, export.compressed_bytes)
+
+    def test_sparsity_and_datetime_format(self):
+        """ Test that a full sparsity only keeps the id and the timestamp, as an ISO 8601 string """
+
+        profile = ExportProfile(records=5, sparsity=1, datetime_format="iso")
+
+        record = read_export(generate_export(Path(self.temp_dir.name), profile, WINDOW_START, WINDOW_END).paths)[0]
+
+        self.assertEqual(set(record), {"id", "timestamp"})
+        self.assertTrue(pendulum.parse(record["timestamp"]) >= WINDOW_START)
+
+    def test_invalid_profile(self):
+        """ Test that an unknown timestamp distribution is rejected """
+
+        with self.assertRaises(ValueError):
+            ExportProfile(timestamps="random")
+
+
+class TestStubBranchServer(unittest.TestCase):
+
+    def test_export_job_serves_the_export_files(self):
+        """ Test that a created export job is complete and points at the export files """
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            export = generate_export(Path(temp_dir), ExportProfile(records=10, files=2, variants=2),
+                                     WINDOW_START, WINDOW_END)
+            with StubBranchServer(export.paths) as server:
+                self.assertTrue(requests.post(server.url + "/v2/data/ready/", json={}).json()["data_ready"])
+                handle = requests.post(server.url + "/v2/logs/", json={}).json()["handle"]
+                job = requests.get(server.url + "/v2/logs/{}/".format(handle)).json()
+                bodies = [requests.get(url).content for url in job["response_urls"]]
+            expected_bodies = [path.read_bytes() for path in export.paths]
+
+        self.assertEqual(job["status"], "complete")
+        self.assertEqual(bodies, expected_bodies)
+        self.assertEqual(server.bytes_served, export.compressed_bytes)
+
+
+class TestRunBenchmark(unittest.TestCase):
+
+    def test_run_benchmark(self):
+        """ Test that a sync against the stub server emits every record and reports the stage timings """
+
+        report = run_benchmark(ExportProfile(records=200, files=2, variants=4), repeat=2)
+
+        self.assertEqual(len(report.runs), 2)
+        self.assertTrue(all(run.records == 200 and run.peak_rss_mb > 0 for run in report.runs))
+        run = report.best
+        self.assertEqual(run.records, 200)
+        self.assertGreater(run.records_per_sec, 0)
+        self.assertGreater(run.output_mb, 0)
+        self.assertTrue({"data_ready", "export_job_create", "export_job_poll", "process_export",
+                         "transform", "extract_and_write"} <= set(run.stages))
+        self.assertNotIn("branch_access_token", report.to_dict()["config"])
@@ -1,6 +1,8 @@
 import gzip
 import io
 import json
+import threading
+import time
 import unittest
 from unittest.mock import MagicMock, patch
 
@@ -10,15 +12,12 @@ from requests.exceptions import ChunkedEncodingError, ConnectionError, Timeout
 
 from tap_branch.branch_api_contract import EndpointConfig
 from tap_branch.branch_constants import MAX_BRANCH_DATE_WINDOW
-from tap_branch.exceptions import BranchError
+from tap_branch.exceptions import BranchError, BranchExportFailed
+from tap_branch.pending_jobs import PendingExportJobs
 from tap_branch.streams.branch_events import BranchEventsBaseStream
+from tap_branch.transform_pool import TransformWorkers
 
-
-# Concrete implementation for testing
-class ConcreteBranchEventsStream(BranchEventsBaseStream):
-    """Concrete implementation of BranchEventsBaseStream for testing."""
-    tap_stream_id = "eo_click"
-    replication_keys = ["timestamp"]
+from stream_base import ConcreteBranchEventsStream, gzip_records
 
 
 class TestBranchEventsBaseStream(unittest.TestCase):
@@ -35,6 +34,8 @@ class TestBranchEventsBaseStream(unittest.TestCase):
             "branch_window_size": 30,
             "start_date": "2024-01-01T00:00:00Z",
         }
+        self.mock_client.pending_export_jobs = PendingExportJobs()
+        self.mock_client.transform_workers = TransformWorkers()
         self.mock_catalog = MagicMock()
         self.mock_catalog.schema.to_dict.return_value = {
             "type": "object",
@@ -64,6 +65,24 @@ class TestBranchEventsBaseStream(unittest.TestCase):
         self.assertEqual(self.stream.endpoint_config.required_query_params, {"app_id"})
         self.assertEqual(self.stream.endpoint_config.required_headers, {"Access-Token"})
 
+    def test_get_selected_fields(self):
+        """Test that deselected and unsupported fields are not exported, unlike automatic fields."""
+        self.stream.schema["properties"].update({
+            "name": {"type": ["null", "string"]},
+            "user_data_os": {"type": ["null", "string"]},
+            "deep_linked": {"type": ["null", "boolean"]},
+            "custom_data": {"type": ["null", "object"]},
+        })
+        self.stream.metadata = {
+            ("properties", "id"): {"inclusion": "automatic", "selected": False},
+            ("properties", "timestamp"): {"inclusion": "automatic"},
+            ("properties", "name"): {"inclusion": "available", "selected": True},
+            ("properties", "user_data_os"): {"inclusion": "available", "selected": False},
+            ("properties", "deep_linked"): {"inclusion": "unsupported"},
+        }
+
+        self.assertEqual(self.stream.get_selected_fields(), ["id", "timestamp", "name", "custom_data"])
+
     @patch("tap_branch.streams.branch_events.BranchEventsBaseStream._fetch_export_data")
     def test_extract_data_success(self, mock_fetch):
         """Test successful data extraction from gzipped response."""
@@ -408,6 +427,226 @@ class TestBranchEventsBaseStream(unittest.TestCase):
         # Should create multiple export jobs (at least 2 for 10-day windows over 24 days)
         self.assertGreaterEqual(self.mock_client.create_export_job.call_count, 2)
 
+    @patch("singer.write_state")
+    @patch("tap_branch.streams.branch_events.write_record")
+    def test_sync_reattaches_pending_export_job(self, mock_write_record, mock_write_state):
+        """Test that a restarted sync polls the job left pending by the killed run instead of creating one."""
+        self.mock_client.build_headers.return_value = {"Access-Token": "test_token"}
+        self.mock_client.build_query_params.return_value = {"app_id": "test_app_id"}
+        self.mock_client.check_data_readiness.return_value = True
+        self.mock_client.create_export_job.return_value = "test_request_handle"
+        self.mock_client.check_export_job_status.side_effect = KeyboardInterrupt
+        state = {}
+
+        # The first run is killed while polling its export job
+        with patch("pendulum.now", return_value=pendulum.parse("2024-01-10T00:00:00Z")):
+            with self.assertRaises(KeyboardInterrupt):
+                self.stream.sync(state, MagicMock())
+
+        self.assertEqual(state["pending_export_jobs"]["eo_click"][0]["request_handle"], "test_request_handle")
+
+        restarted_client = self.mock_client
+        restarted_client.pending_export_jobs = PendingExportJobs()
+        restarted_client.create_export_job.reset_mock()
+        restarted_client.create_export_job.return_value = "next_request_handle"
+        restarted_client.check_export_job_status.reset_mock(side_effect=True)
+        restarted_client.check_export_job_status.return_value = (True, {"response_url": "https://test.url/data.gz"})
+        self.stream.is_selected = MagicMock(return_value=True)
+
+        with patch("pendulum.now", return_value=pendulum.parse("2024-01-10T00:30:00Z")):
+            with patch.object(self.stream, "extract_data", return_value=[]):
+                self.stream.sync(state, MagicMock())
+
+        # Only the window between the end of the pending job and the restart needs a new job
+        restarted_client.create_export_job.assert_called_once()
+        polled_handles = [call[1]["request_handle"] for call in restarted_client.check_export_job_status.call_args_list]
+        self.assertEqual(polled_handles, ["test_request_handle", "next_request_handle"])
+        self.assertNotIn("pending_export_jobs", state)
+
+    @patch("singer.write_state")
+    def test_sync_discards_failed_export_job(self, mock_write_state):
+        """Test that a failed export job is not re-attached by the next run."""
+        self.mock_client.check_data_readiness.return_value = True
+        self.mock_client.create_export_job.return_value = "test_request_handle"
+        self.mock_client.check_export_job_status.side_effect = BranchExportFailed("Export job failed with status: fail")
+        emitted_states = []
+        mock_write_state.side_effect = lambda state: emitted_states.append(json.loads(json.dumps(state)))
+        state = {}
+
+        with patch("pendulum.now", return_value=pendulum.parse("2024-01-10T00:00:00Z")):
+            with self.assertRaises(BranchExportFailed):
+                self.stream.sync(state, MagicMock())
+
+        self.assertNotIn("pending_export_jobs", state)
+        # The handle was written when the job was created, the last emitted state no longer holds it
+        self.assertIn("pending_export_jobs", emitted_states[0])
+        self.assertNotIn("pending_export_jobs", emitted_states[-1])
+
+    def test_generate_windows_stops_at_window_without_ready_data(self):
+        """Test that later windows are only generated while their data is ready."""
+        self.mock_client.config["branch_window_size"] = 10
+        self.stream.prepare_export_configs()
+        self.mock_client.check_data_readiness.side_effect = lambda export_start, **kwargs: export_start < "2024-01-21"
+
+        with patch("pendulum.now", return_value=pendulum.parse("2024-02-01T00:00:00Z")):
+            windows = list(self.stream.generate_windows(pendulum.parse("2024-01-01T00:00:00Z")))
+
+        self.assertEqual([(start.day, end.day) for start, end in windows], [(1, 11), (11, 21)])
+        # The readiness of the first window start is checked before the windows are generated
+        self.assertEqual([call[1]["export_start"] for call in self.mock_client.check_data_readiness.call_args_list],
+                         ["2024-01-11 00:00:00", "2024-01-21 00:00:00"])
+
+    def test_generate_windows_checks_data_readiness_once_per_day(self):
+        """Test that the data readiness is checked once per day of the windows, and the skipped windows logged."""
+        self.stream.prepare_export_configs()
+        self.stream.get_window_configurations = lambda export_start: export_start.add(hours=6)
+        self.mock_client.check_data_readiness.side_effect = lambda export_start, **kwargs: export_start < "2024-01-03"
+
+        with patch("pendulum.now", return_value=pendulum.parse("2024-01-03T12:00:00Z")), \
+                self.assertLogs(level="INFO") as logs:
+            windows = list(self.stream.generate_windows(pendulum.parse("2024-01-01T00:00:00Z")))
+
+        self.assertEqual(len(windows), 8)
+        self.assertEqual(windows[-1][1], pendulum.parse("2024-01-03T00:00:00Z"))
+        self.assertEqual([call[1]["export_start"] for call in self.mock_client.check_data_readiness.call_args_list],
+                         ["2024-01-02 00:00:00", "2024-01-03 00:00:00"])
+        self.assertIn("INFO:root:Skipping the windows from 2024-01-03 00:00:00+00:00 to 2024-01-03 12:00:00+00:00 "
+                      "of the report_type eo_click, data is not ready", logs.output)
+
+    @parameterized.expand([
+        ["even split", "2024-01-01T00:00:00Z", "2024-01-03T00:00:00Z", 2,
+         ["2024-01-01T00:00:00Z", "2024-01-02T00:00:00Z", "2024-01-03T00:00:00Z"]],
+        ["uneven split", "2024-01-01T10:00:00Z", "2024-01-01T10:00:05Z", 2,
+         ["2024-01-01T10:00:00Z", "2024-01-01T10:00:02Z", "2024-01-01T10:00:05Z"]],
+        ["three parts", "2024-01-01T00:00:00Z", "2024-01-01T03:00:00Z", 3,
+         ["2024-01-01T00:00:00Z", "2024-01-01T01:00:00Z", "2024-01-01T02:00:00Z", "2024-01-01T03:00:00Z"]],
+    ])
+    def test_split_window(self, test_name, window_start, window_end, parts, expected_bounds):
+        """Test that a window is split into consecutive sub-windows covering it."""
+        sub_windows = self.stream.split_window(pendulum.parse(window_start), pendulum.parse(window_end), parts)
+
+        expected_bounds = [pendulum.parse(bound) for bound in expected_bounds]
+        self.assertEqual(sub_windows, list(zip(expected_bounds, expected_bounds[1:])))
+
+    def run_truncated_export(self, exports):
+        """Process the export of the first window, exporting its sub-windows from the given exports."""
+        window_start, window_end = pendulum.parse("2024-01-01T00:00:00Z"), pendulum.parse("2024-01-02T00:00:00Z")
+        self.mock_client.create_export_job.side_effect = ["sub1", "sub2"]
+        self.mock_client.check_export_job_status.side_effect = lambda request_handle, **kwargs: (
+            True, {"response_url": "https://test.url/{}.gz".format(request_handle)})
+        transformer = MagicMock()
+        transformer.transform.side_effect = lambda record, schema, metadata: record
+        self.stream.is_selected = MagicMock(return_value=True)
+        self.stream.prepare_export_configs()
+        self.stream.start_export({})
+        emitted_states = []
+
+        with patch.object(BranchEventsBaseStream, "_iter_export_bodies", side_effect=lambda data_urls, max_workers: iter(
+                [(data_urls[0], io.BytesIO(gzip_records(exports[data_urls[0]])))])), \
+                patch("singer.write_state", side_effect=lambda state: emitted_states.append(json.loads(json.dumps(state)))), \
+                patch("tap_branch.streams.branch_events.write_record") as mock_write_record:
+            state = self.stream.process_export({}, transformer, {"response_url": "https://test.url/window.gz"},
+                                               window_start, window_end, MagicMock())
+
+        return state, [call.args[1]["id"] for call in mock_write_record.call_args_list], emitted_states
+
+    @patch("tap_branch.streams.branch_events.MAX_RECORDS_TO_FETCH", 3)
+    def test_truncated_export_is_exported_again_in_sub_windows(self):
+        """Test that a window whose export is cut at the record limit is exported again in sub-windows."""
+        state, emitted_ids, _ = self.run_truncated_export({
+            "https://test.url/window.gz": [{"id": "1", "timestamp": "2024-01-01T01:00:00Z"},
+                                           {"id": "2", "timestamp": "2024-01-01T02:00:00Z"},
+                                           {"id": "3", "timestamp": "2024-01-01T12:00:00Z"}],
+            "https://test.url/sub1.gz": [{"id": "1", "timestamp": "2024-01-01T01:00:00Z"},
+                                         {"id": "2", "timestamp": "2024-01-01T02:00:00Z"}],
+            "https://test.url/sub2.gz": [{"id": "3", "timestamp": "2024-01-01T12:00:00Z"},
+                                         {"id": "4", "timestamp": "2024-01-01T20:00:00Z"}],
+        })
+
+        # Only the record cut from the truncated export is emitted by the sub-windows
+        self.assertEqual(emitted_ids, ["1", "2", "3", "4"])
+        self.assertEqual(state["bookmarks"]["eo_click"]["timestamp"], "2024-01-01T20:00:00Z")
+
+        # The sub-window jobs cover the whole window, and are created before polling
+        create_payloads = [call[1]["api_config"].additional_data for call in self.mock_client.create_export_job.call_args_list]
+        self.assertEqual([(payload["start_date"], payload["end_date"]) for payload in create_payloads],
+                         [("2024-01-01T00:00:00Z", "2024-01-01T12:00:00Z"), ("2024-01-01T12:00:00Z", "2024-01-02T00:00:00Z")])
+        client_calls = [name for name, _, _ in self.mock_client.mock_calls
+                        if name in ("create_export_job", "check_export_job_status")]
+        self.assertEqual(client_calls, ["create_export_job", "create_export_job",
+                                        "check_export_job_status", "check_export_job_status"])
+
+    @patch("tap_branch.streams.branch_events.MAX_RECORDS_TO_FETCH", 3)
+    def test_truncated_unsorted_export_does_not_drop_records(self):
+        """Test that the records cut from an unsorted export are exported, even before the last record read."""
+        state, emitted_ids, emitted_states = self.run_truncated_export({
+            "https://test.url/window.gz": [{"id": "3", "timestamp": "2024-01-01T20:00:00Z"},
+                                           {"id": "4", "timestamp": "2024-01-01T21:00:00Z"},
+                                           {"id": "2", "timestamp": "2024-01-01T02:00:00Z"}],
+            "https://test.url/sub1.gz": [{"id": "2", "timestamp": "2024-01-01T02:00:00Z"},
+                                         {"id": "1", "timestamp": "2024-01-01T01:00:00Z"}],
+            "https://test.url/sub2.gz": [{"id": "4", "timestamp": "2024-01-01T21:00:00Z"},
+                                         {"id": "3", "timestamp": "2024-01-01T20:00:00Z"}],
+        })
+
+        # The record cut from the export is before the last record read
+        self.assertEqual(emitted_ids, ["3", "4", "2", "1"])
+        self.assertEqual(state["bookmarks"]["eo_click"]["timestamp"], "2024-01-01T21:00:00Z")
+        # The bookmark written after the first sub-window stays within it, a restart exports the second one again
+        bookmarks = [emitted_state["bookmarks"]["eo_click"]["timestamp"] for emitted_state in emitted_states
+                     if "timestamp" in emitted_state.get("bookmarks", {}).get("eo_click", {})]
+        self.assertEqual(bookmarks[0], "2024-01-01T12:00:00Z")
+
+    @patch("tap_branch.streams.branch_events.MAX_RECORDS_TO_FETCH", 3)
+    def test_sub_window_checkpoints_stay_within_sub_window(self):
+        """Test that the checkpoints of a sub-window never hold the records of the truncated export past its end."""
+        self.mock_client.config["export_checkpoint_records"] = 1
+        _, _, emitted_states = self.run_truncated_export({
+            "https://test.url/window.gz": [{"id": "3", "timestamp": "2024-01-01T20:00:00Z"},
+                                           {"id": "4", "timestamp": "2024-01-01T21:00:00Z"},
+                                           {"id": "2", "timestamp": "2024-01-01T02:00:00Z"}],
+            "https://test.url/sub1.gz": [{"id": "2", "timestamp": "2024-01-01T02:00:00Z"},
+                                         {"id": "1", "timestamp": "2024-01-01T01:00:00Z"}],
+            "https://test.url/sub2.gz": [{"id": "4", "timestamp": "2024-01-01T21:00:00Z"},
+                                         {"id": "3", "timestamp": "2024-01-01T20:00:00Z"}],
+        })
+
+        sub1_checkpoints = [emitted_state["bookmarks"]["eo_click"]["export_checkpoint"]
+                            for emitted_state in emitted_states
+                            if emitted_state.get("bookmarks", {}).get("eo_click", {}).get(
+                                "export_checkpoint", {}).get("export_id") == "sub1"]
+        self.assertTrue(sub1_checkpoints)
+        self.assertTrue(all(checkpoint["max_bookmark"] <= "2024-01-01T12:00:00Z" for checkpoint in sub1_checkpoints))
+
+    @patch("singer.write_state")
+    def test_failed_sub_window_job_is_discarded(self, mock_write_state):
+        """Test that the failed export job of a sub-window is dropped from the emitted state."""
+        window_start, window_end = pendulum.parse("2024-01-01T00:00:00Z"), pendulum.parse("2024-01-02T00:00:00Z")
+        self.mock_client.create_export_job.side_effect = ["sub1", "sub2"]
+        self.mock_client.check_export_job_status.side_effect = BranchExportFailed("Export job failed with status: fail")
+        emitted_states = []
+        mock_write_state.side_effect = lambda state: emitted_states.append(json.loads(json.dumps(state)))
+        self.stream.prepare_export_configs()
+        self.stream.start_export({})
+
+        with self.assertRaises(BranchExportFailed):
+            self.stream.export_sub_windows({}, MagicMock(), window_start, window_end, MagicMock(), set())
+
+        pending_handles = [job["request_handle"] for job in emitted_states[-1]["pending_export_jobs"]["eo_click"]]
+        self.assertEqual(pending_handles, ["sub2"])
+
+    @patch("tap_branch.streams.branch_events.ExportJobScheduler")
+    def test_sync_with_export_lookahead_uses_scheduler(self, mock_scheduler):
+        """Test that a configured look-ahead pipelines the windows through the scheduler."""
+        self.mock_client.config["export_lookahead"] = 2
+        mock_scheduler.return_value.sync.return_value = {"eo_click": 5}
+
+        result = self.stream.sync({}, MagicMock())
+
+        self.assertEqual(result, 5)
+        mock_scheduler.assert_called_once_with(self.mock_client, max_concurrent_jobs=3, lookahead=2)
+        self.mock_client.check_export_job_status.assert_not_called()
+
     def test_sync_builds_correct_headers(self):
         """Test that sync builds headers correctly."""
         self.mock_client.build_headers.return_value = {"Access-Token": "test_token"}
@@ -470,6 +709,34 @@ class TestBranchEventsBaseStream(unittest.TestCase):
 
         self.assertEqual(len(extracted_records), 0)
 
+    def test_failed_part_download_does_not_wait_for_other_parts(self):
+        """Test that a failed part surfaces right away, the running part closes its file once it finishes."""
+        part_started, part_released = threading.Event(), threading.Event()
+        part_file = MagicMock()
+
+        def download_part(data_url):
+            if data_url.endswith("part0"):
+                part_started.wait(5)
+                raise BranchError("Part download failed")
+            part_started.set()
+            part_released.wait(5)
+            return part_file
+
+        with patch.object(BranchEventsBaseStream, "_download_export_part", side_effect=download_part):
+            started = time.monotonic()
+            with self.assertRaises(BranchError):
+                list(BranchEventsBaseStream._download_export_parts(["https://test.url/part0", "https://test.url/part1"], 2))
+            elapsed = time.monotonic() - started
+
+            part_released.set()
+            for _ in range(100):
+                if part_file.close.called:
+                    break
+                time.sleep(0.01)
+
+        self.assertLess(elapsed, 2)
+        part_file.close.assert_called_once()
+
 
 class TestExtractDataRetryLogic(unittest.TestCase):
     """Test suite for extract_data retry logic with backoff decorator."""
@@ -534,3 +801,61 @@ class TestExtractDataRetryLogic(unittest.TestCase):
         self.assertEqual(len(extracted_records), 2)
         self.assertEqual(extracted_records[0]["id"], "event1")
         self.assertEqual(extracted_records[1]["id"], "event2")
+
+
+class TestExtractDataMultipleFiles(unittest.TestCase):
+    """Test suite for exports split across multiple part files."""
+
+    @staticmethod
+    def _gzipped_response(records):
+        gzipped_content = io.BytesIO()
+        with gzip.GzipFile(fileobj=gzipped_content, mode='wb') as gz:
+            for record in records:
+                gz.write((json.dumps(record) + '\n').encode('utf-8'))
+        gzipped_content.seek(0)
+
+        mock_response = MagicMock()
+        mock_response.raw = gzipped_content
+        mock_response.__enter__ = MagicMock(return_value=mock_response)
+        mock_response.__exit__ = MagicMock(return_value=False)
+        return mock_response
+
+    @parameterized.expand([
+        ["single_worker", 1],
+        ["multiple_workers", 4],
+    ])
+    @patch("tap_branch.streams.branch_events.BranchEventsBaseStream._fetch_export_data")
+    def test_extract_data_reads_every_part_in_order(self, test_name, max_workers, mock_fetch):
+        """Test that every part file is downloaded and records are yielded in part order."""
+        parts = {
+            "https://test.url/part-0.gz": [{"id": "event1"}, {"id": "event2"}],
+            "https://test.url/part-1.gz": [{"id": "event3"}],
+            "https://test.url/part-2.gz": [{"id": "event4"}, {"id": "event5"}],
+        }
+        mock_fetch.side_effect = lambda url: self._gzipped_response(parts[url])
+
+        job_response = {"response_urls": list(parts.keys())}
+        extracted_records = list(BranchEventsBaseStream.extract_data(job_response, max_workers=max_workers))
+
+        self.assertEqual([record["id"] for record in extracted_records],
+                         ["event1", "event2", "event3", "event4", "event5"])
+        self.assertEqual(mock_fetch.call_count, 3)
+
+    @patch("tap_branch.streams.branch_events.BranchEventsBaseStream._fetch_export_data")
+    def test_extract_data_part_failure_raises_branch_error(self, mock_fetch):
+        """Test that a failing part download fails the extraction."""
+        def fetch(url):
+            if url.endswith("part-1.gz"):
+                raise ValueError("Corrupted part")
+            return self._gzipped_response([{"id": "event1"}])
+        mock_fetch.side_effect = fetch
+
+        job_response = {"response_url": ["https://test.url/part-0.gz", "https://test.url/part-1.gz"]}
+
+        with self.assertRaises(BranchError):
+            list(BranchEventsBaseStream.extract_data(job_response, max_workers=2))
+
+    def test_extract_data_without_urls_raises_branch_error(self):
+        """Test that a completed export job without file URLs raises BranchError."""
+        with self.assertRaises(BranchError):
+            list(BranchEventsBaseStream.extract_data({"status": "complete"}))
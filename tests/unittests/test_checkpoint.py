@@ -0,0 +1,187 @@
+import io
+import json
+import unittest
+from unittest.mock import MagicMock, patch
+
+import pendulum
+from parameterized import parameterized
+from singer import Transformer
+
+from tap_branch import message_writer
+from tap_branch.checkpoint import (EXPORT_CHECKPOINT_KEY, CheckpointSchedule,
+                                   clear_export_checkpoint,
+                                   get_export_checkpoint,
+                                   write_export_checkpoint)
+from tap_branch.message_writer import BufferedMessageWriter
+from tap_branch.pending_jobs import PENDING_EXPORT_JOBS_KEY
+from tap_branch.transform_pool import TransformWorkers
+
+from stream_base import build_stream, gzip_lines, gzip_records
+
+WINDOW_START = pendulum.datetime(2024, 1, 1, tz="UTC")
+WINDOW_END = pendulum.datetime(2024, 1, 2, tz="UTC")
+
+
+class TestExportCheckpoint(unittest.TestCase):
+
+    def test_state_round_trip(self):
+        """ Test that a checkpoint is only found again for the same export and window """
+
+        state = {"bookmarks": {"eo_click": {"timestamp": "2024-01-01T00:00:00Z"}}}
+        write_export_checkpoint(state, "eo_click", "handle1", WINDOW_START, 300,
+                                pendulum.datetime(2024, 1, 1, 12, tz="UTC"))
+
+        checkpoint = get_export_checkpoint(state, "eo_click", "handle1", WINDOW_START)
+        self.assertEqual(checkpoint["records_read"], 300)
+        self.assertEqual(checkpoint["max_bookmark"], "2024-01-01T12:00:00Z")
+        self.assertIsNone(get_export_checkpoint(state, "eo_click", "handle2", WINDOW_START))
+        self.assertIsNone(get_export_checkpoint(state, "eo_click", "handle1", WINDOW_END))
+        self.assertIsNone(get_export_checkpoint(state, "eo_open", "handle1", WINDOW_START))
+
+        clear_export_checkpoint(state, "eo_click")
+        self.assertEqual(state, {"bookmarks": {"eo_click": {"timestamp": "2024-01-01T00:00:00Z"}}})
+
+    def test_schedule_by_record_count(self):
+        schedule = CheckpointSchedule(every_records=100, every_seconds=0)
+
+        self.assertEqual([records for records in range(1, 301) if schedule.is_due(records)], [100, 200, 300])
+
+    @patch("tap_branch.checkpoint.time.monotonic")
+    def test_schedule_by_elapsed_time(self, mock_monotonic):
+        """ Test that the elapsed time triggers a checkpoint when few records are read """
+
+        mock_monotonic.return_value = 0
+        schedule = CheckpointSchedule(every_records=0, every_seconds=60)
+
+        self.assertFalse(schedule.is_due(1000))
+        mock_monotonic.return_value = 61
+        self.assertFalse(schedule.is_due(1001))
+        self.assertTrue(schedule.is_due(2000))
+        self.assertFalse(schedule.is_due(3000))
+
+    def test_from_config(self):
+        schedule = CheckpointSchedule.from_config({"export_checkpoint_records": "0", "export_checkpoint_interval": "30"})
+
+        self.assertEqual((schedule.every_records, schedule.every_seconds), (0, 30))
+
+
+class TestStreamExportCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.stream = build_stream({"export_checkpoint_records": 2})
+        self.records = [{"id": str(index), "timestamp": "2024-01-01T{:02d}:00:00.000000Z".format(hour)}
+                        for index, hour in enumerate([5, 1, 9, 3, 2])]
+        with patch("singer.write_state"):
+            self.stream.client.pending_export_jobs.add("eo_click", "handle1", WINDOW_START, WINDOW_END,
+                                                       self.stream.get_selected_fields())
+
+    def tearDown(self):
+        message_writer._message_writer = BufferedMessageWriter()
+        self.stream.client.transform_workers.shutdown()
+
+    def process_export(self, state, body=None):
+        response = MagicMock()
+        response.raw = io.BytesIO(body or gzip_records(self.records))
+        self.stream.start_export(state)
+        with patch("tap_branch.streams.branch_events.BranchEventsBaseStream._fetch_export_data",
+                   return_value=response), \
+                patch("singer.write_state") as mock_write_state, \
+                patch("sys.stdout", new_callable=io.StringIO) as mock_stdout:
+            state = self.stream.process_export(state, Transformer(), {"response_url": "https://test.url/data.gz"},
+                                               WINDOW_START, WINDOW_END, MagicMock())
+            message_writer.get_message_writer().flush()
+        emitted_ids = [json.loads(line)["record"]["id"] for line in mock_stdout.getvalue().splitlines()
+                       if json.loads(line)["type"] == "RECORD"]
+        return state, emitted_ids, mock_write_state
+
+    def test_checkpoints_are_written_while_records_are_emitted(self):
+        """ Test that the progress is checkpointed without moving the replication key bookmark """
+
+        checkpoints = []
+        self.stream.client.config["export_checkpoint_records"] = 2
+        with patch("tap_branch.streams.branch_events.write_export_checkpoint",
+                   side_effect=lambda *args: checkpoints.append(args[3:])):
+            state, emitted_ids, _ = self.process_export({})
+
+        self.assertEqual(emitted_ids, ["0", "1", "2", "3", "4"])
+        self.assertEqual(checkpoints, [(WINDOW_START, 2, pendulum.parse("2024-01-01T05:00:00Z")),
+                                       (WINDOW_START, 4, pendulum.parse("2024-01-01T09:00:00Z"))])
+        self.assertNotIn(EXPORT_CHECKPOINT_KEY, state["bookmarks"]["eo_click"])
+        self.assertEqual(state["bookmarks"]["eo_click"]["timestamp"], "2024-01-01T09:00:00Z")
+
+    @parameterized.expand([
+        ["decode pipeline", {}],
+        ["without decode pipeline", {"export_decode_pipeline": False}],
+        ["transform workers", {"transform_workers": 2}],
+    ])
+    def test_restart_resumes_after_checkpoint(self, test_name, config):
+        """ Test that a restarted export skips the records read before the checkpoint """
+
+        self.stream.client.config.update(config)
+        self.stream.client.transform_workers = TransformWorkers.from_config(self.stream.client.config)
+        state = {"bookmarks": {"eo_click": {"timestamp": "2024-01-01T00:00:00Z"}}}
+        write_export_checkpoint(state, "eo_click", "handle1", WINDOW_START, 3, pendulum.parse("2024-01-01T09:00:00Z"))
+
+        state, emitted_ids, _ = self.process_export(state)
+
+        self.assertEqual(emitted_ids, ["3", "4"])
+        self.assertEqual(state["bookmarks"]["eo_click"]["timestamp"], "2024-01-01T09:00:00Z")
+
+    def test_restored_checkpoint_past_window_end_is_capped(self):
+        """ Test that a checkpoint holding records past the window, read from a truncated export, stops at its end """
+
+        state = {"bookmarks": {"eo_click": {"timestamp": "2024-01-01T00:00:00Z"}}}
+        write_export_checkpoint(state, "eo_click", "handle1", WINDOW_START, 5, pendulum.parse("2024-01-03T09:00:00Z"))
+
+        state, emitted_ids, _ = self.process_export(state)
+
+        self.assertEqual(emitted_ids, [])
+        self.assertEqual(state["bookmarks"]["eo_click"]["timestamp"], "2024-01-02T00:00:00Z")
+
+    @patch("tap_branch.streams.branch_events.JsonCodec.loads", side_effect=json.loads)
+    def test_restart_skips_lines_before_decoding(self, mock_loads):
+        """ Test that the lines read before the checkpoint are not decoded again """
+
+        state = {"bookmarks": {"eo_click": {"timestamp": "2024-01-01T00:00:00Z"}}}
+        write_export_checkpoint(state, "eo_click", "handle1", WINDOW_START, 3, pendulum.parse("2024-01-01T09:00:00Z"))
+
+        self.process_export(state)
+
+        self.assertEqual(mock_loads.call_count, 2)
+
+    def test_malformed_line_before_checkpoint_skips_no_later_record(self):
+        """ Test that a malformed line read before the checkpoint leads to records emitted again, never to missing ones """
+
+        lines = [json.dumps(record) + "\n" for record in self.records]
+        body = gzip_lines(lines[:1] + ["not json\n"] + lines[1:])
+        state = {"bookmarks": {"eo_click": {"timestamp": "2024-01-01T00:00:00Z"}}}
+        # The first 3 records were read from the first 4 lines
+        write_export_checkpoint(state, "eo_click", "handle1", WINDOW_START, 3, pendulum.parse("2024-01-01T09:00:00Z"))
+
+        state, emitted_ids, _ = self.process_export(state, body=body)
+
+        self.assertEqual(emitted_ids, ["2", "3", "4"])
+
+    def test_checkpoint_keeps_pending_job_valid(self):
+        """ Test that a checkpoint refreshes the export job in the state, so a restart can still re-attach to it """
+
+        checkpointed_jobs = []
+        self.stream.client.config["export_checkpoint_records"] = 2
+        state = {"bookmarks": {"eo_click": {"timestamp": "2024-01-01T00:00:00Z"}}}
+
+        with patch("tap_branch.streams.branch_events.write_state",
+                   side_effect=lambda state: checkpointed_jobs.append(json.loads(json.dumps(
+                       state.get(PENDING_EXPORT_JOBS_KEY))))):
+            self.process_export(state)
+
+        self.assertIsNotNone(checkpointed_jobs[0]["eo_click"][0]["updated_at"])
+
+    def test_checkpoint_of_another_export_is_ignored(self):
+        """ Test that a checkpoint of a different export job does not skip records """
+
+        state = {"bookmarks": {"eo_click": {"timestamp": "2024-01-01T00:00:00Z"}}}
+        write_export_checkpoint(state, "eo_click", "handle0", WINDOW_START, 3, pendulum.parse("2024-01-01T09:00:00Z"))
+
+        state, emitted_ids, _ = self.process_export(state)
+
+        self.assertEqual(emitted_ids, ["0", "1", "2", "3", "4"])
@@ -73,6 +73,15 @@ class TestClient(unittest.TestCase):
         assert client.request_timeout == expected_value
         assert isinstance(client._session, mock_session().__class__)
 
+    def test_api_session_does_not_retry(self):
+        """The API calls are retried by the client's backoff only, not by
+        the connection pool of their session."""
+        adapter = self.client._session.get_adapter("https://api2.branch.io/v2/logs/")
+
+        self.assertEqual(adapter.max_retries.total, 0)
+        self.assertFalse(adapter.max_retries.status_forcelist)
+        self.assertTrue(self.client.download_transport.session.get_adapter("https://test.url").max_retries.total)
+
     @patch("tap_branch.client.Client._Client__make_request")
     def test_client_get(self, mock_make_request):
         mock_make_request.return_value = {"data": "ok"}
@@ -172,7 +181,6 @@ class TestClient(unittest.TestCase):
         self.assertEqual(mock_poll.call_count, 1)
 
     @patch("tap_branch.client.JOB_TIMEOUT", 10)
-    @patch("tap_branch.client.POLL_INTERVAL", 2)
     @patch("tap_branch.client.time.sleep", return_value=None)
     @patch("tap_branch.client.pendulum.now")
     @patch("tap_branch.client.Client.poll_export_job")
@@ -226,6 +234,52 @@ class TestClient(unittest.TestCase):
 
         self.assertEqual(mock_make_request.call_count, 2)
 
+    @patch("tap_branch.branch_api_contract.BranchExportJobPayload.to_payload", return_value={"key": "value"})
+    @patch("tap_branch.client.Client.make_request", side_effect=[
+        BranchUnsupportedFieldsError(fields=["field1"], raw_response={}),
+        BranchUnsupportedFieldsError(fields=["field2"], raw_response={}),
+        {"handle": "dummy_handle"}
+    ])
+    def test_create_export_job_retries_until_accepted(self, mock_make_request, mock_payload):
+        """ Test that every rejected field is excluded until the export job is accepted, and remembered """
+
+        client = Client(default_config)
+
+        result = client.create_export_job(report_type="dummy_report", api_config=MagicMock())
+
+        self.assertEqual(result, "dummy_handle")
+        self.assertEqual(mock_make_request.call_count, 3)
+        self.assertEqual([c.kwargs["rejected_fields"] for c in mock_payload.call_args_list],
+                         [[], ["field1"], ["field1", "field2"]])
+        self.assertEqual(client.field_compatibility.get_unsupported_fields("dummy_report"), ["field1", "field2"])
+
+    @patch("tap_branch.branch_api_contract.BranchExportJobPayload.to_payload", return_value={"key": "value"})
+    @patch("tap_branch.client.Client.make_request", return_value={"handle": "dummy_handle"})
+    def test_create_export_job_excludes_known_unsupported_fields(self, mock_make_request, mock_payload):
+        """ Test that the fields known as unsupported are excluded from the first request """
+
+        client = Client(default_config)
+        client.field_compatibility.load_state({"unsupported_export_fields": {"dummy_report": ["field1"]}})
+
+        client.create_export_job(report_type="dummy_report", api_config=MagicMock())
+
+        mock_make_request.assert_called_once()
+        mock_payload.assert_called_once_with(rejected_fields=["field1"])
+
+    @patch("tap_branch.client.Client.make_request", return_value={"data_ready": True})
+    def test_check_data_readiness_is_cached_per_report_type_and_date(self, mock_make_request):
+        """ Test that the readiness of a report type and date is only requested once """
+
+        client = Client(default_config)
+
+        for report_type, export_start in [("eo_click", "2024-01-01 00:00:00"), ("eo_click", "2024-01-01 00:00:00"),
+                                          ("eo_click", "2024-01-01 06:00:00"), ("eo_open", "2024-01-01 00:00:00"),
+                                          ("eo_click", "2024-01-02 00:00:00")]:
+            self.assertTrue(client.check_data_readiness(export_start=export_start, report_type=report_type,
+                                                        api_config=MagicMock()))
+
+        self.assertEqual(mock_make_request.call_count, 3)
+
 
 class TestRateLimitWaitGenerator(unittest.TestCase):
     """Test cases for the rate_limit_wait_gen function"""
@@ -334,6 +388,22 @@ class TestRateLimitBackoffBehaviour(unittest.TestCase):
         # Must be called only once — no retry
         self.assertEqual(mock_request.call_count, 1)
 
+    @patch("time.sleep")
+    def test_rate_limit_lowers_endpoint_family_rate(self, mock_sleep):
+        """A rate-limit response of a Branch endpoint must lower the request
+        rate of its endpoint family only."""
+        self.client = Client({**default_config, "rate_limit_requests": True})
+        with patch.object(
+            self.client._session, "request",
+            return_value=self._make_429_response(retry_seconds=1)
+        ):
+            with self.assertRaises(BranchRateLimitError):
+                self.client._Client__make_request("GET", "https://api2.branch.io/v2/logs/handle123/")
+
+        buckets = self.client.rate_limiter.buckets
+        self.assertLess(buckets["logs_poll"].rate, buckets["logs_poll"].max_rate)
+        self.assertEqual(buckets["logs_create"].rate, buckets["logs_create"].max_rate)
+
     def test_branch_rate_limit_error_has_no_code_attribute(self):
         """Regression: BranchRateLimitError must not have a ``.code``
         attribute.  The removed giveup callback silently relied on
@@ -0,0 +1,104 @@
+import io
+import json
+import unittest
+
+from tap_branch.export_pipeline import (LineSkipper, StagedPipeline,
+                                        decompress_lines,
+                                        iter_export_line_batches,
+                                        iter_export_records, read_chunks)
+
+from stream_base import gzip_lines
+
+
+class TestExportPipeline(unittest.TestCase):
+
+    def test_iter_export_records_preserves_order(self):
+        """ Test that the records are yielded in file order across many batches """
+
+        records = [{"id": f"event{index}"} for index in range(5000)]
+        body = gzip_lines(json.dumps(record) + "\n" for record in records)
+
+        self.assertEqual(list(iter_export_records(io.BytesIO(body))), records)
+
+    def test_iter_export_line_batches_preserves_order(self):
+        """ Test that the raw lines are yielded in file order """
+
+        lines = [json.dumps({"id": f"event{index}"}) for index in range(2500)]
+        body = gzip_lines(line + "\n" for line in lines)
+
+        batches = list(iter_export_line_batches(io.BytesIO(body), batch_size=1000))
+
+        self.assertEqual([line.decode("utf-8") for batch in batches for line in batch], lines)
+
+    def test_line_skipper_skips_lines_across_files(self):
+        """ Test that the lines to skip are dropped before decoding, across the files of an export """
+
+        line_skipper = LineSkipper(3)
+        bodies = [gzip_lines(json.dumps({"id": f"{part}-{index}"}) + "\n" for index in range(2)) for part in range(2)]
+
+        records = [record for body in bodies
+                   for record in iter_export_records(io.BytesIO(body), line_skipper=line_skipper)]
+
+        self.assertEqual(records, [{"id": "1-1"}])
+        self.assertEqual(line_skipper.remaining, 0)
+
+    def test_line_skipper_replaces_emitted_lines(self):
+        """ Test that the lines already emitted are kept as None records, without being decoded """
+
+        lines = [json.dumps({"id": f"event{index}"}) for index in range(4)]
+        line_skipper = LineSkipper(emitted_lines={hash(lines[1].encode("utf-8")), hash(lines[3].encode("utf-8"))})
+
+        records = list(iter_export_records(io.BytesIO(gzip_lines(line + "\n" for line in lines)),
+                                           line_skipper=line_skipper))
+
+        self.assertEqual(records, [{"id": "event0"}, None, {"id": "event2"}, None])
+        self.assertTrue(line_skipper.is_emitted(lines[1] + "\n"))
+
+    def test_iter_export_records_skips_malformed_lines(self):
+        """ Test that malformed JSON lines are skipped """
+
+        body = gzip_lines(['{"id": "event1"}\n', '{"id": \n', '{"id": "event2"}'])
+
+        self.assertEqual(list(iter_export_records(io.BytesIO(body))), [{"id": "event1"}, {"id": "event2"}])
+
+    def test_decompress_lines_reads_concatenated_members(self):
+        """ Test that gzip bodies made of several members are fully decompressed """
+
+        body = gzip_lines(['{"id": "event1"}\n']) + gzip_lines(['{"id": "event2"}\n'])
+        batches = decompress_lines(read_chunks(io.BytesIO(body), chunk_size=7))
+
+        self.assertEqual([line for batch in batches for line in batch],
+                         [b'{"id": "event1"}', b'{"id": "event2"}'])
+
+    def test_decompress_lines_raises_for_truncated_body(self):
+        """ Test that a truncated gzip body raises EOFError """
+
+        body = gzip_lines('{"id": "event%s"}\n' % index for index in range(100))
+
+        with self.assertRaises(EOFError):
+            list(decompress_lines(read_chunks(io.BytesIO(body[:len(body) // 2]))))
+
+    def test_pipeline_reraises_stage_error(self):
+        """ Test that an exception raised in a stage is re-raised to the consumer """
+
+        def failing_source():
+            yield 1
+            raise ConnectionResetError("Connection reset")
+
+        pipeline = StagedPipeline()
+        try:
+            with self.assertRaises(ConnectionResetError):
+                list(pipeline.start(failing_source(), lambda items: (item * 2 for item in items)))
+        finally:
+            pipeline.stop()
+
+    def test_pipeline_stops_when_consumer_stops_early(self):
+        """ Test that the stage threads finish when the consumer stops before the end """
+
+        pipeline = StagedPipeline(queue_size=1)
+        items = pipeline.start(iter(range(10000)), lambda items: (item + 1 for item in items))
+
+        self.assertEqual(next(items), 1)
+        pipeline.stop()
+
+        self.assertFalse(any(thread.is_alive() for thread in pipeline._threads))
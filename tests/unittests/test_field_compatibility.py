@@ -0,0 +1,37 @@
+import unittest
+
+from tap_branch.field_compatibility import ExportFieldCompatibility
+
+
+class TestExportFieldCompatibility(unittest.TestCase):
+
+    def test_state_round_trip(self):
+        """ Test that the learned fields are written to the state and loaded back by a later run """
+
+        state = {"bookmarks": {}, "unsupported_export_fields": {"eo_open": ["field3"]}}
+        compatibility = ExportFieldCompatibility()
+        compatibility.load_state(state)
+        compatibility.add_unsupported_fields("eo_click", ["field2", "field1"])
+        compatibility.write_state(state)
+
+        self.assertEqual(state["unsupported_export_fields"], {"eo_click": ["field1", "field2"], "eo_open": ["field3"]})
+
+        next_run = ExportFieldCompatibility()
+        next_run.load_state(state)
+        self.assertEqual(next_run.get_unsupported_fields("eo_click"), ["field1", "field2"])
+
+    def test_add_returns_only_new_fields(self):
+        """ Test that fields already known as unsupported are not reported as new """
+
+        compatibility = ExportFieldCompatibility()
+
+        self.assertEqual(compatibility.add_unsupported_fields("eo_click", ["field1"]), {"field1"})
+        self.assertEqual(compatibility.add_unsupported_fields("eo_click", ["field1", "field2"]), {"field2"})
+        self.assertEqual(compatibility.add_unsupported_fields("eo_click", ["field2"]), set())
+
+    def test_write_state_without_learned_fields(self):
+        """ Test that the state is left untouched when no field was rejected """
+
+        state = {"bookmarks": {}}
+
+        self.assertEqual(ExportFieldCompatibility().write_state(state), {"bookmarks": {}})
@@ -0,0 +1,95 @@
+import io
+import json
+import unittest
+from unittest.mock import patch
+
+import singer
+from parameterized import parameterized
+
+from tap_branch.json_codec import JsonCodec
+from tap_branch.message_writer import BufferedMessageWriter, write_record
+
+
+RECORD = {
+    "id": "1234567890123456789",
+    "timestamp": "2024-01-01T00:00:00.000000Z",
+    "name": "café \U0001F600 \"quoted\"",
+    "count": 12,
+    "revenue": 0.1,
+    "is_first": False,
+    "tags": ["a", None],
+    "custom_data": {"nested": {"value": 1e21}},
+}
+
+
+class TestJsonCodec(unittest.TestCase):
+
+    @parameterized.expand([
+        ["auto", "auto"],
+        ["stdlib", "stdlib"],
+    ])
+    def test_format_record_message_is_byte_identical_to_singer(self, test_name, codec):
+        """ Test that the encoded RECORD message matches singer.write_record byte for byte """
+
+        expected = singer.format_message(singer.RecordMessage(stream="eo_click", record=RECORD))
+
+        self.assertEqual(JsonCodec(codec).format_record_message("eo_click", RECORD), expected)
+
+    def test_orjson_codec_writes_same_values(self):
+        """ Test that the orjson codec writes the same message values in compact form """
+
+        message = JsonCodec("orjson").format_record_message("eo_click", RECORD)
+
+        self.assertEqual(json.loads(message), {"type": "RECORD", "stream": "eo_click", "record": RECORD})
+
+    def test_format_record_message_falls_back_to_singer_for_decimals(self):
+        """ Test that values outside of the JSON types are encoded the way singer does """
+
+        import decimal
+        record = {"id": "1", "amount": decimal.Decimal("1.10")}
+
+        self.assertEqual(JsonCodec().format_record_message("eo_click", record),
+                         singer.format_message(singer.RecordMessage(stream="eo_click", record=record)))
+
+    @parameterized.expand([
+        ["auto", "auto"],
+        ["orjson", "orjson"],
+        ["stdlib", "stdlib"],
+    ])
+    def test_loads(self, test_name, codec):
+        """ Test that every codec decodes the same values and raises ValueError for malformed lines """
+
+        json_codec = JsonCodec(codec)
+
+        self.assertEqual(json_codec.loads(json.dumps(RECORD).encode("utf-8")), RECORD)
+        with self.assertRaises(ValueError):
+            json_codec.loads(b'{"id": ')
+
+    @patch("tap_branch.json_codec.orjson", None)
+    def test_codec_falls_back_without_orjson(self):
+        """ Test that the stdlib is used when orjson is not installed """
+
+        json_codec = JsonCodec("orjson")
+
+        self.assertFalse(json_codec.decodes_with_orjson)
+        self.assertFalse(json_codec.encodes_with_orjson)
+        self.assertEqual(json_codec.loads('{"id": "1"}'), {"id": "1"})
+
+    def test_unsupported_codec_raises(self):
+        """ Test that an unknown codec in the config is rejected """
+
+        with self.assertRaises(ValueError):
+            JsonCodec.from_config({"json_codec": "ujson"})
+
+    @parameterized.expand([
+        ["auto", "auto", '{"type": "RECORD", "stream": "eo_click", "record": {"id": "1"}}\n'],
+        ["orjson", "orjson", '{"type":"RECORD","stream":"eo_click","record":{"id":"1"}}\n'],
+    ])
+    def test_write_record(self, test_name, codec, expected_output):
+        """ Test that the RECORD message is written with the codec as a single line on stdout """
+
+        with patch("tap_branch.message_writer._message_writer", BufferedMessageWriter(max_bytes=0)), \
+                patch("sys.stdout", new_callable=io.StringIO) as mock_stdout:
+            write_record("eo_click", {"id": "1"}, codec=JsonCodec(codec))
+
+        self.assertEqual(mock_stdout.getvalue(), expected_output)
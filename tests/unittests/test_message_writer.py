@@ -0,0 +1,76 @@
+import io
+import json
+import unittest
+from unittest.mock import patch
+
+import singer
+
+from tap_branch import message_writer
+from tap_branch.message_writer import (BufferedMessageWriter,
+                                       configure_message_writer, write_record,
+                                       write_schema, write_state)
+
+
+def read_messages(stdout):
+    return [json.loads(line) for line in stdout.getvalue().splitlines()]
+
+
+class TestBufferedMessageWriter(unittest.TestCase):
+
+    def tearDown(self):
+        message_writer._message_writer = BufferedMessageWriter()
+
+    def test_records_are_written_in_chunks(self):
+        """ Test that the records are only written once the buffer is full """
+
+        writer = BufferedMessageWriter(max_bytes=150, flush_interval=60)
+        with patch("sys.stdout", new_callable=io.StringIO) as mock_stdout:
+            writer.write_record("eo_click", {"id": "1"})
+            writer.write_record("eo_click", {"id": "2"})
+            self.assertEqual(mock_stdout.getvalue(), "")
+
+            writer.write_record("eo_click", {"id": "3"})
+            self.assertEqual([message["record"]["id"] for message in read_messages(mock_stdout)], ["1", "2", "3"])
+
+    @patch("tap_branch.message_writer.time.monotonic")
+    def test_records_are_written_after_flush_interval(self, mock_monotonic):
+        mock_monotonic.return_value = 0
+        writer = BufferedMessageWriter(max_bytes=1024 * 1024, flush_interval=1)
+        with patch("sys.stdout", new_callable=io.StringIO) as mock_stdout:
+            writer.write_record("eo_click", {"id": "1"})
+            self.assertEqual(mock_stdout.getvalue(), "")
+
+            mock_monotonic.return_value = 2
+            writer.write_record("eo_click", {"id": "2"})
+            self.assertEqual(len(read_messages(mock_stdout)), 2)
+
+    def test_unbuffered_output_matches_singer(self):
+        """ Test that a buffer of 0 writes every record like singer.write_record """
+
+        writer = BufferedMessageWriter(max_bytes=0)
+        with patch("sys.stdout", new_callable=io.StringIO) as mock_stdout:
+            writer.write_record("eo_click", {"id": "1", "name": "café"})
+            output = mock_stdout.getvalue()
+
+        with patch("sys.stdout", new_callable=io.StringIO) as mock_stdout:
+            singer.write_record("eo_click", {"id": "1", "name": "café"})
+
+        self.assertEqual(output, mock_stdout.getvalue())
+
+    def test_state_and_schema_are_written_after_buffered_records(self):
+        """ Test that the messages keep their order, with the state after the records """
+
+        with patch("sys.stdout", new_callable=io.StringIO) as mock_stdout:
+            configure_message_writer({"output_buffer_bytes": 1024 * 1024, "output_flush_interval": 60})
+            write_record("eo_click", {"id": "1"})
+            write_state({"bookmarks": {"eo_click": {"timestamp": "2024-01-01T00:00:00Z"}}})
+            write_record("eo_click", {"id": "2"})
+            write_schema("eo_open", {"type": "object"}, ["id"])
+
+        self.assertEqual([message["type"] for message in read_messages(mock_stdout)],
+                         ["RECORD", "STATE", "RECORD", "SCHEMA"])
+
+    def test_from_config(self):
+        writer = BufferedMessageWriter.from_config({"output_buffer_bytes": "0", "output_flush_interval": "0.5"})
+
+        self.assertEqual((writer.max_bytes, writer.flush_interval), (0, 0.5))
@@ -0,0 +1,89 @@
+import unittest
+from unittest.mock import patch
+
+import pendulum
+
+from tap_branch.pending_jobs import PENDING_EXPORT_JOBS_KEY, PendingExportJobs
+
+WINDOW_START = pendulum.datetime(2024, 1, 1, tz="UTC")
+WINDOW_END = pendulum.datetime(2024, 1, 31, tz="UTC")
+FIELDS = ["id", "timestamp"]
+
+
+class TestPendingExportJobs(unittest.TestCase):
+
+    @patch("singer.write_state")
+    def test_created_job_is_written_to_state_and_found_by_next_run(self, mock_write_state):
+        """ Test that a created job is written to the state right away, and found again after a restart """
+
+        state = {"bookmarks": {}}
+        pending_jobs = PendingExportJobs()
+        pending_jobs.load_state(state)
+        pending_jobs.add("eo_click", "handle1", WINDOW_START, WINDOW_END, FIELDS)
+
+        mock_write_state.assert_called_once_with(state)
+        self.assertEqual(state[PENDING_EXPORT_JOBS_KEY]["eo_click"][0]["request_handle"], "handle1")
+
+        next_run = PendingExportJobs()
+        next_run.load_state(state)
+        pending_job = next_run.find("eo_click", WINDOW_START, list(reversed(FIELDS)))
+        self.assertEqual(pending_job.request_handle, "handle1")
+        self.assertEqual(pending_job.window_end, WINDOW_END.to_iso8601_string())
+
+    @patch("singer.write_state")
+    def test_find_requires_same_window_start_and_fields(self, mock_write_state):
+        pending_jobs = PendingExportJobs()
+        pending_jobs.add("eo_click", "handle1", WINDOW_START, WINDOW_END, FIELDS)
+
+        self.assertIsNone(pending_jobs.find("eo_open", WINDOW_START, FIELDS))
+        self.assertIsNone(pending_jobs.find("eo_click", WINDOW_START.add(days=1), FIELDS))
+        self.assertIsNone(pending_jobs.find("eo_click", WINDOW_START, ["id"]))
+
+    @patch("singer.write_state")
+    def test_expired_jobs_are_dropped(self, mock_write_state):
+        """ Test that jobs older than the job timeout are not re-attached """
+
+        state = {}
+        with patch("pendulum.now", return_value=pendulum.datetime(2024, 2, 1, tz="UTC")):
+            pending_jobs = PendingExportJobs(job_timeout=3600)
+            pending_jobs.load_state(state)
+            pending_jobs.add("eo_click", "handle1", WINDOW_START, WINDOW_END, FIELDS)
+
+        with patch("pendulum.now", return_value=pendulum.datetime(2024, 2, 1, 2, tz="UTC")):
+            next_run = PendingExportJobs(job_timeout=3600)
+            next_run.load_state(state)
+
+        self.assertIsNone(next_run.find("eo_click", WINDOW_START, FIELDS))
+        self.assertNotIn(PENDING_EXPORT_JOBS_KEY, state)
+
+    @patch("singer.write_state")
+    def test_checkpointed_jobs_do_not_expire(self, mock_write_state):
+        """ Test that a job whose export was still being read within the job timeout is re-attached """
+
+        state = {}
+        with patch("pendulum.now", return_value=pendulum.datetime(2024, 2, 1, tz="UTC")):
+            pending_jobs = PendingExportJobs(job_timeout=3600)
+            pending_jobs.load_state(state)
+            pending_jobs.add("eo_click", "handle1", WINDOW_START, WINDOW_END, FIELDS)
+
+        with patch("pendulum.now", return_value=pendulum.datetime(2024, 2, 1, 1, 30, tz="UTC")):
+            pending_jobs.touch("eo_click", WINDOW_START)
+
+        with patch("pendulum.now", return_value=pendulum.datetime(2024, 2, 1, 2, tz="UTC")):
+            next_run = PendingExportJobs(job_timeout=3600)
+            next_run.load_state(state)
+
+        self.assertEqual(next_run.find("eo_click", WINDOW_START, FIELDS).request_handle, "handle1")
+
+    @patch("singer.write_state")
+    def test_discard_removes_job_from_state(self, mock_write_state):
+        state = {}
+        pending_jobs = PendingExportJobs()
+        pending_jobs.load_state(state)
+        pending_jobs.add("eo_click", "handle1", WINDOW_START, WINDOW_END, FIELDS)
+        pending_jobs.add("eo_open", "handle2", WINDOW_START, WINDOW_END, FIELDS)
+
+        pending_jobs.discard("eo_click", WINDOW_START)
+
+        self.assertIsNone(pending_jobs.find("eo_click", WINDOW_START, FIELDS))
+        self.assertEqual(list(state[PENDING_EXPORT_JOBS_KEY]), ["eo_open"])
@@ -0,0 +1,76 @@
+import unittest
+
+from parameterized import parameterized
+
+from tap_branch.branch_constants import (DEFAULT_POLL_INITIAL_INTERVAL,
+                                         POLL_INTERVAL)
+from tap_branch.polling import AdaptivePollSchedule, get_progress_hint
+
+
+class TestAdaptivePollSchedule(unittest.TestCase):
+
+    def setUp(self):
+        self.schedule = AdaptivePollSchedule(initial_interval=5, max_interval=120, backoff_factor=2)
+
+    @parameterized.expand([
+        ["first poll", 0, 5],
+        ["second poll", 1, 10],
+        ["fourth poll", 3, 40],
+        ["capped poll", 10, 120],
+    ])
+    def test_next_interval_backs_off_geometrically(self, test_name, attempt, expected_interval):
+        """ Test that the wait grows geometrically up to the cap without any history or hint """
+
+        self.assertEqual(self.schedule.next_interval("eo_click", 0, attempt), expected_interval)
+
+    def test_next_interval_uses_report_type_history(self):
+        """ Test that the first wait targets the completion time observed for earlier jobs """
+
+        self.schedule.record_duration("eo_click", 60)
+
+        self.assertEqual(self.schedule.next_interval("eo_click", 10, 0), 50)
+        # Other report types are not affected by the history
+        self.assertEqual(self.schedule.next_interval("eo_install", 10, 0), 5)
+
+    def test_next_interval_ignores_history_for_queued_job(self):
+        """ Test that a job still waiting in Branch's queue falls back to the back-off """
+
+        self.schedule.record_duration("eo_click", 60)
+
+        self.assertEqual(self.schedule.next_interval("eo_click", 10, 0, {"status": "pending"}), 5)
+
+    def test_next_interval_uses_progress_hint(self):
+        """ Test that the remaining time is estimated from the progress of the job """
+
+        self.assertEqual(self.schedule.next_interval("eo_click", 30, 2, {"progress": 50}), 30)
+
+    def test_record_duration_smooths_history(self):
+        """ Test that the expected duration is a moving average of the observed durations """
+
+        self.schedule.record_duration("eo_click", 60)
+        self.schedule.record_duration("eo_click", 20)
+
+        self.assertEqual(self.schedule.expected_duration("eo_click"), 40)
+
+    def test_from_config(self):
+        """ Test that the schedule is configurable and defaults to the constants """
+
+        schedule = AdaptivePollSchedule.from_config({"poll_initial_interval": "1", "poll_max_interval": 30,
+                                                     "poll_backoff_factor": 3})
+        self.assertEqual((schedule.initial_interval, schedule.max_interval, schedule.backoff_factor), (1, 30, 3))
+
+        schedule = AdaptivePollSchedule.from_config({})
+        self.assertEqual((schedule.initial_interval, schedule.max_interval),
+                         (DEFAULT_POLL_INITIAL_INTERVAL, POLL_INTERVAL))
+
+    @parameterized.expand([
+        ["ratio", {"progress": 0.25}, 0.25],
+        ["percentage", {"percent_complete": "75"}, 0.75],
+        ["no hint", {"status": "running"}, None],
+        ["invalid hint", {"progress": "unknown"}, None],
+        ["complete", {"progress": 100}, None],
+    ])
+    def test_get_progress_hint(self, test_name, job_response, expected_progress):
+        """ Test that progress hints are read as ratios """
+
+        self.assertEqual(get_progress_hint(job_response), expected_progress)
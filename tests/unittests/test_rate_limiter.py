@@ -0,0 +1,123 @@
+import threading
+import unittest
+from unittest.mock import patch
+
+from parameterized import parameterized
+
+from tap_branch.rate_limiter import (DATA_READY_FAMILY, LOGS_CREATE_FAMILY,
+                                     LOGS_POLL_FAMILY, RateLimiter,
+                                     TokenBucket, get_endpoint_family)
+
+
+class FakeClock:
+    """ Monotonic clock advanced by the sleeps of the rate limiter """
+
+    def __init__(self):
+        self.now = 1000.0
+        self.lock = threading.Lock()
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        with self.lock:
+            self.now += seconds
+
+
+class TestGetEndpointFamily(unittest.TestCase):
+
+    @parameterized.expand([
+        ["data ready", "POST", "https://api2.branch.io/v2/data/ready/", DATA_READY_FAMILY],
+        ["create export job", "POST", "https://api2.branch.io/v2/logs/", LOGS_CREATE_FAMILY],
+        ["poll export job", "GET", "https://api2.branch.io/v2/logs/handle123/", LOGS_POLL_FAMILY],
+        ["poll with query params", "GET", "https://api2.branch.io/v2/logs/handle123?app_id=1", LOGS_POLL_FAMILY],
+        ["other endpoint", "GET", "https://api.example.com/resource", None],
+    ])
+    def test_get_endpoint_family(self, test_name, method, endpoint, expected_family):
+        self.assertEqual(get_endpoint_family(method, endpoint), expected_family)
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher_monotonic = patch("tap_branch.rate_limiter.time.monotonic", side_effect=self.clock.monotonic)
+        patcher_sleep = patch("tap_branch.rate_limiter.time.sleep", side_effect=self.clock.sleep)
+        patcher_monotonic.start()
+        self.mock_sleep = patcher_sleep.start()
+        self.addCleanup(patcher_monotonic.stop)
+        self.addCleanup(patcher_sleep.stop)
+
+    def test_burst_then_budget_rate(self):
+        """ Test that requests beyond the burst are spaced out at the budget rate """
+
+        bucket = TokenBucket(requests_per_minute=60, burst=2)
+        waits = [bucket.acquire() for _ in range(4)]
+
+        self.assertEqual(waits, [0.0, 0.0, 1.0, 1.0])
+
+    def test_rate_limit_pauses_and_slows_down(self):
+        """ Test that a rate limit response pauses the bucket for the retry time and halves the rate """
+
+        bucket = TokenBucket(requests_per_minute=60, burst=1)
+        bucket.acquire()
+        bucket.record_rate_limit(retry_seconds=10)
+
+        self.assertEqual(bucket.rate, 0.5)
+        self.assertEqual(bucket.acquire(), 12.0)
+
+    def test_rate_recovers_after_successes(self):
+        """ Test that successful requests bring the rate back to the budget """
+
+        bucket = TokenBucket(requests_per_minute=60)
+        bucket.record_rate_limit()
+        for _ in range(20):
+            bucket.record_success()
+
+        self.assertEqual(bucket.rate, bucket.max_rate)
+
+    def test_concurrent_callers_share_the_budget(self):
+        """ Test that the requests of concurrent threads are spaced out without sharing a token """
+
+        # Threads reserve their token up front, so the waits are spaced out even if no time passes
+        self.mock_sleep.side_effect = None
+        bucket = TokenBucket(requests_per_minute=60, burst=1)
+        waits = []
+        threads = [threading.Thread(target=lambda: waits.append(bucket.acquire())) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(waits), [0.0, 1.0, 2.0, 3.0, 4.0])
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_from_config_budgets(self):
+        """ Test that configured budgets replace the defaults, and a budget of 0 disables the limit """
+
+        limiter = RateLimiter.from_config({"rate_limit_requests": "true", "rate_limit_logs_poll_per_minute": "120",
+                                           "rate_limit_data_ready_per_minute": 0})
+
+        self.assertEqual(limiter.buckets[LOGS_POLL_FAMILY].max_rate, 2)
+        self.assertIn(LOGS_CREATE_FAMILY, limiter.buckets)
+        self.assertNotIn(DATA_READY_FAMILY, limiter.buckets)
+
+    @parameterized.expand([
+        ["not configured", {"rate_limit_logs_poll_per_minute": "120"}],
+        ["disabled", {"rate_limit_requests": False}],
+    ])
+    def test_from_config_disabled_by_default(self, test_name, config):
+        """ Test that no request is limited unless the rate limiting is enabled """
+
+        self.assertEqual(RateLimiter.from_config(config).buckets, {})
+
+    @patch("tap_branch.rate_limiter.time.sleep")
+    def test_unlimited_family_does_not_wait(self, mock_sleep):
+        limiter = RateLimiter({LOGS_POLL_FAMILY: 1})
+
+        for _ in range(3):
+            self.assertEqual(limiter.acquire(None), 0.0)
+
+        mock_sleep.assert_not_called()
@@ -0,0 +1,158 @@
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+import pendulum
+
+from tap_branch.exceptions import BranchExportFailed
+from tap_branch.polling import AdaptivePollSchedule
+from tap_branch.scheduler import ExportJobScheduler
+
+
+def build_mock_stream(tap_stream_id, windows, data_ready=True):
+    """ Build a mocked branch event stream exporting the given windows """
+
+    stream = MagicMock()
+    stream.tap_stream_id = tap_stream_id
+    stream.is_data_ready.return_value = data_ready
+    stream.generate_windows.return_value = iter(windows)
+    stream.get_spooled_export.return_value = None
+    stream.submit_export_job.side_effect = lambda start, end: f"{tap_stream_id}_{start.day}"
+    stream.get_poll_export_api_config.side_effect = lambda handle: handle
+    stream.process_export.side_effect = lambda state, transformer, response, start, end, counter: state
+    return stream
+
+
+class TestExportJobScheduler(unittest.TestCase):
+
+    def setUp(self):
+        start = pendulum.datetime(2024, 1, 1, tz="UTC")
+        self.windows = [(start, start.add(days=10)), (start.add(days=10), start.add(days=20))]
+        self.client = MagicMock()
+        self.client.poll_export_job.side_effect = lambda api_config: ("complete", {"response_url": api_config})
+        self.poll_schedule = AdaptivePollSchedule(initial_interval=0, max_interval=0)
+
+    @patch("singer.write_state")
+    def test_sync_processes_every_window_of_every_stream(self, mock_write_state):
+        """ Test that every window of every stream is exported and processed in window order """
+
+        click_stream = build_mock_stream("eo_click", self.windows)
+        install_stream = build_mock_stream("eo_install", self.windows)
+
+        scheduler = ExportJobScheduler(self.client, max_concurrent_jobs=2, poll_schedule=self.poll_schedule)
+        total_records = scheduler.sync([click_stream, install_stream], {}, MagicMock())
+
+        self.assertEqual(set(total_records), {"eo_click", "eo_install"})
+        for stream in (click_stream, install_stream):
+            self.assertEqual(stream.submit_export_job.call_count, 2)
+            processed_windows = [call.args[3] for call in stream.process_export.call_args_list]
+            self.assertEqual(processed_windows, [window[0] for window in self.windows])
+
+    @patch("singer.write_state")
+    def test_sync_sets_currently_syncing_per_stream(self, mock_write_state):
+        """ Test that the stream of every processed export is written as the currently syncing one first """
+
+        click_stream = build_mock_stream("eo_click", self.windows)
+        install_stream = build_mock_stream("eo_install", self.windows)
+        currently_syncing = []
+        for stream in (click_stream, install_stream):
+            stream.process_export.side_effect = lambda state, *args, stream=stream: currently_syncing.append(
+                (stream.tap_stream_id, state["currently_syncing"])) or state
+
+        scheduler = ExportJobScheduler(self.client, max_concurrent_jobs=2, poll_schedule=self.poll_schedule)
+        scheduler.sync([click_stream, install_stream], {}, MagicMock())
+
+        self.assertEqual(len(currently_syncing), 4)
+        self.assertTrue(all(stream_name == syncing for stream_name, syncing in currently_syncing))
+        self.assertTrue(all(call.args[0]["currently_syncing"] for call in mock_write_state.call_args_list))
+
+    def test_sync_polls_new_jobs_right_away(self):
+        """ Test that a submitted job is polled without waiting for the initial poll interval """
+
+        stream = build_mock_stream("eo_click", self.windows)
+        scheduler = ExportJobScheduler(self.client, max_concurrent_jobs=1,
+                                       poll_schedule=AdaptivePollSchedule(initial_interval=5, max_interval=5))
+
+        started = time.monotonic()
+        scheduler.sync([stream], {}, MagicMock())
+
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(stream.process_export.call_count, 2)
+
+    def test_sync_respects_concurrency_limit(self):
+        """ Test that no more than max_concurrent_jobs jobs are in flight at the same time """
+
+        streams = [build_mock_stream(name, self.windows) for name in ("eo_click", "eo_install", "eo_open")]
+        scheduler = ExportJobScheduler(self.client, max_concurrent_jobs=2, poll_schedule=self.poll_schedule)
+
+        max_in_flight = []
+        original_submit = scheduler._submit
+
+        def submit(stream_export):
+            submitted = original_submit(stream_export)
+            max_in_flight.append(len(scheduler._in_flight))
+            return submitted
+
+        with patch.object(scheduler, "_submit", side_effect=submit):
+            scheduler.sync(streams, {}, MagicMock())
+
+        self.assertLessEqual(max(max_in_flight), 2)
+        for stream in streams:
+            self.assertEqual(stream.process_export.call_count, 2)
+
+    def test_sync_skips_streams_without_ready_data(self):
+        """ Test that streams whose data is not ready are skipped without blocking the others """
+
+        ready_stream = build_mock_stream("eo_click", self.windows)
+        not_ready_stream = build_mock_stream("eo_install", self.windows, data_ready=False)
+
+        scheduler = ExportJobScheduler(self.client, max_concurrent_jobs=2, poll_schedule=self.poll_schedule)
+        total_records = scheduler.sync([ready_stream, not_ready_stream], {}, MagicMock())
+
+        self.assertEqual(total_records["eo_install"], 0)
+        not_ready_stream.submit_export_job.assert_not_called()
+        self.assertEqual(ready_stream.process_export.call_count, 2)
+
+    def test_sync_raises_failed_export(self):
+        """ Test that a failed export job stops the sync """
+
+        self.client.poll_export_job.side_effect = lambda api_config: ("fail", {"status": "fail"})
+        stream = build_mock_stream("eo_click", self.windows)
+
+        scheduler = ExportJobScheduler(self.client, max_concurrent_jobs=2, poll_schedule=self.poll_schedule)
+        with self.assertRaises(BranchExportFailed):
+            scheduler.sync([stream], {}, MagicMock())
+
+        stream.process_export.assert_not_called()
+        # The failed job is dropped from the state right away, no bookmark follows it
+        self.client.pending_export_jobs.discard.assert_called_once()
+        report_type, window_start = self.client.pending_export_jobs.discard.call_args.args
+        self.assertEqual(report_type, "eo_click")
+        self.assertIn(window_start, [start for start, _ in self.windows])
+        self.assertTrue(self.client.pending_export_jobs.discard.call_args.kwargs["persist"])
+
+    def test_sync_with_lookahead_processes_windows_in_order(self):
+        """ Test that look-ahead windows completing first are only processed after the earlier windows """
+
+        start = pendulum.datetime(2024, 1, 1, tz="UTC")
+        windows = [(start.add(days=10 * index), start.add(days=10 * (index + 1))) for index in range(4)]
+        stream = build_mock_stream("eo_click", windows)
+
+        # The first window of the stream is the slowest one to complete
+        poll_counts = {}
+
+        def poll_export_job(api_config):
+            poll_counts[api_config] = poll_counts.get(api_config, 0) + 1
+            if api_config == "eo_click_1" and poll_counts[api_config] < 3:
+                return "pending", {"status": "pending"}
+            return "complete", {"response_url": api_config}
+
+        self.client.poll_export_job.side_effect = poll_export_job
+
+        scheduler = ExportJobScheduler(self.client, max_concurrent_jobs=3, lookahead=2, poll_schedule=self.poll_schedule)
+        scheduler.sync([stream], {}, MagicMock())
+
+        processed_windows = [call.args[3] for call in stream.process_export.call_args_list]
+        self.assertEqual(processed_windows, [window[0] for window in windows])
+        # The look-ahead jobs are created before the first window completes
+        self.assertGreaterEqual(poll_counts["eo_click_1"], 3)
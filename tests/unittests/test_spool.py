@@ -0,0 +1,139 @@
+import io
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+import pendulum
+
+from tap_branch.spool import SPOOLED_EXPORT_KEY, ExportSpool
+
+from stream_base import build_identity_transformer, build_stream, gzip_records
+
+
+class TestExportSpool(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.spool = ExportSpool(self.temp_dir.name, max_bytes=1024)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_key_depends_on_window_and_fields(self):
+        """ Test that the key identifies the report type, window and field set, whatever the field order """
+
+        key = ExportSpool.build_key("eo_click", "2024-01-01", "2024-01-02", ["id", "timestamp"])
+
+        self.assertEqual(key, ExportSpool.build_key("eo_click", "2024-01-01", "2024-01-02", ["timestamp", "id"]))
+        self.assertNotEqual(key, ExportSpool.build_key("eo_open", "2024-01-01", "2024-01-02", ["id", "timestamp"]))
+        self.assertNotEqual(key, ExportSpool.build_key("eo_click", "2024-01-01", "2024-01-03", ["id", "timestamp"]))
+        self.assertNotEqual(key, ExportSpool.build_key("eo_click", "2024-01-01", "2024-01-02", ["id"]))
+
+    def test_write_concatenates_bodies_and_reads_back(self):
+        """ Test that the bodies of the export files are stored in order and read back through mmap """
+
+        self.spool.write("key", [io.BytesIO(b"part1-"), io.BytesIO(b"part2")])
+
+        self.assertTrue(self.spool.contains("key"))
+        with self.spool.open("key") as body:
+            self.assertEqual(body.read(), b"part1-part2")
+
+    def test_failed_write_leaves_no_entry(self):
+        """ Test that a download failing halfway does not leave a partial entry """
+
+        def bodies():
+            yield io.BytesIO(b"part1")
+            raise ConnectionError("broken")
+
+        with self.assertRaises(ConnectionError):
+            self.spool.write("key", bodies())
+
+        self.assertFalse(self.spool.contains("key"))
+        self.assertEqual(os.listdir(self.temp_dir.name), [])
+
+    def test_least_recently_used_entries_are_evicted(self):
+        """ Test that the least recently used entries are evicted once the spool exceeds its size """
+
+        self.spool.write("first", [io.BytesIO(b"x" * 400)])
+        self.spool.write("second", [io.BytesIO(b"x" * 400)])
+        os.utime(self.spool.get_path("first"), (1, 1))
+        os.utime(self.spool.get_path("second"), (2, 2))
+
+        # Reading the first entry makes the second one the least recently used
+        with self.spool.open("first"):
+            pass
+        self.spool.write("third", [io.BytesIO(b"x" * 400)])
+
+        self.assertTrue(self.spool.contains("first"))
+        self.assertFalse(self.spool.contains("second"))
+        self.assertTrue(self.spool.contains("third"))
+
+    def test_from_config(self):
+        self.assertIsNone(ExportSpool.from_config({}))
+        spool = ExportSpool.from_config({"export_spool_dir": self.temp_dir.name, "export_spool_max_bytes": "2048"})
+        self.assertEqual(spool.max_bytes, 2048)
+
+
+class TestStreamExportSpool(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.stream = build_stream({"export_spool_dir": self.temp_dir.name, "branch_access_token": "token",
+                                    "branch_app_id": "app", "export_lookahead": 0})
+        self.stream.start_export({})
+        self.window = (pendulum.datetime(2024, 1, 1, tz="UTC"), pendulum.datetime(2024, 1, 2, tz="UTC"))
+        self.records = [{"id": "1", "timestamp": "2024-01-01T10:00:00.000000Z"},
+                        {"id": "2", "timestamp": "2024-01-01T11:00:00.000000Z"}]
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def process_export(self, export_job_response):
+        with patch("singer.write_state"), patch("tap_branch.streams.branch_events.write_record") as mock_write_record:
+            self.stream.process_export({}, build_identity_transformer(), export_job_response, *self.window, MagicMock())
+        return [call.args[1] for call in mock_write_record.call_args_list]
+
+    @patch("tap_branch.streams.branch_events.BranchEventsBaseStream._fetch_export_data")
+    def test_completed_export_is_spooled_and_replayed(self, mock_fetch):
+        """ Test that a completed export is emitted from the spool, and replayed later without downloading """
+
+        response = MagicMock()
+        response.raw = io.BytesIO(gzip_records(self.records))
+        mock_fetch.return_value = response
+
+        self.assertIsNone(self.stream.get_spooled_export(*self.window))
+        self.assertEqual(self.process_export({"response_url": "https://test.url/data.gz"}), self.records)
+
+        spooled_export = self.stream.get_spooled_export(*self.window)
+        self.assertIn(SPOOLED_EXPORT_KEY, spooled_export)
+        self.assertEqual(self.process_export(spooled_export), self.records)
+        mock_fetch.assert_called_once()
+
+    @patch("tap_branch.streams.branch_events.BranchEventsBaseStream._fetch_export_data")
+    def test_multiple_files_are_spooled_in_order(self, mock_fetch):
+        """ Test that the files of a split export are stored as one multi-member gzip file """
+
+        parts = {"https://test.url/1.gz": self.records[:1], "https://test.url/2.gz": self.records[1:]}
+
+        def fetch(url):
+            response = MagicMock()
+            response.raw = io.BytesIO(gzip_records(parts[url]))
+            response.__enter__.return_value = response
+            return response
+
+        mock_fetch.side_effect = fetch
+
+        self.assertEqual(self.process_export({"response_urls": list(parts)}), self.records)
+
+    def test_sync_replays_spooled_export_without_export_job(self):
+        """ Test that spooled windows do not create export jobs """
+
+        self.stream.export_spool.write(self.stream.get_spool_key(*self.window), [io.BytesIO(gzip_records(self.records))])
+        self.stream.client.check_data_readiness.return_value = True
+        self.stream.generate_windows = MagicMock(return_value=iter([self.window]))
+
+        with patch("singer.write_state"), patch("tap_branch.streams.branch_events.write_record"):
+            self.assertEqual(self.stream.sync({}, build_identity_transformer()), 2)
+
+        self.stream.client.create_export_job.assert_not_called()
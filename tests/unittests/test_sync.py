@@ -1,8 +1,18 @@
+import threading
 import unittest
 from unittest.mock import MagicMock, patch
 
 from tap_branch.exceptions import BranchFatalRateLimitError
-from tap_branch.sync import sync, update_currently_syncing, write_schema
+from tap_branch.streams import BranchEventsBaseStream
+from tap_branch.sync import (check_data_readiness, sync,
+                             update_currently_syncing, write_schema)
+
+
+def build_mock_client(data_ready=True):
+    client = MagicMock()
+    client.config = {"start_date": "2024-01-01T00:00:00Z", "branch_access_token": "token", "branch_app_id": "app"}
+    client.check_data_readiness.return_value = data_ready
+    return client
 
 
 class TestSync(unittest.TestCase):
@@ -40,7 +50,7 @@ class TestSync(unittest.TestCase):
         ]
         state = {}
 
-        client = MagicMock()
+        client = build_mock_client()
         config = {}
 
         sync(client, config, mock_catalog, state)
@@ -88,7 +98,7 @@ class TestSync(unittest.TestCase):
         ]
         state = {}
 
-        client = MagicMock()
+        client = build_mock_client()
         config = {}
 
         with patch("tap_branch.streams.BranchEventsBaseStream.sync", side_effect=BranchFatalRateLimitError("Rate limit exceeded")):
@@ -96,3 +106,75 @@ class TestSync(unittest.TestCase):
                 sync(client, config, mock_catalog, state)
 
             self.assertEqual("Rate limit exceeded", str(context.exception))
+
+    @patch("singer.write_schema")
+    @patch("singer.write_state")
+    @patch("tap_branch.sync.ExportJobScheduler")
+    @patch("tap_branch.streams.BranchEventsBaseStream.sync")
+    def test_sync_uses_scheduler_for_concurrent_export_jobs(self, mock_sync, mock_scheduler, mock_write_state, mock_write_schema):
+        mock_catalog = MagicMock()
+        click_stream = MagicMock()
+        click_stream.stream = "eo_click"
+        install_stream = MagicMock()
+        install_stream.stream = "eo_install"
+
+        mock_catalog.get_selected_streams.return_value = [
+            click_stream,
+            install_stream
+        ]
+        mock_scheduler.return_value.sync.return_value = {"eo_click": 1, "eo_install": 2}
+
+        sync(build_mock_client(), {"max_concurrent_export_jobs": 4}, mock_catalog, {})
+
+        mock_sync.assert_not_called()
+        mock_scheduler.assert_called_once()
+        self.assertEqual(mock_scheduler.call_args[0][1], 4)
+        synced_streams = mock_scheduler.return_value.sync.call_args[0][0]
+        self.assertEqual([stream.tap_stream_id for stream in synced_streams], ["eo_click", "eo_install"])
+
+    @patch("singer.write_schema")
+    @patch("singer.write_state")
+    @patch("tap_branch.streams.BranchEventsBaseStream.sync")
+    def test_sync_skips_report_types_without_ready_data(self, mock_sync, mock_write_state, mock_write_schema):
+        mock_catalog = MagicMock()
+        click_stream = MagicMock()
+        click_stream.stream = "eo_click"
+        install_stream = MagicMock()
+        install_stream.stream = "eo_install"
+        mock_catalog.get_selected_streams.return_value = [click_stream, install_stream]
+
+        client = build_mock_client()
+        client.check_data_readiness.side_effect = lambda export_start, report_type, api_config: report_type == "eo_install"
+
+        sync(client, {}, mock_catalog, {})
+
+        self.assertEqual(mock_sync.call_count, 1)
+        self.assertEqual(client.check_data_readiness.call_count, 2)
+
+    def test_check_data_readiness_of_every_report_type(self):
+        mock_catalog = MagicMock()
+        client = build_mock_client()
+        client.check_data_readiness.side_effect = lambda export_start, report_type, api_config: report_type != "eo_open"
+
+        readiness = check_data_readiness(client, mock_catalog, {}, ["eo_click", "eo_open", "eo_install"], max_workers=3)
+
+        self.assertEqual(readiness, {"eo_click": True, "eo_open": False, "eo_install": True})
+        self.assertEqual({call[1]["export_start"] for call in client.check_data_readiness.call_args_list},
+                         {"2024-01-01 00:00:00"})
+
+    def test_check_data_readiness_starts_exports_on_the_main_thread(self):
+        """ Test that only the readiness requests run in the pool, the export starts are read from the state first """
+        mock_catalog = MagicMock()
+        client = build_mock_client()
+        start_threads = []
+        original_start_export = BranchEventsBaseStream.start_export
+
+        def start_export(stream, state):
+            start_threads.append(threading.current_thread())
+            return original_start_export(stream, state)
+
+        with patch.object(BranchEventsBaseStream, "start_export", autospec=True, side_effect=start_export):
+            check_data_readiness(client, mock_catalog, {}, ["eo_click", "eo_open", "eo_install"], max_workers=3)
+
+        self.assertEqual(start_threads, [threading.main_thread()] * 3)
+        self.assertEqual(client.check_data_readiness.call_count, 3)
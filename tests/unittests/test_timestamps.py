@@ -0,0 +1,77 @@
+import unittest
+from unittest.mock import patch
+
+import pendulum
+from parameterized import parameterized
+
+from tap_branch.timestamps import BookmarkTracker, get_sort_key
+
+
+def reference_bookmarks(initial_bookmark, values):
+    """ Bookmark handling with a pendulum.parse per record, to compare the fast path with """
+
+    max_bookmark = initial_bookmark
+    emitted = []
+    for value in values:
+        record_bookmark = pendulum.parse(value)
+        emitted.append(record_bookmark >= initial_bookmark)
+        if record_bookmark >= initial_bookmark:
+            max_bookmark = max(max_bookmark, record_bookmark)
+    return emitted, max_bookmark.to_iso8601_string()
+
+
+class TestBookmarkTracker(unittest.TestCase):
+
+    @parameterized.expand([
+        ["canonical values", "2024-01-01T12:00:00Z", [
+            "2024-01-01T10:00:00.000000Z",
+            "2024-01-01T12:00:00.000000Z",
+            "2024-01-01T20:00:00.123456Z",
+            "2024-01-01T15:00:00.000000Z",
+        ]],
+        ["non canonical values", "2024-01-01T12:00:00Z", [
+            "2024-01-01T13:00:00+05:30",
+            "2024-01-01T12:00:00Z",
+            "2024-01-01T19:00:00-05:00",
+        ]],
+        ["initial bookmark with offset", "2024-01-01T12:00:00+02:00", [
+            "2024-01-01T09:59:59.999999Z",
+            "2024-01-01T10:00:00.000000Z",
+            "2024-01-01T10:00:00.000001Z",
+        ]],
+        ["no record after the bookmark", "2024-06-01T00:00:00Z", [
+            "2024-01-01T10:00:00.000000Z",
+        ]],
+        ["same instant in different formats", "2024-01-01T00:00:00Z", [
+            "2024-01-02T00:00:00.000000Z",
+            "2024-01-02T01:00:00+01:00",
+        ]],
+    ])
+    def test_tracker_matches_pendulum_comparison(self, test_name, initial_value, values):
+        """ Test that the fast path emits the same records and bookmark as a per record pendulum.parse """
+
+        initial_bookmark = pendulum.parse(initial_value)
+        tracker = BookmarkTracker(initial_bookmark)
+
+        emitted = [tracker.observe(value) for value in values]
+
+        self.assertEqual((emitted, tracker.max_bookmark.to_iso8601_string()),
+                         reference_bookmarks(initial_bookmark, values))
+
+    @patch("tap_branch.timestamps.pendulum.parse", wraps=pendulum.parse)
+    def test_tracker_parses_only_when_bookmark_moves(self, mock_parse):
+        """ Test that canonical values are compared without materialising datetimes """
+
+        tracker = BookmarkTracker(pendulum.datetime(2024, 1, 1, tz="UTC"))
+        for hour in range(10):
+            tracker.observe(f"2024-01-01T{hour:02d}:30:00.000000Z")
+
+        mock_parse.assert_not_called()
+        self.assertEqual(tracker.max_bookmark, pendulum.datetime(2024, 1, 1, 9, 30, tz="UTC"))
+        mock_parse.assert_called_once()
+
+    def test_get_sort_key_normalises_to_utc(self):
+        """ Test that non canonical values are normalised to the canonical UTC format """
+
+        self.assertEqual(get_sort_key("2024-01-01T05:30:00+05:30"), "2024-01-01T00:00:00.000000Z")
+        self.assertEqual(get_sort_key("2024-01-01T00:00:00.000000Z"), "2024-01-01T00:00:00.000000Z")
@@ -0,0 +1,346 @@
+import copy
+import gzip
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pendulum
+from parameterized import parameterized
+from singer import Transformer, metadata
+from singer.transform import (SchemaMismatch,
+                              UNIX_MILLISECONDS_INTEGER_DATETIME_PARSING,
+                              UNIX_SECONDS_INTEGER_DATETIME_PARSING)
+
+from benchmarks.export_generator import ExportProfile, generate_export
+from tap_branch.transform import CompiledTransformer, RecordPassthrough
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "tap_branch", "schemas", "shared", "branch_events.json")
+
+with open(SCHEMA_PATH) as schema_file:
+    SCHEMA = json.load(schema_file)
+
+METADATA = metadata.to_map(metadata.get_standard_metadata(SCHEMA, key_properties=["id"],
+                                                          valid_replication_keys=["timestamp"],
+                                                          replication_method="INCREMENTAL"))
+
+RECORD = {
+    "id": 1234567890123456789,
+    "timestamp": "2024-01-01T10:00:00.123Z",
+    "name": "OPEN",
+    "organization_id": "1,234",
+    "user_data_geo_lat": "12.5",
+    "user_data_is_jailbroken": None,
+    "user_data_limit_ad_tracking": "false",
+    "attributed": 1,
+    "tune_site_id": "",
+    "custom_data": {"key": "value", "nested": {"count": 1}},
+    "last_attributed_touch_data_tilde_tags": ["a", 1, None],
+    "content_items": [{"dollar_price": "9.99", "dollar_quantity": 2, "unknown": "x"}],
+    "unknown_field": "dropped",
+}
+
+TYPED_RECORD = {
+    "id": "1234567890123456789",
+    "timestamp": "2024-01-01T10:00:00.123000Z",
+    "name": "OPEN",
+    "organization_id": 1234,
+    "user_data_geo_lat": 12.5,
+    "user_data_is_jailbroken": True,
+    "user_data_limit_ad_tracking": False,
+    "attributed": True,
+    "tune_site_id": None,
+    "user_data_os": "",
+    "custom_data": None,
+}
+
+
+def generic_transform(transformer, record, schema=SCHEMA, mdata=METADATA):
+    """ Transform with the generic singer transformer, which mutates its input """
+
+    return transformer.transform(copy.deepcopy(record), copy.deepcopy(schema), mdata)
+
+
+class TestCompiledTransformer(unittest.TestCase):
+
+    @parameterized.expand([
+        ["realistic record", RECORD],
+        ["datetime with offset", {**RECORD, "timestamp": "2024-01-01T10:00:00+05:30"}],
+        ["naive datetime", {**RECORD, "timestamp": "2024-01-01T10:00:00"}],
+        ["non iso datetime", {**RECORD, "timestamp": "Jan 1 2024 10:00"}],
+        ["empty datetime", {**RECORD, "timestamp": ""}],
+        ["only unknown fields", {"unknown_field": 1}],
+    ])
+    def test_output_matches_generic_transformer(self, test_name, record):
+        """ Test that the compiled transformer writes the same record and tracking as singer """
+
+        with Transformer() as expected_transformer:
+            expected = generic_transform(expected_transformer, record)
+
+        with Transformer() as transformer:
+            compiled = CompiledTransformer(transformer, copy.deepcopy(SCHEMA), METADATA)
+            actual = compiled.transform(record)
+
+        self.assertTrue(compiled.is_compiled)
+        self.assertEqual(json.dumps(actual), json.dumps(expected))
+        self.assertEqual(transformer.removed, expected_transformer.removed)
+        self.assertEqual(transformer.filtered, expected_transformer.filtered)
+
+    def test_does_not_mutate_record(self):
+        """ Test that the input record is left untouched """
+
+        record = copy.deepcopy(RECORD)
+        with Transformer() as transformer:
+            CompiledTransformer(transformer, SCHEMA, METADATA).transform(record)
+
+        self.assertEqual(record, RECORD)
+
+    def test_unselected_fields_are_filtered(self):
+        """ Test that unselected and unsupported fields are dropped, unlike automatic fields """
+
+        mdata = copy.deepcopy(METADATA)
+        mdata[("properties", "name")]["selected"] = False
+        mdata[("properties", "attributed")]["inclusion"] = "unsupported"
+        mdata[("properties", "id")]["selected"] = False
+
+        with Transformer() as expected_transformer:
+            expected = generic_transform(expected_transformer, RECORD, mdata=mdata)
+
+        with Transformer() as transformer:
+            actual = CompiledTransformer(transformer, SCHEMA, mdata).transform(RECORD)
+
+        self.assertEqual(actual, expected)
+        self.assertNotIn("name", actual)
+        self.assertIn("id", actual)
+        self.assertEqual(transformer.filtered, {"name", "attributed"})
+
+    @parameterized.expand([
+        ["invalid integer", {**RECORD, "organization_id": "abc"}],
+        ["invalid datetime", {**RECORD, "timestamp": "not a date"}],
+        ["integer datetime without integer parsing", {**RECORD, "timestamp": 1704103200000}],
+        ["invalid nested number", {**RECORD, "content_items": [{"dollar_price": "free"}]}],
+        ["several invalid fields", {**RECORD, "organization_id": "abc", "user_data_geo_lat": "north"}],
+    ])
+    def test_errors_match_generic_transformer(self, test_name, record):
+        """ Test that invalid records raise the same SchemaMismatch as singer """
+
+        with self.assertRaises(SchemaMismatch) as expected:
+            generic_transform(Transformer(), record)
+
+        with self.assertRaises(SchemaMismatch) as actual:
+            CompiledTransformer(Transformer(), SCHEMA, METADATA).transform(record)
+
+        self.assertEqual(str(actual.exception), str(expected.exception))
+
+    @parameterized.expand([
+        ["invalid datetime", {**RECORD, "timestamp": "not a date"}],
+        ["invalid nested datetime", {**RECORD, "custom_data": {"seen_at": "not a date"}}],
+    ])
+    def test_warnings_match_generic_transformer(self, test_name, record):
+        """ Test that the warnings of a failing record are only logged once, by the generic transformer """
+
+        schema = copy.deepcopy(SCHEMA)
+        schema["properties"]["custom_data"] = {"type": ["null", "object"], "properties": {
+            "seen_at": {"type": "string", "format": "date-time"}}}
+
+        with self.assertLogs(level="WARNING") as expected_logs, self.assertRaises(SchemaMismatch):
+            generic_transform(Transformer(), record, schema=schema)
+
+        with self.assertLogs(level="WARNING") as actual_logs, self.assertRaises(SchemaMismatch):
+            CompiledTransformer(Transformer(), schema, METADATA).transform(record)
+
+        self.assertEqual(actual_logs.output, expected_logs.output)
+
+    def test_integer_datetime_format_matches_generic_transformer(self):
+        """ Test that the integer datetime parsing option of the transformer is honoured """
+
+        record = {**RECORD, "timestamp": 1704103200}
+        expected = generic_transform(Transformer(UNIX_SECONDS_INTEGER_DATETIME_PARSING), record)
+        actual = CompiledTransformer(Transformer(UNIX_SECONDS_INTEGER_DATETIME_PARSING), SCHEMA, METADATA).transform(record)
+
+        self.assertEqual(actual, expected)
+
+    @parameterized.expand([
+        ["transformer with pre hook", Transformer(pre_hook=lambda data, typ, schema: data), SCHEMA, METADATA],
+        ["nested field metadata", Transformer(), SCHEMA,
+         {**METADATA, ("properties", "custom_data", "properties", "key"): {"selected": False}}],
+        ["schema without properties", Transformer(), {"type": "object"}, METADATA],
+    ])
+    def test_uncovered_cases_use_generic_transformer(self, test_name, transformer, schema, mdata):
+        """ Test that transformers and schemas the plan does not cover are not compiled """
+
+        self.assertFalse(CompiledTransformer(transformer, schema, mdata).is_compiled)
+
+    def test_mocked_transformer_is_delegated(self):
+        """ Test that other transformers get the record, schema and metadata unchanged """
+
+        transformer = MagicMock()
+        compiled = CompiledTransformer(transformer, SCHEMA, METADATA)
+
+        self.assertEqual(compiled.transform(RECORD), transformer.transform.return_value)
+        transformer.transform.assert_called_once_with(RECORD, SCHEMA, METADATA)
+
+
+class TestRecordPassthrough(unittest.TestCase):
+
+    def build_passthrough(self, transformer=None, mdata=METADATA, sample_records=10):
+        compiled = CompiledTransformer(transformer or Transformer(), SCHEMA, mdata)
+        return RecordPassthrough(compiled, sample_records=sample_records)
+
+    def test_typed_record_is_passed_through(self):
+        """ Test that a record matching the schema is written as is, the same as transformed """
+
+        passthrough = self.build_passthrough()
+        expected = generic_transform(Transformer(), TYPED_RECORD)
+
+        actual = passthrough.transform(TYPED_RECORD)
+
+        self.assertEqual(json.dumps(actual), json.dumps(expected))
+        self.assertEqual((passthrough.passed_records, passthrough.transformed_records), (1, 0))
+
+    @parameterized.expand([
+        ["millis datetime", {**TYPED_RECORD, "timestamp": 1704103200123}],
+        ["non canonical datetime", {**TYPED_RECORD, "timestamp": "2024-01-01T10:00:00.123Z"}],
+        ["nested object", {**TYPED_RECORD, "custom_data": {"key": "value", "nested": {"count": 1}}}],
+        ["nested array", {**TYPED_RECORD, "content_items": [{"dollar_price": "9.99", "unknown": "x"}]}],
+    ])
+    def test_datetime_and_nested_fields_are_coerced_alone(self, test_name, record):
+        """ Test that the date-time and nested fields are coerced without transforming the whole record """
+
+        transformer = Transformer(integer_datetime_fmt=UNIX_MILLISECONDS_INTEGER_DATETIME_PARSING)
+        passthrough = self.build_passthrough(transformer=transformer, sample_records=0)
+        expected = generic_transform(Transformer(integer_datetime_fmt=UNIX_MILLISECONDS_INTEGER_DATETIME_PARSING),
+                                     record)
+
+        self.assertEqual(json.dumps(passthrough.transform(record)), json.dumps(expected))
+        self.assertEqual((passthrough.passed_records, passthrough.transformed_records), (1, 0))
+
+    @parameterized.expand([
+        ["millis", "millis"],
+        ["iso", "iso"],
+    ])
+    def test_generated_export_records_are_passed_through(self, test_name, datetime_format):
+        """ Test that the records of a Branch like export are passed through, the same as transformed """
+
+        profile = ExportProfile(records=200, datetime_format=datetime_format, variants=16)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            export = generate_export(Path(temp_dir), profile, pendulum.datetime(2024, 1, 1, tz="UTC"),
+                                     pendulum.datetime(2024, 1, 2, tz="UTC"), schema_path=Path(SCHEMA_PATH))
+            with gzip.open(export.paths[0], "rt", encoding="utf-8") as export_file:
+                records = [json.loads(line) for line in export_file]
+        transformer = Transformer(integer_datetime_fmt=UNIX_MILLISECONDS_INTEGER_DATETIME_PARSING)
+        passthrough = self.build_passthrough(transformer=transformer)
+
+        actual = [passthrough.transform(record) for record in records]
+
+        expected = [generic_transform(Transformer(integer_datetime_fmt=UNIX_MILLISECONDS_INTEGER_DATETIME_PARSING),
+                                      record) for record in records]
+        self.assertEqual(json.dumps(actual), json.dumps(expected))
+        self.assertEqual((passthrough.passed_records, passthrough.transformed_records), (200, 0))
+
+    def test_null_values_are_passed_through(self):
+        """ Test that the nulls the transformer writes unchanged are passed through """
+
+        record = {field_name: None for field_name, field_schema in SCHEMA["properties"].items()
+                  if "boolean" not in field_schema["type"]}
+        passthrough = self.build_passthrough()
+        expected = generic_transform(Transformer(), record)
+
+        self.assertEqual(passthrough.pass_through(record), expected)
+        self.assertEqual(passthrough.transform(record), expected)
+
+    @parameterized.expand([
+        ["integer for number", {**TYPED_RECORD, "user_data_geo_lat": 12}],
+        ["boolean for integer", {**TYPED_RECORD, "organization_id": True}],
+        ["string for integer", {**TYPED_RECORD, "organization_id": "1,234"}],
+        ["string for boolean", {**TYPED_RECORD, "attributed": "false"}],
+        ["null boolean", {**TYPED_RECORD, "attributed": None}],
+        ["integer for string", {**TYPED_RECORD, "id": 1234567890123456789}],
+        ["unknown field", {**TYPED_RECORD, "unknown_field": "dropped"}],
+    ])
+    def test_record_not_matching_schema_is_transformed(self, test_name, record):
+        """ Test that a record the transformer would change is transformed """
+
+        passthrough = self.build_passthrough(sample_records=0)
+        expected = generic_transform(Transformer(), record)
+
+        self.assertIsNone(passthrough.pass_through(record))
+        self.assertEqual(json.dumps(passthrough.transform(record)), json.dumps(expected))
+        self.assertEqual((passthrough.passed_records, passthrough.transformed_records), (0, 1))
+
+    def test_unselected_field_is_transformed(self):
+        """ Test that a record holding an unselected field is transformed to drop it """
+
+        mdata = copy.deepcopy(METADATA)
+        mdata[("properties", "name")]["selected"] = False
+        passthrough = self.build_passthrough(mdata=mdata)
+
+        actual = passthrough.transform(TYPED_RECORD)
+
+        self.assertNotIn("name", actual)
+        self.assertEqual(passthrough.transformed_records, 1)
+
+    def test_failed_sample_disables_passthrough_for_the_export(self):
+        """ Test that a record failing the check within the sample transforms the rest of the export """
+
+        passthrough = self.build_passthrough(sample_records=2)
+        passthrough.transform(TYPED_RECORD)
+        passthrough.transform({**TYPED_RECORD, "user_data_geo_lat": "12.5"})
+        passthrough.transform(TYPED_RECORD)
+
+        self.assertFalse(passthrough.is_enabled)
+        self.assertEqual((passthrough.passed_records, passthrough.transformed_records), (1, 2))
+
+    def test_failure_after_the_sample_only_transforms_the_record(self):
+        """ Test that a record failing the check after the sample falls back alone """
+
+        passthrough = self.build_passthrough(sample_records=1)
+        passthrough.transform(TYPED_RECORD)
+        passthrough.transform({**TYPED_RECORD, "user_data_geo_lat": "12.5"})
+        passthrough.transform(TYPED_RECORD)
+
+        self.assertTrue(passthrough.is_enabled)
+        self.assertEqual((passthrough.passed_records, passthrough.transformed_records), (2, 1))
+
+    def test_invalid_record_raises_schema_mismatch(self):
+        """ Test that a record failing the check is validated by the transformer """
+
+        with self.assertRaises(SchemaMismatch):
+            self.build_passthrough().transform({**TYPED_RECORD, "organization_id": "abc"})
+
+    def test_invalid_nested_field_raises_schema_mismatch_once(self):
+        """ Test that a nested field failing its coercion is reported once, by the transformer """
+
+        record = {**TYPED_RECORD, "content_items": [{"dollar_quantity": "abc"}]}
+        with self.assertRaises(SchemaMismatch) as expected:
+            generic_transform(Transformer(), record)
+
+        with self.assertRaises(SchemaMismatch) as actual:
+            self.build_passthrough().transform(record)
+
+        self.assertEqual(str(actual.exception), str(expected.exception))
+
+    def test_uncompiled_transformer_is_not_passed_through(self):
+        """ Test that every record is transformed when the transformer is not compiled """
+
+        transformer = MagicMock()
+        passthrough = self.build_passthrough(transformer=transformer)
+
+        self.assertFalse(passthrough.is_enabled)
+        self.assertEqual(passthrough.transform(TYPED_RECORD), transformer.transform.return_value)
+
+    @parameterized.expand([
+        ["not configured", {}, False],
+        ["disabled", {"raw_passthrough": "false"}, False],
+        ["enabled", {"raw_passthrough": True, "raw_passthrough_sample_records": "5"}, True],
+    ])
+    def test_from_config(self, test_name, config, is_built):
+        """ Test that the passthrough is only built when `raw_passthrough` is enabled """
+
+        passthrough = RecordPassthrough.from_config(config, CompiledTransformer(Transformer(), SCHEMA, METADATA))
+
+        self.assertEqual(passthrough is not None, is_built)
+        if is_built:
+            self.assertEqual(passthrough.sample_records, 5)
@@ -0,0 +1,220 @@
+import io
+import json
+import pickle
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from unittest.mock import MagicMock, patch
+
+import pendulum
+from parameterized import parameterized
+from singer import Transformer, metadata
+
+from tap_branch import message_writer
+from tap_branch.exceptions import BranchError
+from tap_branch.json_codec import JsonCodec
+from tap_branch.message_writer import BufferedMessageWriter
+from tap_branch.transform import CompiledTransformer
+from tap_branch.transform_pool import (ChunkTransformer, TransformPool,
+                                       TransformWorkers)
+
+from stream_base import build_stream
+
+SCHEMA = {"type": "object", "properties": {
+    "id": {"type": ["null", "string"]},
+    "count": {"type": ["null", "integer"]},
+    "timestamp": {"type": ["null", "string"], "format": "date-time"},
+}}
+
+METADATA = metadata.to_map(metadata.get_standard_metadata(SCHEMA, key_properties=["id"],
+                                                          valid_replication_keys=["timestamp"],
+                                                          replication_method="INCREMENTAL"))
+
+LINES = [
+    b'{"id": "1", "count": "5", "timestamp": "2024-01-01T10:00:00Z"}',
+    b'{"id": "2", "count": 2, "timestamp": "2023-12-31T10:00:00Z"}',
+    b'not json',
+    b'{"id": "3", "count": 7, "timestamp": "2024-01-01T12:00:00+01:00"}',
+    b'{"id": "4", "count": 1, "timestamp": "2024-01-01T09:00:00Z"}',
+]
+
+
+def build_chunk_transformer(batch_output=False, config=None):
+    return ChunkTransformer("eo_click", SCHEMA, METADATA, "timestamp", "2024-01-01T00:00:00.000000Z",
+                            "no-integer-datetime-parsing", config or {}, batch_output=batch_output)
+
+
+def build_canonical_line(index, count=1):
+    return json.dumps({"id": str(index), "count": count, "timestamp": "2024-01-01T10:00:00.000000Z"}).encode("utf-8")
+
+
+class TestChunkTransformer(unittest.TestCase):
+
+    def test_transform_chunk(self):
+        """ Test that the records are encoded in order, with None for the records before the initial bookmark """
+
+        chunk = build_chunk_transformer().transform_chunk("https://test.url/data.gz", LINES)
+
+        self.assertEqual(len(chunk.lines), 4)
+        self.assertIsNone(chunk.lines[1])
+        self.assertEqual(json.loads(chunk.lines[0]), {"type": "RECORD", "stream": "eo_click", "record": {
+            "id": "1", "count": 5, "timestamp": "2024-01-01T10:00:00.000000Z"}})
+        self.assertEqual(chunk.max_value, "2024-01-01T11:00:00.000000Z")
+
+    def test_transform_chunk_for_batch_output(self):
+        """ Test that the records are encoded as plain JSON documents for the BATCH output mode """
+
+        chunk = build_chunk_transformer(batch_output=True).transform_chunk("https://test.url/data.gz", LINES[:1])
+
+        self.assertEqual(json.loads(chunk.lines[0]), {"id": "1", "count": 5, "timestamp": "2024-01-01T10:00:00.000000Z"})
+
+    def test_chunk_before_initial_bookmark(self):
+        """ Test that a chunk without any record after the initial bookmark has no max value """
+
+        chunk = build_chunk_transformer().transform_chunk("https://test.url/data.gz", LINES[1:2])
+
+        self.assertEqual(chunk.lines, [None])
+        self.assertIsNone(chunk.max_value)
+
+    def test_schema_mismatch_is_raised_as_branch_error(self):
+        """ Test that a record not matching the schema raises an error the worker can send back """
+
+        with self.assertRaises(BranchError) as err:
+            build_chunk_transformer().transform_chunk("https://test.url/data.gz", [b'{"id": "1", "count": "abc"}'])
+
+        self.assertIn("count", str(err.exception))
+        pickle.loads(pickle.dumps(err.exception))
+
+    def test_prepared_transformer_is_not_pickled(self):
+        """ Test that the transformer built on first use is built again in each worker """
+
+        chunk_transformer = build_chunk_transformer()
+        chunk_transformer.transform_chunk("https://test.url/data.gz", LINES[:1])
+
+        unpickled = pickle.loads(pickle.dumps(chunk_transformer))
+
+        self.assertIsNone(unpickled._record_transformer)
+        self.assertEqual(unpickled.transform_chunk("https://test.url/data.gz", LINES[:1]).lines,
+                         chunk_transformer.transform_chunk("https://test.url/data.gz", LINES[:1]).lines)
+
+    @parameterized.expand([
+        ["sampled line", 0, True, True, 1, 2],
+        ["line after the sample", 2, True, False, 2, 1],
+        ["passthrough disabled", 0, False, False, 0, 3],
+    ])
+    def test_passthrough_samples_the_leading_lines_of_the_export(self, test_name, first_line, passthrough_enabled,
+                                                                 passthrough_failed, passed_records,
+                                                                 transformed_records):
+        """ Test that the passthrough sample depends on the position of the chunk in the export, not on the worker """
+
+        chunk_transformer = build_chunk_transformer(config={"raw_passthrough": True,
+                                                            "raw_passthrough_sample_records": 2})
+        lines = [build_canonical_line(0), build_canonical_line(1, count="1"), build_canonical_line(2)]
+
+        chunk = chunk_transformer.transform_chunk("https://test.url/data.gz", lines, first_line, passthrough_enabled)
+
+        self.assertEqual(chunk.passthrough_failed, passthrough_failed)
+        self.assertEqual((chunk.passed_records, chunk.transformed_records), (passed_records, transformed_records))
+
+
+class TestTransformPool(unittest.TestCase):
+
+    @parameterized.expand([
+        ["not configured", {}, Transformer(), False],
+        ["single worker", {"transform_workers": "1"}, Transformer(), False],
+        ["several workers", {"transform_workers": "2"}, Transformer(), True],
+        ["transformer with pre hook", {"transform_workers": 2}, Transformer(pre_hook=lambda data, typ, schema: data), False],
+    ])
+    def test_from_config(self, test_name, config, transformer, is_built):
+        """ Test that the pool is only built for several workers and a compiled transformer """
+
+        transform_pool = TransformPool.from_config(config, TransformWorkers.from_config(config),
+                                                   CompiledTransformer(transformer, SCHEMA, METADATA),
+                                                   "eo_click", "timestamp", pendulum.datetime(2024, 1, 1, tz="UTC"))
+
+        self.assertEqual(transform_pool is not None, is_built)
+
+    def test_transform_keeps_line_order(self):
+        """ Test that the chunks transformed by the workers are returned in order """
+
+        line_batches = [("https://test.url/data.gz", [line]) for line in LINES] * 3
+        expected = [build_chunk_transformer().transform_chunk(data_url, lines) for data_url, lines in line_batches]
+        transform_workers = TransformWorkers(2)
+
+        try:
+            chunks = list(TransformPool(build_chunk_transformer(), transform_workers).transform(line_batches))
+        finally:
+            transform_workers.shutdown()
+
+        self.assertEqual(chunks, expected)
+
+    def test_workers_are_shared_by_the_exports(self):
+        """ Test that the worker processes are started once, and transform the chunks of each export with its own transformer """
+
+        line_batches = [("https://test.url/data.gz", LINES[:1])]
+        transform_workers = TransformWorkers(2)
+
+        with patch("tap_branch.transform_pool.ProcessPoolExecutor", wraps=ProcessPoolExecutor) as mock_executor:
+            try:
+                record_chunks = list(TransformPool(build_chunk_transformer(), transform_workers).transform(line_batches))
+                batch_chunks = list(TransformPool(build_chunk_transformer(batch_output=True),
+                                                  transform_workers).transform(line_batches))
+            finally:
+                transform_workers.shutdown()
+
+        self.assertEqual(mock_executor.call_count, 1)
+        self.assertEqual(json.loads(record_chunks[0].lines[0])["type"], "RECORD")
+        self.assertEqual(json.loads(batch_chunks[0].lines[0])["id"], "1")
+
+    def test_passthrough_is_disabled_for_the_chunks_after_a_failed_sample(self):
+        """ Test that a failed sample of the export disables the passthrough of the chunks submitted after it """
+
+        lines = [build_canonical_line(index, count="1" if index == 2 else 1) for index in range(8)]
+        line_batches = [("https://test.url/data.gz", [line]) for line in lines]
+        chunk_transformer = build_chunk_transformer(config={"raw_passthrough": True,
+                                                            "raw_passthrough_sample_records": 3})
+        transform_workers = TransformWorkers(2)
+
+        try:
+            chunks = list(TransformPool(chunk_transformer, transform_workers).transform(line_batches))
+        finally:
+            transform_workers.shutdown()
+
+        # The 4 chunks in flight were submitted before the failure of the third line was known
+        self.assertEqual([chunk.passed_records for chunk in chunks], [1, 1, 0, 1, 1, 1, 0, 0])
+        self.assertEqual([chunk.passthrough_failed for chunk in chunks], [False, False, True] + [False] * 5)
+
+
+class TestProcessExportWithTransformWorkers(unittest.TestCase):
+
+    def tearDown(self):
+        message_writer._message_writer = BufferedMessageWriter()
+
+    def run_process_export(self, config):
+        stream = build_stream(config, schema=SCHEMA, mdata=metadata.to_list(METADATA))
+        self.addCleanup(stream.client.transform_workers.shutdown)
+        stream.start_export({})
+        json_codec = JsonCodec()
+
+        def extract_data(job_response, line_batches=False, **kwargs):
+            if line_batches:
+                return iter([("https://test.url/data.gz", LINES[:2]), ("https://test.url/data.gz", LINES[2:])])
+            return iter([json_codec.loads(line) for line in LINES if line != b"not json"])
+
+        counter = MagicMock()
+        with patch("sys.stdout", new_callable=io.StringIO) as mock_stdout, \
+                patch.object(stream, "extract_data", side_effect=extract_data):
+            stream.process_export({}, Transformer(), {"response_url": "https://test.url/data.gz"},
+                                  pendulum.datetime(2024, 1, 1, tz="UTC"), pendulum.datetime(2024, 1, 2, tz="UTC"),
+                                  counter)
+        return mock_stdout.getvalue(), counter.increment.call_count
+
+    def test_output_matches_single_process(self):
+        """ Test that the workers write the same messages and state as the single-process transform """
+
+        expected_output, expected_count = self.run_process_export({})
+
+        output, count = self.run_process_export({"transform_workers": 2})
+
+        self.assertEqual(output, expected_output)
+        self.assertEqual(count, expected_count)
+        self.assertIn('"timestamp": "2024-01-01T11:00:00Z"', output)
@@ -0,0 +1,166 @@
+import gzip
+import io
+import json
+import unittest
+from unittest.mock import MagicMock, patch
+
+from parameterized import parameterized
+from urllib3.exceptions import ProtocolError
+
+from tap_branch.branch_constants import DEFAULT_HTTP_MAX_RETRIES
+from tap_branch.streams.branch_events import BranchEventsBaseStream
+from tap_branch.transport import (HttpTransport, ResumableDownload,
+                                  build_http_adapter,
+                                  configure_download_transport,
+                                  get_download_transport)
+
+
+class BreakingStream(io.BytesIO):
+    """ Body that breaks off with a protocol error after `break_after` bytes """
+
+    def __init__(self, data, break_after=None):
+        super().__init__(data)
+        self.break_after = break_after
+
+    def readinto(self, buffer):
+        if self.break_after is not None and self.tell() >= self.break_after:
+            raise ProtocolError("Connection broken: IncompleteRead")
+        limit = len(buffer) if self.break_after is None else min(len(buffer), self.break_after - self.tell())
+        return super().readinto(memoryview(buffer)[:limit])
+
+
+def make_response(data, status_code=200, headers=None, break_after=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = headers or {}
+    response.raw = BreakingStream(data, break_after)
+    response.__enter__ = MagicMock(return_value=response)
+    response.__exit__ = MagicMock(return_value=False)
+    return response
+
+
+class TestHttpTransport(unittest.TestCase):
+
+    def test_adapter_pool_and_retries(self):
+        """ Test that the adapter keeps the configured connections alive and retries idempotent requests """
+
+        adapter = build_http_adapter(pool_connections=2, pool_maxsize=16, max_retries=5)
+
+        self.assertEqual(adapter._pool_maxsize, 16)
+        self.assertEqual(adapter._pool_connections, 2)
+        self.assertEqual(adapter.max_retries.total, 5)
+        self.assertIn(503, adapter.max_retries.status_forcelist)
+        self.assertNotIn("POST", adapter.max_retries.allowed_methods)
+
+    def test_adapter_without_retries(self):
+        """ Test that an adapter without retries does not retry gateway errors either """
+
+        adapter = build_http_adapter(max_retries=0)
+
+        self.assertEqual(adapter.max_retries.total, 0)
+        self.assertFalse(adapter.max_retries.status_forcelist)
+
+    @parameterized.expand([
+        ["defaults", {}, 10, DEFAULT_HTTP_MAX_RETRIES],
+        ["sized for download workers", {"export_download_workers": "32"}, 32, DEFAULT_HTTP_MAX_RETRIES],
+        ["configured pool", {"http_pool_maxsize": 20, "http_max_retries": "0"}, 20, 0],
+    ])
+    def test_from_config(self, test_name, config, expected_pool_maxsize, expected_max_retries):
+        transport = HttpTransport.from_config(config)
+
+        self.assertEqual(transport.pool_maxsize, expected_pool_maxsize)
+        self.assertEqual(transport.max_retries, expected_max_retries)
+
+    def test_session_is_reused(self):
+        """ Test that every download goes through the same pooled session """
+
+        transport = HttpTransport(pool_maxsize=4)
+        session = transport.session
+
+        self.assertIs(transport.session, session)
+        self.assertEqual(session.get_adapter("https://example.com")._pool_maxsize, 4)
+
+        transport.close()
+        self.assertIsNot(transport.session, session)
+
+    def test_configure_download_transport(self):
+        """ Test that the shared download transport is replaced with one sized from the config """
+
+        previous = get_download_transport()
+        try:
+            transport = configure_download_transport({"http_pool_maxsize": 12})
+            self.assertIs(get_download_transport(), transport)
+            self.assertEqual(transport.pool_maxsize, 12)
+        finally:
+            configure_download_transport({})
+
+        self.assertIsNot(get_download_transport(), previous)
+
+    @patch("tap_branch.streams.branch_events.get_download_transport")
+    def test_export_download_uses_shared_transport(self, mock_get_transport):
+        """ Test that export files are fetched through the shared transport """
+
+        response = MagicMock()
+        mock_get_transport.return_value.get.return_value = response
+
+        self.assertIs(BranchEventsBaseStream._fetch_export_data("https://test.url/data.gz"), response)
+        mock_get_transport.return_value.get.assert_called_once_with(
+            "https://test.url/data.gz", headers=None, stream=True, timeout=3600)
+        response.raise_for_status.assert_called_once()
+
+
+class TestResumableDownload(unittest.TestCase):
+
+    BODY = bytes(range(256)) * 40
+
+    def test_resumes_with_range_request(self):
+        """ Test that a broken body is resumed from the first byte not read yet """
+
+        fetch = MagicMock(return_value=make_response(self.BODY[4000:], status_code=206,
+                                                     headers={"Content-Range": "bytes 4000-10239/10240"}))
+        download = ResumableDownload(make_response(self.BODY, break_after=4000), "https://test.url", fetch)
+
+        self.assertEqual(download.read(), self.BODY)
+        fetch.assert_called_once_with("https://test.url", headers={"Range": "bytes=4000-"})
+        self.assertEqual((download.bytes_consumed, download.resumes), (len(self.BODY), 1))
+
+    def test_restarts_without_range_support(self):
+        """ Test that the bytes already read are skipped when the server sends the whole body again """
+
+        fetch = MagicMock(side_effect=[
+            make_response(self.BODY, break_after=7000),
+            make_response(self.BODY),
+        ])
+        download = ResumableDownload(make_response(self.BODY, break_after=3000), "https://test.url", fetch)
+
+        self.assertEqual(download.read(), self.BODY)
+        self.assertEqual(download.resumes, 2)
+
+    def test_raises_after_max_resumes(self):
+        """ Test that the error is raised once the download was resumed too many times """
+
+        fetch = MagicMock(side_effect=lambda url, headers: make_response(self.BODY, break_after=10))
+        download = ResumableDownload(make_response(self.BODY, break_after=10), "https://test.url", fetch,
+                                     max_resumes=2)
+
+        with self.assertRaises(ProtocolError):
+            download.read()
+        self.assertEqual(fetch.call_count, 2)
+
+    @patch("tap_branch.streams.branch_events.BranchEventsBaseStream._fetch_export_data")
+    def test_extract_data_resumes_without_duplicate_records(self, mock_fetch):
+        """ Test that the records of an export broken off mid-body are emitted exactly once """
+
+        records = [{"id": str(index), "timestamp": "2024-01-01T00:00:00Z", "payload": "x" * index}
+                   for index in range(500)]
+        body = gzip.compress(b"".join(json.dumps(record).encode() + b"\n" for record in records))
+        offset = len(body) // 2
+
+        mock_fetch.side_effect = [
+            make_response(body, break_after=offset),
+            make_response(body[offset:], status_code=206, headers={"Content-Range": f"bytes {offset}-"}),
+        ]
+
+        extracted = list(BranchEventsBaseStream.extract_data({"response_url": "https://test.url/data.gz"}))
+
+        self.assertEqual(extracted, records)
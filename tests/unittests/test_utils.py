@@ -4,7 +4,8 @@ from unittest.mock import MagicMock
 from parameterized import parameterized
 
 from tap_branch.branch_constants import MAX_RETRY_WAIT_SECONDS
-from tap_branch.branch_utils import (raise_for_branch_rate_limit,
+from tap_branch.branch_utils import (get_export_file_urls, is_config_enabled,
+                                     raise_for_branch_rate_limit,
                                      handle_branch_validation_error)
 from tap_branch.exceptions import (BranchFatalRateLimitError,
                                    BranchRateLimitError,
@@ -45,3 +46,26 @@ class TestUtils(unittest.TestCase):
             raise_for_branch_rate_limit(mock_response)
 
         self.assertEqual(str(context.exception), expected_message)
+
+    @parameterized.expand([
+        ["single url", {"response_url": "https://a.gz"}, ["https://a.gz"]],
+        ["url list", {"response_url": ["https://a.gz", "https://b.gz"]}, ["https://a.gz", "https://b.gz"]],
+        ["response urls", {"response_urls": ["https://b.gz", "https://a.gz", "https://b.gz"]}, ["https://b.gz", "https://a.gz"]],
+        ["missing urls", {"status": "complete"}, []],
+    ])
+    def test_get_export_file_urls(self, test_name, job_response, expected_urls):
+        """ Test to validate that every export part URL is collected in order"""
+
+        self.assertEqual(get_export_file_urls(job_response), expected_urls)
+
+    @parameterized.expand([
+        ["missing", {}, True, True],
+        ["empty string", {"flag": ""}, False, False],
+        ["boolean", {"flag": False}, True, False],
+        ["true string", {"flag": "True"}, False, True],
+        ["false string", {"flag": "false"}, True, False],
+    ])
+    def test_is_config_enabled(self, test_name, config, default, expected):
+        """ Test to validate that boolean flags are read from booleans and strings"""
+
+        self.assertEqual(is_config_enabled(config, "flag", default=default), expected)
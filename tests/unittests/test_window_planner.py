@@ -0,0 +1,60 @@
+import unittest
+
+import pendulum
+from parameterized import parameterized
+
+from tap_branch.branch_constants import MAX_RECORDS_TO_FETCH
+from tap_branch.window_planner import RECORDS_PER_DAY_KEY, WindowPlanner
+
+WINDOW_START = pendulum.datetime(2024, 1, 1, tz="UTC")
+MAX_WINDOW_END = WINDOW_START.add(days=60)
+
+
+class TestWindowPlanner(unittest.TestCase):
+
+    def test_without_observation_uses_max_window(self):
+        self.assertEqual(WindowPlanner().get_window_end(WINDOW_START, MAX_WINDOW_END), MAX_WINDOW_END)
+
+    @parameterized.expand([
+        ["busy report type shrinks the window", 100_000, WINDOW_START.add(days=5)],
+        ["quiet report type keeps the max window", 1_000, MAX_WINDOW_END],
+        ["very busy report type stops at the min window", 100_000_000, WINDOW_START.add(hours=1)],
+    ])
+    def test_window_is_sized_for_target_records(self, test_name, records_per_day, expected_end):
+        planner = WindowPlanner(target_records=500_000)
+        planner.records_per_day = records_per_day
+
+        self.assertEqual(planner.get_window_end(WINDOW_START, MAX_WINDOW_END), expected_end)
+
+    def test_records_per_day_is_a_moving_average(self):
+        planner = WindowPlanner()
+        planner.record_export(WINDOW_START, WINDOW_START.add(days=10), 100_000)
+        self.assertEqual(planner.records_per_day, 10_000)
+
+        planner.record_export(WINDOW_START, WINDOW_START.add(days=10), 300_000)
+        self.assertEqual(planner.records_per_day, 20_000)
+
+    def test_truncated_export_shrinks_next_windows(self):
+        """ Test that an export cut at the record limit at least halves the next windows """
+
+        planner = WindowPlanner(target_records=MAX_RECORDS_TO_FETCH)
+        planner.record_export(WINDOW_START, WINDOW_START.add(days=10), MAX_RECORDS_TO_FETCH)
+
+        self.assertEqual(planner.get_window_end(WINDOW_START, MAX_WINDOW_END), WINDOW_START.add(days=5))
+
+    def test_state_round_trip(self):
+        state = {"bookmarks": {"eo_click": {"timestamp": "2024-01-01T00:00:00Z"}}}
+        planner = WindowPlanner()
+        planner.record_export(WINDOW_START, WINDOW_START.add(days=3), 1000)
+        planner.write_state(state, "eo_click")
+
+        next_run = WindowPlanner()
+        next_run.load_state(state, "eo_click")
+
+        self.assertAlmostEqual(state["bookmarks"]["eo_click"][RECORDS_PER_DAY_KEY], 333.333)
+        self.assertAlmostEqual(next_run.records_per_day, 333.333)
+
+    def test_from_config(self):
+        self.assertIsNone(WindowPlanner.from_config({}))
+        planner = WindowPlanner.from_config({"adaptive_window_size": "true", "export_target_records": "200000"})
+        self.assertEqual(planner.target_records, 200_000)